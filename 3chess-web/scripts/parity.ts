@@ -0,0 +1,151 @@
+// Checks the TypeScript engine against the fixture written by `python parity.py`.
+//
+//   npm run parity [-- fixture.json] [-- --skip moves.pawn,knightHops]
+//
+// Prints the number of divergences per category with a few examples each and
+// exits with status 1 if any category diverges.
+import { readFileSync } from 'node:fs';
+import { ChessGraph } from '../src/engine/graph';
+import { RaySystem } from '../src/engine/rays';
+import { GameEngine } from '../src/engine/gameEngine';
+import { Cell } from '../src/utils/hexMath';
+import { createNodeMapping } from '../src/utils/nodeMapping';
+import { EdgeType, Player, PieceType } from '../src/types/game';
+import type { Piece } from '../src/types/game';
+
+interface FixturePosition {
+  pieces: Record<string, [string, string]>;
+  currentPlayer: string;
+  moves: Record<string, string[]>;
+}
+
+interface Fixture {
+  version: number;
+  squares: string[];
+  edges: Record<string, [string, string][]>;
+  rookRays: Record<string, string[][]>;
+  bishopRays: Record<string, string[][]>;
+  knightHops: Record<string, string[]>;
+  squareColors: Record<string, 'dark' | 'light'>;
+  positions: FixturePosition[];
+}
+
+const EXAMPLES_PER_CATEGORY = 5;
+
+const divergences = new Map<string, string[]>();
+
+function report(category: string, message: string) {
+  if (!divergences.has(category)) {
+    divergences.set(category, []);
+  }
+  divergences.get(category)!.push(message);
+}
+
+// Compare two collections as sets and report what each side has alone
+function compareSets(category: string, context: string, expected: Iterable<string>, actual: Iterable<string>) {
+  const expectedSet = new Set(expected);
+  const actualSet = new Set(actual);
+  const missing = [...expectedSet].filter(x => !actualSet.has(x));
+  const extra = [...actualSet].filter(x => !expectedSet.has(x));
+  if (missing.length > 0 || extra.length > 0) {
+    report(category, `${context}: python only [${missing.join(', ')}], typescript only [${extra.join(', ')}]`);
+  }
+}
+
+function checkTopology(fixture: Fixture, graph: ChessGraph, rays: RaySystem) {
+  compareSets('squares', 'board', fixture.squares, graph.getNodes());
+
+  for (const edgeType of Object.values(EdgeType)) {
+    const pairs = new Set<string>();
+    for (const node of graph.getNodes()) {
+      for (const neighbor of graph.getNeighbors(node, edgeType)) {
+        pairs.add([node, neighbor].sort().join('-'));
+      }
+    }
+    const expected = (fixture.edges[edgeType] || []).map(pair => pair.join('-'));
+    compareSets(`edges.${edgeType}`, edgeType, expected, pairs);
+  }
+
+  // Rays are ordered from the origin outwards, so each ray is compared as a
+  // sequence but the rays of a node as a set
+  for (const node of fixture.squares) {
+    compareSets('rookRays', node,
+      fixture.rookRays[node].map(ray => ray.join(' ')),
+      rays.getRookRays(node).map(ray => ray.join(' ')));
+    compareSets('bishopRays', node,
+      fixture.bishopRays[node].map(ray => ray.join(' ')),
+      rays.getBishopRays(node).map(ray => ray.join(' ')));
+    compareSets('knightHops', node, fixture.knightHops[node], rays.getKnightMoves(node));
+  }
+
+  // The colors the board is drawn with must be the ones bishops keep to
+  for (const [node, [x, y]] of createNodeMapping()) {
+    const color = new Cell(x, y).isDark ? 'dark' : 'light';
+    if (fixture.squareColors[node] !== color) {
+      report('squareColors', `${node}: python ${fixture.squareColors[node]}, typescript ${color}`);
+    }
+  }
+}
+
+function checkPositions(fixture: Fixture) {
+  const engine = new GameEngine();
+  const state = engine.getState();
+
+  fixture.positions.forEach((position, index) => {
+    state.pieces = new Map<string, Piece>();
+    for (const [node, [player, type]] of Object.entries(position.pieces)) {
+      state.pieces.set(node, {
+        player: Player[player as keyof typeof Player],
+        type: PieceType[type as keyof typeof PieceType],
+      });
+    }
+    state.currentPlayer = Player[position.currentPlayer as keyof typeof Player];
+
+    for (const [node, expected] of Object.entries(position.moves)) {
+      const piece = state.pieces.get(node)!;
+      compareSets(`moves.${piece.type}`, `position ${index} ${piece.player} ${piece.type} ${node}`,
+        expected, engine.getValidMovesForPiece(node, piece));
+    }
+  });
+}
+
+function main() {
+  const args = process.argv.slice(2);
+  let fixturePath = 'scripts/parity-fixture.json';
+  let skip = new Set<string>();
+  for (let i = 0; i < args.length; i++) {
+    if (args[i] === '--skip') {
+      skip = new Set(args[++i].split(','));
+    } else {
+      fixturePath = args[i];
+    }
+  }
+
+  const fixture: Fixture = JSON.parse(readFileSync(fixturePath, 'utf8'));
+  if (fixture.version !== 2) {
+    throw new Error(`Unsupported fixture version ${fixture.version}`);
+  }
+
+  const graph = new ChessGraph();
+  const rays = new RaySystem(graph);
+  checkTopology(fixture, graph, rays);
+  checkPositions(fixture);
+
+  let failed = 0;
+  for (const [category, messages] of [...divergences].sort()) {
+    const skipped = skip.has(category);
+    console.log(`${category}: ${messages.length} divergences${skipped ? ' (skipped)' : ''}`);
+    for (const message of messages.slice(0, EXAMPLES_PER_CATEGORY)) {
+      console.log(`  ${message}`);
+    }
+    if (!skipped) {
+      failed += messages.length;
+    }
+  }
+
+  console.log(`Checked ${fixture.squares.length} squares and ${fixture.positions.length} positions: ` +
+    (failed === 0 ? 'no divergences' : `${failed} divergences`));
+  process.exit(failed === 0 ? 0 : 1);
+}
+
+main();
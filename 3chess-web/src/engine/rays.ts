@@ -142,10 +142,10 @@ export class RaySystem {
       'B8': [['A7'], ['C7', 'D6', 'I5', 'J9', 'K10', 'L11']],
       'C1': [['B2', 'A3'], ['D2', 'E3', 'F4', 'G9', 'H10']],
       'C2': [['B1'], ['D1'], ['B3', 'A4'], ['D3', 'E4', 'F9', 'G10', 'H11']],
-      'C3': [['B2', 'A1'], ['B4', 'A5'], ['D2', 'E1'], ['D4', 'E9', 'F10', 'G11', 'H12'], ['D4', 'E9', 'I5', 'J6', 'K7', 'L8']],
+      'C3': [['B2', 'A1'], ['B4', 'A5'], ['D2', 'E1'], ['D4', 'E9', 'F10', 'G11', 'H12'], ['D4', 'I5', 'J6', 'K7', 'L8']],
       'C4': [['B3', 'A2'], ['B5', 'A6'], ['D3', 'E2', 'F1'], ['D5', 'I6', 'J7', 'K8']],
       'C5': [['B4', 'A3'], ['B6', 'A7'], ['D4', 'E3', 'F2', 'G1'], ['D6', 'I7', 'J8']],
-      'C6': [['B5', 'A4'], ['B7', 'A8'], ['D5', 'E4', 'F3', 'G2', 'H1'], ['D7', 'I8']],
+      'C6': [['B5', 'A4'], ['B7', 'A8'], ['D5', 'E4', 'F3', 'G2', 'H1'], ['D5', 'I9', 'J10', 'K11', 'L12'], ['D7', 'I8']],
       'C7': [['B6', 'A5'], ['B8'], ['D8'], ['D6', 'I5', 'J9', 'K10', 'L11']],
       'C8': [['B7', 'A6'], ['D7', 'I6', 'J5', 'K9', 'L10']],
       'D1': [['C2', 'B3', 'A4'], ['E2', 'F3', 'G4', 'H9']],
@@ -180,7 +180,7 @@ export class RaySystem {
       'G10': [['H9'], ['H11'], ['F11', 'E12'], ['F9', 'E4', 'D3', 'C2', 'B1']],
       'G11': [['H10'], ['F12'], ['H12'], ['F10', 'E9', 'D4', 'C3', 'B2', 'A1'], ['F10', 'E9', 'I5', 'J6', 'K7', 'L8']],
       'G12': [['H11'], ['F11', 'E10', 'I9', 'J5', 'K6', 'L7']],
-      'H1': [['G2', 'F3', 'E4', 'D5', 'C6', 'B7', 'A8'], ['G2', 'F3', 'E4', 'D5', 'I9', 'J10', 'K11', 'L12']],
+      'H1': [['G2', 'F3', 'E4', 'D5', 'C6', 'B7', 'A8'], ['G2', 'F3', 'E4', 'I9', 'J10', 'K11', 'L12']],
       'H2': [['G1'], ['G3', 'F4', 'E9', 'I10', 'J11', 'K12']],
       'H3': [['G2', 'F1'], ['G4', 'F9', 'E10', 'I11', 'J12']],
       'H4': [['G3', 'F2', 'E1'], ['G9', 'F10', 'E11', 'I12']],
@@ -201,7 +201,7 @@ export class RaySystem {
       'J6': [['I7', 'D8'], ['K7', 'L8'], ['K5', 'L9'], ['I5', 'E9', 'F10', 'G11', 'H12'], ['I5', 'D4', 'C3', 'B2', 'A1']],
       'J5': [['K6', 'L7'], ['K9', 'L10'], ['I6', 'D7', 'C8'], ['I9', 'E10', 'F11', 'G12']],
       'J9': [['K5', 'L6'], ['K10', 'L11'], ['I10', 'E11', 'F12'], ['I5', 'D6', 'C7', 'B8']],
-      'J10': [['K11', 'L12'], ['I11', 'E12'], ['I9', 'E4', 'F3', 'G2', 'H1'], ['I9', 'D5', 'C6', 'B7', 'A8']],
+      'J10': [['K11', 'L12'], ['K9', 'L5'], ['I11', 'E12'], ['I9', 'E4', 'F3', 'G2', 'H1'], ['I9', 'D5', 'C6', 'B7', 'A8']],
       'J11': [['K12'], ['I12'], ['K10', 'L9'], ['I10', 'E9', 'F4', 'G3', 'H2']],
       'J12': [['K11', 'L10'], ['I11', 'E10', 'F9', 'G4', 'H3']],
       'K8': [['L7'], ['J7', 'I6', 'D5', 'C4', 'B3', 'A2']],
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks of the hot paths, checked against a stored baseline.
+
+Every case times one operation and reports microseconds per operation,
+the best of --repeat rounds of at least --min-time seconds each. A round
+times every case in turn, so a slow spell of the machine touches all of
+them a little rather than a few a lot:
+
+    topology.*   building the board graph and its tables, the networkx
+                 version in me.py (create_3chess_graph, rook_rays,
+                 knight_hops) and topology.py's
+    moves.*      get_valid_moves per piece type over a corpus of positions
+                 from random games, and legal_moves
+    rules.*      make_move plus unmake_move, and the full Zobrist hashes
+    serial.*     yalta.py's exp/imp strings against to_notation, to_bytes
+                 and export_state and their decoders
+    ui.*         hit testing a grid of points and drawing a frame of
+                 unified_chess.py, with the dummy video driver
+    render.*     BoardRenderer.render
+    search.*     a fixed-depth search from the starting position
+
+--save stores the results in .benchmarks/<--baseline>.json. Later runs
+compare with that file and mark every case more than --threshold slower
+as a regression, and the run then exits with status 1. Baselines are only
+comparable on the same machine and Python; a run on another warns.
+
+    python bench.py --save
+    python bench.py                     # after a change
+    python bench.py --only moves. --only rules.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".benchmarks")
+CORPUS_SIZE = 40
+
+def corpus():
+    """The positions the move and rules cases run over, the same on every run."""
+    from evaluate import random_positions
+    return random_positions(CORPUS_SIZE, seed=1)
+
+def topology_cases():
+    from topology import Topology, build_graph, derive_knight_hops
+    cases = {}
+    try:
+        import me
+    except ImportError as e:
+        print(f"skipping the me.py cases: {e}")
+    else:
+        graph = me.create_3chess_graph()
+        cases["topology.create_3chess_graph"] = (me.create_3chess_graph, 1)
+        cases["topology.rook_rays"] = (me.rook_rays, 1)
+        cases["topology.knight_hops"] = (lambda: me.knight_hops(graph), 1)
+    topology = Topology(build_graph(3, 4))
+    cases["topology.build_graph"] = (lambda: build_graph(3, 4), 1)
+    cases["topology.tables"] = (lambda: Topology(build_graph(3, 4)), 1)
+    cases["topology.derive_knight_hops"] = (
+        lambda: derive_knight_hops(topology.rank_neighbors, topology.file_neighbors), 1)
+    return cases
+
+def move_cases(positions):
+    from rules import PieceType
+    cases = {}
+    for piece_type in PieceType:
+        pairs = [(rules, node) for rules in positions
+                 for node, (player, kind) in rules.piece_positions.items()
+                 if kind == piece_type and player == rules.current_player]
+
+        def run(pairs=pairs):
+            for rules, node in pairs:
+                rules.get_valid_moves(node)
+        cases[f"moves.{piece_type.name.lower()}"] = (run, len(pairs))
+
+    def legal_moves():
+        for rules in positions:
+            rules.legal_moves()
+    cases["moves.legal_moves"] = (legal_moves, len(positions))
+    return cases
+
+def rules_cases(positions):
+    moves = [(rules, rules.legal_moves()) for rules in positions]
+
+    def make_unmake():
+        for rules, legal in moves:
+            for move in legal:
+                rules.make_move(*move)
+                rules.unmake_move()
+
+    def hashes():
+        for rules in positions:
+            rules.compute_hash()
+            rules.compute_pawn_hash()
+    return {
+        "rules.make_unmake": (make_unmake, sum(len(legal) for _, legal in moves)),
+        "rules.compute_hashes": (hashes, len(positions)),
+    }
+
+def serial_cases(positions):
+    from rules import GameRules
+    import yalta
+
+    game = yalta.Game()
+    text = game.exp()
+    notations = [rules.to_notation() for rules in positions]
+    blobs = [rules.to_bytes() for rules in positions]
+    states = [rules.export_state() for rules in positions]
+
+    def each(function, items):
+        def run():
+            for item in items:
+                function(item)
+        return run, len(items)
+    return {
+        "serial.yalta_exp": (game.exp, 1),
+        "serial.yalta_imp": (lambda: game.imp(text), 1),
+        "serial.to_notation": each(GameRules.to_notation, positions),
+        "serial.from_notation": each(GameRules.from_notation, notations),
+        "serial.to_bytes": each(GameRules.to_bytes, positions),
+        "serial.from_bytes": each(GameRules.from_bytes, blobs),
+        "serial.export_state": each(GameRules.export_state, positions),
+        "serial.from_state": each(GameRules.from_state, states),
+    }
+
+def ui_cases():
+    import pygame
+    from render import BoardRenderer
+    from unified_chess import WIDTH, HEIGHT, UnifiedChessGame
+
+    pygame.init()
+    game = UnifiedChessGame()
+    # A grid over the window, most of its points on the board, some off it
+    points = [(x, y) for x in range(0, WIDTH, 30) for y in range(0, HEIGHT, 30)]
+    game.selected_node = "B1"
+    game.possible_moves = game.get_valid_moves("B1")
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    mouse = game.cells["E2"].center
+    renderer = BoardRenderer()
+    pieces = dict(game.piece_positions)
+
+    def hit_test():
+        for point in points:
+            game.cell_at(point)
+
+    def frame():
+        game.update([], mouse)
+        game.draw(surface)
+    return {
+        "ui.hit_test": (hit_test, len(points)),
+        "ui.frame": (frame, 1),
+        "render.render": (lambda: renderer.render(pieces, last_move=("B1", "C3")), 1),
+    }
+
+def search_cases():
+    from rules import GameRules
+    from search import Search
+
+    def search():
+        Search().search(GameRules(), depth=3)
+    return {"search.depth3": (search, 1)}
+
+def collect_cases(only):
+    """Name -> (function, operations per call) of the cases whose names contain an --only text."""
+    positions = corpus()
+    cases = {}
+    cases.update(topology_cases())
+    cases.update(move_cases(positions))
+    cases.update(rules_cases(positions))
+    cases.update(serial_cases(positions))
+    cases.update(ui_cases())
+    cases.update(search_cases())
+    return {name: case for name, case in cases.items() if not only or any(text in name for text in only)}
+
+def calibrate(function, min_time):
+    """Calls of function that take at least min_time seconds."""
+    function()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls
+        calls = max(calls*2, int(calls*min_time/max(elapsed, 1e-9)))
+
+def measure(cases, repeat, min_time):
+    """Best microseconds per operation of every case.
+
+    Each round times every case once, so a spell of a slow machine costs
+    one round of every case rather than all rounds of a few. The garbage
+    collector is off while timing, as in timeit.
+    """
+    calls = {name: calibrate(function, min_time) for name, (function, _) in cases.items()}
+    best = {}
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for name, (function, operations) in cases.items():
+                start = time.perf_counter()
+                for _ in range(calls[name]):
+                    function()
+                elapsed = (time.perf_counter() - start)/(calls[name]*max(operations, 1))*1e6
+                best[name] = min(best.get(name, elapsed), elapsed)
+    finally:
+        gc.enable()
+    return best
+
+def environment():
+    return {"python": platform.python_version(), "machine": platform.machine(), "node": platform.node()}
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "results": results}, f, indent=1, sort_keys=True)
+
+def compare(results, baseline, threshold):
+    """Lines of the comparison table and the names of the regressed cases."""
+    lines = [f"{'case':<32} {'us/op':>11} {'baseline':>11} {'change':>8}"]
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name) if baseline else None
+        if before is None:
+            lines.append(f"{name:<32} {now:>11.2f} {'-':>11} {'':>8}")
+            continue
+        change = now/before - 1
+        mark = ""
+        if change > threshold:
+            mark = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  faster"
+        lines.append(f"{name:<32} {now:>11.2f} {before:>11.2f} {change:>+8.1%}{mark}")
+    return lines, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot paths and compare with a stored baseline.")
+    parser.add_argument("--only", action="append", metavar="TEXT", help="run the cases whose names contain TEXT, repeatable")
+    parser.add_argument("--baseline", default="baseline", help="name of the baseline in .benchmarks/")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=7, help="rounds, each timing every case once; the best counts")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per round at least")
+    args = parser.parse_args()
+
+    path = os.path.join(BASELINE_DIR, args.baseline + ".json")
+    stored = load_baseline(path)
+    if stored and stored["environment"] != environment():
+        print(f"warning: the baseline was taken on {stored['environment']}, this is {environment()}")
+
+    cases = collect_cases(args.only)
+    if not cases:
+        parser.error("no case matches --only")
+    results = measure(cases, args.repeat, args.min_time)
+
+    lines, regressions = compare(results, stored["results"] if stored else None, args.threshold)
+    print("\n".join(lines))
+    if args.save:
+        if stored and args.only:
+            # Keep the cases this run left out
+            results = dict(stored["results"], **results)
+        save_baseline(path, results)
+        print(f"Saved {len(results)} results to {path}")
+    elif regressions:
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    elif stored is None:
+        print(f"No baseline at {path}; run with --save to store one")
+
+if __name__ == "__main__":
+    main()
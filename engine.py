@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Line-based engine protocol around search.py, for running the engine as a subprocess.
+
+Modelled on UCI: commands arrive one per line on stdin and answers go to
+stdout, flushed line by line.
+
+    uci                                 -> id ..., option ..., uciok
+    isready                             -> readyok
+    setoption name Board value 4x6      play on a generated variant board
+    setoption name Tablebase value true probe the tables in .tablebase/
+    ucinewgame                          forget the transposition table
+    position startpos [moves E2 E4 ...]
+    position notation <pieces> <player> <ply> [<clock>] [moves ...]
+    go [depth N] [nodes N] [movetime MS] [infinite] [ponder]
+                                        -> info depth 3 score 12 nodes 5123 nps 14230
+                                           time 360 pv E2 E4 I7 I5 ...
+                                        -> bestmove E2 E4 [ponder I7 I5 L7 L5]
+    ponderhit                           the pondered position came up: search it
+                                        as a normal go from now on
+    stop                                end the search; its bestmove follows
+    d                                   -> info string <the position in notation>
+    quit
+
+A move is two square names, "E2 E4"; "E2-E4" is read as well. Positions in
+notation are written by GameRules.to_notation. The search runs in a worker
+thread, so stop, isready and quit are answered while it thinks, and a go
+without limits searches until stop. With no move to play the answer is
+"bestmove none".
+
+Between two turns of the engine both opponents move. bestmove names the
+replies the principal variation expects after "ponder", and "go ponder" on
+the position they lead to thinks without a time or node limit and holds its
+bestmove until ponderhit or stop; after ponderhit the go's limits apply,
+its movetime and nodes counted from then. The transposition table is kept between searches, so a search after
+a wrong guess still starts from what pondering found.
+
+    python engine.py
+"""
+import argparse
+import sys
+import threading
+import time
+
+from rules import GameRules
+from search import Search, SearchLimits, MAX_DEPTH
+from tablebase import Tablebase
+from topology import generate_topology
+
+ENGINE_NAME = "3chess"
+
+class Engine:
+    """Protocol state: the position, the search and the worker thinking on it."""
+
+    def __init__(self, out=sys.stdout, board=(3, 4)):
+        self.out = out
+        self.lock = threading.Lock()
+        self.worker = None
+        self.stop = None
+        self.ponderhit = None
+        self.search_limits = None
+        self.use_tablebase = False
+        self.set_board(board)
+
+    def send(self, line):
+        with self.lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def set_board(self, board):
+        self.board = board
+        self.topology = generate_topology(*board)
+        self.rules = GameRules(topology=self.topology)
+        self.new_search()
+
+    def new_search(self):
+        tablebase = Tablebase(self.topology) if self.use_tablebase else None
+        self.search = Search(on_iteration=self.info, tablebase=tablebase)
+
+    def handle(self, line):
+        """Act on one command line; return False on quit."""
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "quit":
+            self.halt()
+            return False
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send("id author the 3chess authors")
+            self.send(f"option name Board type string default {self.board[0]}x{self.board[1]}")
+            self.send(f"option name Tablebase type check default {str(self.use_tablebase).lower()}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "stop":
+            if self.stop is not None:
+                self.stop.set()
+                self.ponderhit.set()
+        elif command == "ponderhit":
+            self.ponder_hit()
+        elif command == "ucinewgame":
+            self.halt()
+            self.search.clear()
+        elif command == "setoption":
+            self.halt()
+            self.set_option(args)
+        elif command == "position":
+            self.halt()
+            self.set_position(args)
+        elif command == "go":
+            self.halt()
+            self.go(args)
+        elif command == "d":
+            self.send(f"info string {self.rules.to_notation()}")
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        text = " ".join(args)
+        if not text.startswith("name ") or " value " not in text:
+            self.send("info string expected setoption name <name> value <value>")
+            return
+        name, value = text[len("name "):].split(" value ", 1)
+        name, value = name.strip().lower(), value.strip()
+        try:
+            if name == "board":
+                self.set_board(tuple(int(n) for n in value.lower().split("x")))
+            elif name == "tablebase":
+                self.use_tablebase = value.lower() == "true"
+                self.new_search()
+            else:
+                self.send(f"info string unknown option {name}")
+        except ValueError as e:
+            self.send(f"info string bad value {value}: {e}")
+
+    def set_position(self, args):
+        """position startpos|notation ... [moves ...]; the position is unchanged on errors."""
+        if "moves" in args:
+            split = args.index("moves")
+            args, moves = args[:split], args[split + 1:]
+        else:
+            moves = []
+        try:
+            if args[:1] == ["startpos"]:
+                rules = GameRules(topology=self.topology)
+            elif args[:1] == ["notation"]:
+                rules = GameRules.from_notation(" ".join(args[1:]), self.topology)
+            else:
+                raise ValueError("expected startpos or notation")
+            squares = [square for word in moves for square in word.split("-") if square]
+            if len(squares) % 2:
+                raise ValueError(f"{squares[-1]} has no destination")
+            for from_node, to_node in zip(squares[::2], squares[1::2]):
+                if rules.winner() is not None or not rules.is_legal(from_node, to_node):
+                    raise ValueError(f"illegal move {from_node} {to_node}")
+                rules.make_move(from_node, to_node)
+        except ValueError as e:
+            self.send(f"info string {e}")
+            return
+        self.rules = rules
+
+    def go(self, args):
+        limits = {"depth": MAX_DEPTH, "nodes": None, "movetime": None}
+        for name, value in zip(args, args[1:]):
+            if name in limits and value.isdigit():
+                limits[name] = int(value)
+        if limits["movetime"] is not None:
+            limits["movetime"] /= 1000
+        self.limits = limits
+        self.stop = threading.Event()
+        self.ponderhit = threading.Event()
+        # Pondering searches without limits until ponderhit sets them
+        if "ponder" in args:
+            self.search_limits = SearchLimits()
+        else:
+            self.search_limits = SearchLimits(limits["nodes"], limits["movetime"])
+            self.ponderhit.set()
+        self.started = time.perf_counter()
+        self.searched = self.tb_hits = 0
+        self.worker = threading.Thread(target=self.think, args=(self.rules.copy(), limits["depth"], self.search_limits,
+                                                                self.stop, self.ponderhit), daemon=True)
+        self.worker.start()
+
+    def ponder_hit(self):
+        """Turn a go ponder into a normal go, with its limits counted from now."""
+        if self.worker is None or self.ponderhit.is_set():
+            return
+        self.search_limits.set(self.limits["nodes"], self.limits["movetime"])
+        self.ponderhit.set()
+
+    def think(self, rules, depth, limits, stop, ponderhit):
+        if rules.winner() is not None or not rules.legal_moves():
+            ponderhit.wait()
+            self.send("bestmove none")
+            return
+        move, _ = self.search.search(rules, depth, stop=stop, limits=limits)
+        if move is None:
+            move = rules.legal_moves()[0]
+        # A bestmove is only due once the pondered position comes up
+        ponderhit.wait()
+        line = f"bestmove {move[0]} {move[1]}"
+        prediction = self.search.predicted_turn(rules, move)
+        if prediction and prediction[0]:
+            line += " ponder " + " ".join(f"{a} {b}" for a, b in prediction[0])
+        self.send(line)
+
+    def info(self, stats):
+        """Report a finished iteration; called on the worker thread."""
+        self.searched += stats["nodes"] + stats["qnodes"]
+        self.tb_hits += stats["tb_hits"]
+        elapsed = time.perf_counter() - self.started
+        pv = " ".join(f"{a} {b}" for a, b in stats["pv"])
+        self.send(f"info depth {stats['depth']} score {stats['score']} nodes {self.searched} "
+                  f"nps {self.searched/elapsed if elapsed else 0:.0f} time {elapsed*1000:.0f} "
+                  f"tbhits {self.tb_hits} pv {pv}")
+
+    def halt(self):
+        """Stop the worker, if any, and wait for its bestmove."""
+        if self.worker is not None:
+            self.stop.set()
+            self.ponderhit.set()
+            self.worker.join()
+            self.worker = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the engine behind a UCI-style protocol on stdin/stdout.")
+    parser.add_argument("--board", default="3x4", help="PLAYERSxSIZE of the board (default 3x4, the standard board)")
+    args = parser.parse_args()
+
+    engine = Engine(board=tuple(int(n) for n in args.board.lower().split("x")))
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.halt()
+
+if __name__ == "__main__":
+    main()
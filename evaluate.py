@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Static evaluation of 3Chess positions, one score per player.
+
+Scores are in centipawns and indexed by player value, like GameRules.scores:
+
+    material, placement   GameRules.scores, kept up to date by make_move and
+                          unmake_move from the piece-square tables in
+                          RuleTables; pawns gain value as they near a
+                          foreign back rank
+    pawn structure        doubled, isolated and pawn-protected pawns
+    king safety           friendly pieces around the king, enemies next to it
+    bishop pair           bishops on both square colors
+    mobility              squares the knights and sliders reach, on request
+
+The first term costs nothing at a leaf and king safety and the bishop pair
+one pass over the pieces. Mobility walks every ray, so it is only added when
+asked for. Eliminated players score ELIMINATED.
+
+Pawn structure depends on the pawns alone, which rarely move, so an
+Evaluator caches it by GameRules.pawn_hash, and whole evaluations by the
+position hash in a small LRU cache. Both caches count hits and misses so
+their sizes can be tuned.
+
+Run `python evaluate.py` to measure evaluations per second on positions from
+random games, and `--cache` to replay games through an Evaluator and report
+its hit rates.
+"""
+import argparse
+import random
+import time
+from collections import OrderedDict
+
+from rules import GameRules, PieceType
+from topology import generate_topology
+
+ELIMINATED = -1000000
+
+KING_SHIELD = 12  # per friendly piece next to the king
+KING_ATTACKER = 30  # per enemy piece next to the king
+BISHOP_PAIR = 30
+
+DOUBLED_PAWN = 15  # per pawn beyond the first on a file
+ISOLATED_PAWN = 12  # per pawn with no friendly pawn on a neighbouring file
+PROTECTED_PAWN = 8  # per pawn a friendly pawn could recapture on
+
+# Per square reached
+MOBILITY_WEIGHTS = {
+    PieceType.KNIGHT: 4,
+    PieceType.BISHOP: 3,
+    PieceType.ROOK: 2,
+    PieceType.QUEEN: 1,
+}
+
+def evaluate(rules, mobility=False, structure=None):
+    """Return the score of every player of a position, indexed by player value.
+    
+    structure, if given, is pawn_structure(rules) already computed.
+    """
+    if structure is None:
+        structure = pawn_structure(rules)
+    scores = [score + pawn_score for score, pawn_score in zip(rules.scores, structure)]
+    positions = rules.piece_positions
+    eliminated = rules.eliminated
+    colors = rules.tables.square_colors
+
+    kings = []
+    bishop_colors = [0]*len(scores)
+    for node, (player, piece_type) in positions.items():
+        if piece_type == PieceType.KING:
+            kings.append((node, player))
+        elif piece_type == PieceType.BISHOP:
+            bishop_colors[player.value] |= 1 << colors[node]
+
+    neighbors = rules.tables.neighbors
+    for node, player in kings:
+        for neighbor in neighbors[node]:
+            piece = positions.get(neighbor)
+            if piece is None:
+                continue
+            if piece[0] == player:
+                scores[player.value] += KING_SHIELD
+            elif piece[0] not in eliminated:
+                scores[player.value] -= KING_ATTACKER
+
+    for value, mask in enumerate(bishop_colors):
+        if mask == 3:
+            scores[value] += BISHOP_PAIR
+
+    if mobility:
+        for value, reach in enumerate(mobility_scores(rules)):
+            scores[value] += reach
+
+    for player in eliminated:
+        scores[player.value] = ELIMINATED
+    return scores
+
+_pawn_tables = {}
+
+def pawn_tables(rules):
+    """Return the pawn-structure tables of the board rules is played on.
+    
+    files        {node: file letter}
+    adjacent     {file letter: letters of the neighbouring files}
+    guards       {node: squares a pawn protects node from, per player value}
+    """
+    tables = rules.tables
+    if tables not in _pawn_tables:
+        files = {node: node.rstrip("0123456789") for node in tables.squares}
+        adjacent = {letter: set() for letter in files.values()}
+        for node, letter in files.items():
+            for neighbor in tables.topology.rank_neighbors[tables.square_index[node]]:
+                adjacent[letter].add(files[tables.squares[neighbor]])
+        guards = {node: [()]*len(tables.players) for node in tables.squares}
+        for node in tables.squares:
+            for player in tables.players:
+                guards[node][player.value] = tuple(neighbor for neighbor in tables.diag_neighbors[node]
+                                                   if rules.is_pawn_forward(neighbor, node, player))
+        _pawn_tables[tables] = (files, adjacent, guards)
+    return _pawn_tables[tables]
+
+def pawn_structure(rules):
+    """Doubled, isolated and protected pawn scores per player value."""
+    files, adjacent, guards = pawn_tables(rules)
+    positions = rules.piece_positions
+    scores = [0]*len(rules.tables.players)
+    pawns = {}
+    for node, piece in positions.items():
+        if piece[1] is PieceType.PAWN:
+            if piece in pawns:
+                pawns[piece].append(node)
+            else:
+                pawns[piece] = [node]
+
+    for pawn, nodes in pawns.items():
+        value = pawn[0].value
+        counts = {}
+        for node in nodes:
+            letter = files[node]
+            counts[letter] = counts.get(letter, 0) + 1
+        score = 0
+        for letter, count in counts.items():
+            score -= DOUBLED_PAWN*(count - 1)
+            if counts.keys().isdisjoint(adjacent[letter]):
+                score -= ISOLATED_PAWN*count
+        for node in nodes:
+            for guard in guards[node][value]:
+                if positions.get(guard) == pawn:
+                    score += PROTECTED_PAWN
+                    break
+        scores[value] = score
+    return scores
+
+class Evaluator:
+    """Evaluation with a pawn-structure cache and an LRU cache of whole evaluations.
+    
+    The pawn cache keeps up to pawn_entries structures by pawn hash and is
+    emptied when full, the evaluation cache keeps the eval_entries most
+    recently used evaluations by position hash. A bot keeps one Evaluator
+    per game or process; positions of different boards must not share one.
+    """
+    
+    def __init__(self, eval_entries=4096, pawn_entries=16384, mobility=False):
+        self.eval_entries = eval_entries
+        self.pawn_entries = pawn_entries
+        self.mobility = mobility
+        self.eval_cache = OrderedDict()
+        self.pawn_cache = {}
+        self.eval_hits = self.eval_misses = self.eval_evictions = 0
+        self.pawn_hits = self.pawn_misses = self.pawn_clears = 0
+    
+    def evaluate(self, rules):
+        """Return evaluate(rules) from the caches where possible; treat it as read-only."""
+        scores = self.eval_cache.get(rules.hash)
+        if scores is not None:
+            self.eval_hits += 1
+            self.eval_cache.move_to_end(rules.hash)
+            return scores
+        self.eval_misses += 1
+        scores = evaluate(rules, self.mobility, self.pawn_structure(rules))
+        self.eval_cache[rules.hash] = scores
+        if len(self.eval_cache) > self.eval_entries:
+            self.eval_cache.popitem(last=False)
+            self.eval_evictions += 1
+        return scores
+    
+    def pawn_structure(self, rules):
+        structure = self.pawn_cache.get(rules.pawn_hash)
+        if structure is not None:
+            self.pawn_hits += 1
+            return structure
+        self.pawn_misses += 1
+        if len(self.pawn_cache) >= self.pawn_entries:
+            self.pawn_cache.clear()
+            self.pawn_clears += 1
+        structure = self.pawn_cache[rules.pawn_hash] = pawn_structure(rules)
+        return structure
+    
+    def clear(self):
+        self.eval_cache.clear()
+        self.pawn_cache.clear()
+    
+    def stats(self):
+        """Hit counters and rates of both caches."""
+        def rate(hits, misses):
+            return hits / (hits + misses) if hits + misses else 0.0
+        return {
+            "eval_hits": self.eval_hits,
+            "eval_misses": self.eval_misses,
+            "eval_evictions": self.eval_evictions,
+            "eval_hit_rate": rate(self.eval_hits, self.eval_misses),
+            "eval_size": len(self.eval_cache),
+            "pawn_hits": self.pawn_hits,
+            "pawn_misses": self.pawn_misses,
+            "pawn_clears": self.pawn_clears,
+            "pawn_hit_rate": rate(self.pawn_hits, self.pawn_misses),
+            "pawn_size": len(self.pawn_cache),
+        }
+
+def mobility_scores(rules):
+    """Weighted squares reached by each player's knights and sliders."""
+    scores = [0]*len(rules.tables.players)
+    positions = rules.piece_positions
+    for node, (player, piece_type) in positions.items():
+        weight = MOBILITY_WEIGHTS.get(piece_type)
+        if not weight or player in rules.eliminated:
+            continue
+        reach = 0
+        if piece_type == PieceType.KNIGHT:
+            for target in rules.knight_hop_dict[node]:
+                piece = positions.get(target)
+                if piece is None or piece[0] != player:
+                    reach += 1
+        else:
+            rays = []
+            if piece_type != PieceType.BISHOP:
+                rays += rules.rook_ray_dict[node]
+            if piece_type != PieceType.ROOK:
+                rays += rules.bishop_ray_dict[node]
+            for ray in rays:
+                for target in ray:
+                    piece = positions.get(target)
+                    if piece is not None:
+                        if piece[0] != player:
+                            reach += 1
+                        break
+                    reach += 1
+        scores[player.value] += weight*reach
+    return scores
+
+def relative_score(scores, player):
+    """Score of player minus that of its strongest opponent."""
+    best_opponent = max((score for value, score in enumerate(scores) if value != player.value), default=0)
+    return scores[player.value] - best_opponent
+
+def random_positions(count, seed=0, max_plies=150, topology=None):
+    """Return count positions taken at random points of random games."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        rules = GameRules(topology=topology)
+        for _ in range(rng.randrange(max_plies)):
+            moves = rules.legal_moves()
+            if not moves or rules.winner():
+                break
+            rules.make_move(*rng.choice(moves))
+        positions.append(rules)
+    return positions
+
+def cache_benchmark(evaluator, games, seed, depth, topology):
+    """Evaluate every position one move deep along random games, the way a
+    shallow search revisits them, and return the elapsed time."""
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(games):
+        rules = GameRules(topology=topology)
+        for _ in range(150):
+            moves = rules.legal_moves()
+            if not moves or rules.winner():
+                break
+            for move in rng.sample(moves, min(depth, len(moves))):
+                rules.make_move(*move)
+                evaluator.evaluate(rules)
+                rules.unmake_move()
+            evaluator.evaluate(rules)
+            rules.make_move(*rng.choice(moves))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure evaluations per second.")
+    parser.add_argument("--positions", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--board", default="3x4", help="PLAYERSxSIZE of the board (default 3x4, the standard board)")
+    parser.add_argument("--cache", action="store_true", help="report cache hit rates instead")
+    parser.add_argument("--games", type=int, default=20, help="games replayed with --cache")
+    parser.add_argument("--eval-entries", type=int, default=4096)
+    parser.add_argument("--pawn-entries", type=int, default=16384)
+    args = parser.parse_args()
+
+    players, size = (int(n) for n in args.board.lower().split("x"))
+    topology = generate_topology(players, size)
+    if args.cache:
+        evaluator = Evaluator(args.eval_entries, args.pawn_entries)
+        elapsed = cache_benchmark(evaluator, args.games, args.seed, 8, topology)
+        stats = evaluator.stats()
+        evaluations = stats["eval_hits"] + stats["eval_misses"]
+        print(f"{evaluations} evaluations in {elapsed:.2f} s: {evaluations/elapsed:.0f} evals/s")
+        for name, value in stats.items():
+            print(f"  {name:<16} {value:.3f}" if isinstance(value, float) else f"  {name:<16} {value}")
+        return
+
+    positions = random_positions(args.positions, args.seed, topology=topology)
+
+    timings = [
+        ("running scores", lambda rules: list(rules.scores)),
+        ("scores from scratch", lambda rules: rules.compute_scores()),
+        ("evaluate", evaluate),
+        ("evaluate with mobility", lambda rules: evaluate(rules, mobility=True)),
+        ("pawn structure", pawn_structure),
+    ]
+    for name, function in timings:
+        start = time.perf_counter()
+        for rules in positions:
+            function(rules)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24} {len(positions)/elapsed:>10.0f} evals/s")
+
+    # The incremental scores must agree with a recomputation everywhere
+    stale = sum(1 for rules in positions if rules.scores != rules.compute_scores())
+    if stale:
+        print(f"{stale} positions have stale running scores")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Random-playout fuzzer and stress benchmark for the rules engine.
+
+Plays random games from the starting position with GameRules and checks
+invariants after every move:
+
+    kings       every living player has exactly one king, eliminated players none
+    squares     every piece stands on a square of the board
+    counts      no player ever gains pieces, and captures remove exactly one
+    hash        the incremental hash and pawn hash match a full recomputation,
+                and make_move followed by unmake_move restores position and hashes
+    scores      the running piece-square scores match a full recomputation
+    symmetry    turning the position one sector turns its legal moves and
+                piece-square scores with it
+
+A violation is reported with the seed of its game and the ply it happened
+at, so it can be replayed with --seed and --games 1. Run with --bench to skip
+the checks and measure raw playouts per second, --board to fuzz a generated
+variant board, and --scaling to compare move generation across boards:
+
+    python fuzz.py --games 20 --scaling 2x4 3x4 4x4 3x6 4x6 6x4
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from rules import GameRules, PieceType
+from topology import generate_topology
+
+def check_position(rules, counts_before, captured):
+    """Return the names of the invariants the position violates."""
+    failures = []
+
+    kings = Counter(player for player, piece_type in rules.piece_positions.values() if piece_type == PieceType.KING)
+    for player in rules.turn_order:
+        expected = 0 if player in rules.eliminated else 1
+        if kings[player] != expected:
+            failures.append("kings")
+            break
+
+    if any(node not in rules.tables.square_index for node in rules.piece_positions):
+        failures.append("squares")
+
+    counts = Counter(player for player, _ in rules.piece_positions.values())
+    lost = {player: counts_before[player] - counts[player] for player in counts_before}
+    expected_lost = {player: 0 for player in counts_before}
+    if captured:
+        expected_lost[captured[0]] = 1
+    if lost != expected_lost:
+        failures.append("counts")
+
+    if rules.hash != rules.compute_hash() or rules.pawn_hash != rules.compute_pawn_hash():
+        failures.append("hash")
+
+    if rules.scores != rules.compute_scores():
+        failures.append("scores")
+
+    return failures
+
+def check_make_unmake(rules, move):
+    """Make and take back a move; return True if nothing changed."""
+    before = (rules.to_bytes(), rules.hash, rules.pawn_hash, list(rules.scores), len(rules.history))
+    rules.make_move(*move)
+    rules.unmake_move()
+    return before == (rules.to_bytes(), rules.hash, rules.pawn_hash, rules.scores, len(rules.history))
+
+def check_symmetry(rules, moves):
+    """Return the piece types whose moves don't turn with the board, and
+    SCORES if the piece-square scores don't."""
+    rotation = rules.tables.square_rotation
+    expected = {(rotation[a], rotation[b]) for a, b in moves}
+    rotated = rules.rotated()
+    actual = set(rotated.legal_moves())
+    broken = sorted({rotated.piece_positions[a][1].name for a, _ in expected ^ actual})
+    players = rules.tables.player_rotation
+    if any(rotated.scores[players[p].value] != rules.scores[p.value] for p in rules.turn_order):
+        broken.append("SCORES")
+    return broken
+
+def playout(seed, max_plies, checks=True, failures=None, topology=None, stats=None):
+    """Play one random game; return the number of plies played.
+
+    With checks on, violations are added to failures as
+    (invariant, seed, moves so far). stats, if given, counts the legal
+    moves generated under "moves".
+    """
+    rng = random.Random(seed)
+    rules = GameRules(topology=topology)
+    played = []
+    for _ in range(max_plies):
+        moves = rules.legal_moves()
+        if not moves or rules.winner():
+            break
+        if stats is not None:
+            stats["moves"] += len(moves)
+        move = rng.choice(moves)
+
+        if checks:
+            broken = []
+            # Probe a different move than the one played, without touching rng
+            if not check_make_unmake(rules, moves[len(played) % len(moves)]):
+                broken.append("make/unmake")
+            broken += [f"symmetry ({name.lower()})" for name in check_symmetry(rules, moves)]
+            counts_before = Counter(player for player, _ in rules.piece_positions.values())
+
+        captured = rules.make_move(*move)
+        played.append(move)
+
+        if checks:
+            broken += check_position(rules, counts_before, captured)
+            for name in broken:
+                failures.append((name, seed, list(played)))
+            if broken:
+                break
+    return len(played)
+
+def scaling(boards, games, max_plies):
+    """Time random playouts without checks on each (players, size) board."""
+    print(f"{'board':>8} {'squares':>8} {'plies/s':>9} {'moves/ply':>10} {'moves/s':>9}")
+    for players, size in boards:
+        topology = generate_topology(players, size)
+        stats = {"moves": 0}
+        plies = 0
+        start = time.perf_counter()
+        for seed in range(games):
+            plies += playout(seed, max_plies, False, topology=topology, stats=stats)
+        elapsed = time.perf_counter() - start
+        print(f"{players}x{size:<6} {len(topology.squares):>8} {plies/elapsed:>9.0f} "
+              f"{stats['moves']/max(plies, 1):>10.1f} {stats['moves']/elapsed:>9.0f}")
+
+def parse_board(value):
+    players, size = value.lower().split("x")
+    return int(players), int(size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the rules engine with random playouts.")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--bench", action="store_true", help="skip the invariant checks")
+    parser.add_argument("--board", type=parse_board, default=(3, 4),
+                        help="PLAYERSxSIZE of a generated board, e.g. 4x6 (default 3x4, the standard board)")
+    parser.add_argument("--scaling", type=parse_board, nargs="+", metavar="PLAYERSxSIZE",
+                        help="compare move generation speed across boards instead of fuzzing")
+    args = parser.parse_args()
+
+    if args.scaling:
+        scaling(args.scaling, args.games, args.max_plies)
+        return
+
+    topology = generate_topology(*args.board)
+    failures = []
+    plies = 0
+    start = time.perf_counter()
+    for i in range(args.games):
+        plies += playout(args.seed + i, args.max_plies, not args.bench, failures, topology)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} playouts, {plies} plies in {elapsed:.2f} s: "
+          f"{args.games/elapsed:.1f} playouts/s, {plies/elapsed:.0f} plies/s"
+          + (" (checks off)" if args.bench else ""))
+
+    if args.bench:
+        return
+    by_name = Counter(name for name, _, _ in failures)
+    for name, count in sorted(by_name.items()):
+        _, seed, moves = next(f for f in failures if f[0] == name)
+        last = f"{moves[-1][0]}-{moves[-1][1]}" if moves else "the start"
+        print(f"{name}: {count} games, first in seed {seed} at ply {len(moves)} after {last}")
+    if failures:
+        raise SystemExit(1)
+    print("No invariant violations")
+
+if __name__ == "__main__":
+    main()
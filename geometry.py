@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""2D geometry shared by the pygame boards (unified_chess.py, yalta.py).
+
+Vec is an immutable (x, y) tuple: it unpacks, indexes and hashes like one
+and goes straight into pygame calls, and its arithmetic builds the result
+tuple in a single step. Cell corners are plain tuples of Vecs, and a point
+is tested against them with contains(), a cross-product test for convex
+polygons, instead of building a shapely polygon per test.
+
+Run `python geometry.py` to time building every cell of the board and
+drawing a frame, offscreen.
+"""
+import argparse
+import os
+import time
+from math import sqrt
+
+# Builds a Vec without going through Vec.__new__
+_new = tuple.__new__
+
+class Vec(tuple):
+    """Immutable 2D vector; v*w is the dot product, v*k scales."""
+    __slots__ = ()
+
+    def __new__(cls, x=0, y=0):
+        return _new(cls, (x, y))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+    def __add__(self, v):
+        return _new(Vec, (self[0] + v[0], self[1] + v[1]))
+
+    def __sub__(self, v):
+        return _new(Vec, (self[0] - v[0], self[1] - v[1]))
+
+    def __mul__(self, m):
+        if m.__class__ is Vec:
+            return self[0]*m[0] + self[1]*m[1]
+        return _new(Vec, (self[0]*m, self[1]*m))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, n):
+        return _new(Vec, (self[0]/n, self[1]/n))
+
+    def __neg__(self):
+        return _new(Vec, (-self[0], -self[1]))
+
+    def int(self):
+        return _new(Vec, (int(self[0]), int(self[1])))
+
+    def mag(self):
+        return sqrt(self[0]**2 + self[1]**2)
+
+    def __repr__(self):
+        return f"({self[0]};{self[1]})"
+
+def bounds(points):
+    """(min x, min y, max x, max y) of points."""
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def contains(points, pos, box=None):
+    """Whether pos lies strictly inside the convex polygon with corners points.
+
+    box, the polygon's bounds() if given, rejects most points before the
+    edge tests.
+    """
+    x, y = pos
+    if box is not None and not (box[0] < x < box[2] and box[1] < y < box[3]):
+        return False
+    sign = 0
+    previous = points[-1]
+    for point in points:
+        cross = (point[0] - previous[0])*(y - previous[1]) - (point[1] - previous[1])*(x - previous[0])
+        if cross == 0:
+            return False
+        if sign == 0:
+            sign = 1 if cross > 0 else -1
+        elif (cross > 0) != (sign > 0):
+            return False
+        previous = point
+    return True
+
+def benchmark(repeat):
+    """Time building every cell of the board and drawing a frame with a
+    selected piece, its moves highlighted and the mouse over a cell."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from unified_chess import WIDTH, HEIGHT, Cell, UnifiedChessGame, create_node_mapping
+
+    pygame.init()
+    mapping = create_node_mapping()
+    game = UnifiedChessGame()
+    game.selected_node = "B1"
+    game.possible_moves = game.get_valid_moves("B1")
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    mouse = game.cells["E2"].center
+
+    def build():
+        return [Cell(node, x, y) for node, (x, y) in mapping.items()]
+
+    def frame():
+        surface.fill((25, 25, 25))
+        game.update([], mouse)
+        game.draw(surface)
+
+    frame()
+    for name, function in (("build all cells", build), ("update and draw a frame", frame)):
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                function()
+            best = min(best, (time.perf_counter() - start)/repeat)
+        print(f"{name:<24} {best*1000:>8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time building the board's cells and drawing a frame.")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per timing, best of five")
+    args = parser.parse_args()
+    benchmark(args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
+import hashlib
+import json
+import os
+import sys
 import networkx as nx
+import numpy as np
 from enum import Enum
 import matplotlib.pyplot as plt
 
@@ -147,12 +152,44 @@ def connect_sections(G):
         node2 = f"{file}9"
         G.add_edge(node1, node2, edge_type=EdgeType.FILE.value)
 
-def create_positions(G, layout_choice):
-    """Create node positions for visualization."""
-    file_to_x = {'A': 0, 'B': 1, 'C': 2, 'D': 3, 'E': 4, 'F': 5, 'G': 6, 'H': 7, 'I': 8, 'J': 9, 'K': 10, 'L': 11}
+def layout_cache_path(G, key):
+    """Cache file for a computed layout of G, named by its nodes, edges and parameters."""
+    from topology import ARTIFACT_DIR
+    
+    digest = hashlib.sha256(repr(key).encode())
+    digest.update(repr(list(G.nodes())).encode())
+    digest.update(repr(sorted((min(u, v), max(u, v), d) for u, v, d in G.edges(data='edge_type'))).encode())
+    return os.path.join(ARTIFACT_DIR, f"layout-{digest.hexdigest()[:16]}.json")
+
+def create_positions(G, layout_choice, polygons=None):
+    """Create node positions for visualization.
+    polygons maps nodes to their square's corners on a generated board (topology.layout)
+    and enables the board layout.
+    """
+    if layout_choice == "3" and polygons:
+        # Board layout: the centre of each square's polygon
+        pos = {}
+        for node, polygon in polygons.items():
+            pos[node] = (sum(x for x, _ in polygon) / len(polygon), sum(y for _, y in polygon) / len(polygon))
+        return pos, "3Chess Board Graph Visualization (Board Layout)"
+    
+    # Grid positions: file letter across, rank number up
+    initial_pos = {}
+    for node in G.nodes():
+        file_letter = node[0]
+        rank_number = int(node[1:])
+        initial_pos[node] = (ord(file_letter) - ord('A'), rank_number)
     
     if layout_choice == "2":
-        # Force-directed layout with initial positions based on grid
+        # Force-directed layout with initial positions based on grid.
+        # 20000 iterations take a while, so the result is cached on disk per graph.
+        iterations = 20000
+        cache_path = layout_cache_path(G, ("spring", 10, iterations))
+        title = "3Chess Board Graph Visualization (Force-Directed)"
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                return {node: tuple(xy) for node, xy in json.load(f).items()}, title
+        
         # Create a graph without diagonal edges for force-directed layout
         G_layout = nx.Graph()
         G_layout.add_nodes_from(G.nodes())
@@ -162,179 +199,175 @@ def create_positions(G, layout_choice):
             if d.get('edge_type') != EdgeType.DIAG.value:
                 G_layout.add_edge(u, v)
         
-        initial_pos = {}
-        
-        for node in G.nodes():
-            file_letter = node[0]
-            rank_number = int(node[1:])
-            x = file_to_x[file_letter]
-            y = rank_number
-            initial_pos[node] = (x, y)
-        
         # Use spring layout with initial positions - adjust k parameter for longer edges
-        pos = nx.spring_layout(G_layout, pos=initial_pos, k=10, iterations=20000, fixed=None)
-        title = "3Chess Board Graph Visualization (Force-Directed)"
-    else:
-        # Grid layout (original positioning)
-        pos = {}
-        
-        for node in G.nodes():
-            file_letter = node[0]
-            rank_number = int(node[1:])
-            x = file_to_x[file_letter]
-            y = rank_number
-            pos[node] = (x, y)
-        
-        title = "3Chess Board Graph Visualization (Grid Layout)"
-    
-    return pos, title
+        pos = nx.spring_layout(G_layout, pos=initial_pos, k=10, iterations=iterations, fixed=None)
+        pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump(pos, f)
+        except OSError:
+            pass
+        return pos, title
+    
+    # Grid layout (original positioning)
+    return initial_pos, "3Chess Board Graph Visualization (Grid Layout)"
+
+def draw_static_layers(G, pos, ax, node_colors):
+    """Draw the nodes, edges and labels, which never change.
+    Returns the node labels by node."""
+    # Draw nodes with their square colors and black edge color for stroke
+    nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=300, edgecolors='black', linewidths=1, ax=ax)
+
+    # Separate edges by type and draw with different colors
+    edges_rank = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.RANK.value]
+    edges_file = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.FILE.value]
+    edges_diag = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.DIAG.value]
+
+    # Draw rank edges in red
+    nx.draw_networkx_edges(G, pos, edgelist=edges_rank, edge_color='red', width=1, ax=ax)
+
+    # Draw file edges in blue
+    nx.draw_networkx_edges(G, pos, edgelist=edges_file, edge_color='blue', width=1, ax=ax)
+
+    # Draw diagonal edges in green
+    nx.draw_networkx_edges(G, pos, edgelist=edges_diag, edge_color='green', width=1, ax=ax)
 
-def on_click(event, G, pos, ax, rook_ray_dict, knight_hop_dict, bishop_ray_dict):
+    # Draw labels
+    return nx.draw_networkx_labels(G, pos, font_size=8, font_weight='bold', ax=ax)
+
+def draw_highlights(explorer):
+    """Draw the highlight layer over the saved static layers and show it."""
+    canvas = explorer['ax'].figure.canvas
+    ax = explorer['ax']
+    canvas.restore_region(explorer['background'])
+    ax.draw_artist(explorer['highlights'])
+    for node in explorer['highlighted']:
+        ax.draw_artist(explorer['labels'][node])
+    ax.draw_artist(ax.title)
+    canvas.blit(ax.figure.bbox)
+
+def on_draw(event, explorer):
+    """Save the static layers after every full redraw (start-up, resize, zoom)."""
+    explorer['background'] = event.canvas.copy_from_bbox(event.canvas.figure.bbox)
+    draw_highlights(explorer)
+
+def on_click(event, explorer):
     """Handle click events on nodes."""
+    ax = explorer['ax']
     if event.inaxes != ax:
         return
     
     # Find the closest node to the click
-    click_pos = (event.xdata, event.ydata)
-    min_dist = float('inf')
-    closest_node = None
-    
-    for node, node_pos in pos.items():
-        dist = ((click_pos[0] - node_pos[0])**2 + (click_pos[1] - node_pos[1])**2)**0.5
-        if dist < min_dist:
-            min_dist = dist
-            closest_node = node
-    
-    # Only proceed if click is close enough to a node (within reasonable distance)
-    if min_dist > 0.5:  # Adjust this threshold as needed
+    nodes = explorer['nodes']
+    xy = explorer['xy']
+    distances = np.hypot(xy[:, 0] - event.xdata, xy[:, 1] - event.ydata)
+    closest = int(np.argmin(distances))
+    closest_node = nodes[closest]
+    
+    # Only proceed if click is close enough to a node (within half the spacing of the squares)
+    if distances[closest] > explorer['pick_radius']:
         return
     
-    # Clear the axes and redraw
-    ax.clear()
-    
-    # Get base node colors
-    node_color_map = color_nodes(G)
-    
-    # Create color list for nodes
-    node_colors = []
-    highlighted_nodes = set()
-    
     # Check for modifier keys using event.key
     is_shift_click = hasattr(event, 'key') and event.key and 'shift' in str(event.key).lower()
     is_space_click = hasattr(event, 'key') and event.key and (event.key == ' ' or event.key == 'space' or 'space' in str(event.key).lower())
     
     # Get highlighted nodes based on modifier key
+    highlighted_nodes = set()
     if is_space_click:
         # Space key - show knight hops
-        if closest_node in knight_hop_dict:
-            highlighted_nodes.update(knight_hop_dict[closest_node])
+        highlighted_nodes.update(explorer['knight_hops'].get(closest_node, []))
         click_type = "Knight"
     elif is_shift_click:
         # Shift key - show rook rays
-        if closest_node in rook_ray_dict:
-            for ray in rook_ray_dict[closest_node]:
-                highlighted_nodes.update(ray)
+        for ray in explorer['rook_rays'].get(closest_node, []):
+            highlighted_nodes.update(ray)
         click_type = "Rook"
     else:
         # Normal click - show bishop rays
-        if closest_node in bishop_ray_dict:
-            for ray in bishop_ray_dict[closest_node]:
-                highlighted_nodes.update(ray)
+        for ray in explorer['bishop_rays'].get(closest_node, []):
+            highlighted_nodes.update(ray)
         click_type = "Bishop"
-    
-    for node in G.nodes():
-        if node == closest_node:
-            node_colors.append('red')  # Clicked node is red
-        elif node in highlighted_nodes:
-            node_colors.append('green')  # Nodes in rays/hops are green
-        elif node_color_map[node] == 'dark':
-            node_colors.append('brown')  # Original dark nodes
-        else:
-            node_colors.append('beige')  # Original light nodes
-
-    # Draw nodes with the appropriate colors and black edge color for stroke
-    nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=300, edgecolors='black', linewidths=1, ax=ax)
-
-    # Separate edges by type and draw with different colors
-    edges_rank = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.RANK.value]
-    edges_file = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.FILE.value]
-    edges_diag = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.DIAG.value]
-
-    # Draw rank edges in red
-    nx.draw_networkx_edges(G, pos, edgelist=edges_rank, edge_color='red', width=1, ax=ax)
-
-    # Draw file edges in blue
-    nx.draw_networkx_edges(G, pos, edgelist=edges_file, edge_color='blue', width=1, ax=ax)
-
-    # Draw diagonal edges in green
-    nx.draw_networkx_edges(G, pos, edgelist=edges_diag, edge_color='green', width=1, ax=ax)
-
-    # Draw labels
-    nx.draw_networkx_labels(G, pos, font_size=8, font_weight='bold', ax=ax)
-
+    highlighted_nodes.discard(closest_node)
+    
+    # Nodes in rays/hops are green and the clicked node is red, drawn over the static layers
+    highlighted = sorted(highlighted_nodes, key=explorer['index'].get) + [closest_node]
+    colors = ['green'] * len(highlighted_nodes) + ['red']
+    explorer['highlighted'] = highlighted
+    explorer['highlights'].set_offsets([xy[explorer['index'][node]] for node in highlighted])
+    explorer['highlights'].set_facecolor(colors)
     ax.set_title(f"3Chess Board - {click_type} from: {closest_node}")
-    ax.grid(True, alpha=0.3)
-    ax.set_aspect('equal')
     
-    # Redraw the canvas
-    ax.figure.canvas.draw()
+    if explorer['background'] is not None:
+        draw_highlights(explorer)
+    else:
+        # Backends without blitting redraw everything when the GUI is next idle
+        ax.figure.canvas.draw_idle()
 
-def visualize_graph(G):
-    """Visualize the graph with user-selected layout."""
+def visualize_graph(G, rook_ray_dict=None, knight_hop_dict=None, bishop_ray_dict=None, polygons=None):
+    """Visualize the graph with user-selected layout.
+    The ray and hop tables default to the hand-written tables of the standard board.
+    The board is drawn once; clicks only redraw the highlighted nodes on top of it."""
     # Ask user for layout preference
-    layout_choice = input("Choose layout: (1) Grid layout (2) Force-directed layout: ")
+    if polygons:
+        layout_choice = input("Choose layout: (1) Grid layout (2) Force-directed layout (3) Board layout: ")
+    else:
+        layout_choice = input("Choose layout: (1) Grid layout (2) Force-directed layout: ")
 
     # Create layout for visualization
-    pos, title = create_positions(G, layout_choice)
+    pos, title = create_positions(G, layout_choice, polygons)
     
     # Get rook rays, knight hops, and bishop rays for click handling
-    rook_ray_dict = rook_rays()
-    knight_hop_dict = knight_hops()
-    bishop_ray_dict = bishop_rays()
+    if rook_ray_dict is None:
+        rook_ray_dict = rook_rays()
+    if knight_hop_dict is None:
+        knight_hop_dict = knight_hops()
+    if bishop_ray_dict is None:
+        bishop_ray_dict = bishop_rays()
     
     # Get node colors based on diagonal reachability
     node_color_map = color_nodes(G)
-    
-    # Create color list for nodes in the order they appear in G.nodes()
-    node_colors = []
-    for node in G.nodes():
-        if node_color_map[node] == 'dark':
-            node_colors.append('brown')
-        else:
-            node_colors.append('beige')  # Beige for light nodes
+    nodes = list(G.nodes())
+    node_colors = ['brown' if node_color_map[node] == 'dark' else 'beige' for node in nodes]
 
     # Create the plot
     fig, ax = plt.subplots(figsize=(12, 8))
-
-    # Draw nodes with the appropriate colors and black edge color for stroke
-    nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=300, edgecolors='black', linewidths=1, ax=ax)
-
-    # Separate edges by type and draw with different colors
-    edges_rank = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.RANK.value]
-    edges_file = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.FILE.value]
-    edges_diag = [(u, v) for u, v, d in G.edges(data=True) if d.get('edge_type') == EdgeType.DIAG.value]
-
-    # Draw rank edges in red
-    nx.draw_networkx_edges(G, pos, edgelist=edges_rank, edge_color='red', width=1, ax=ax)
-
-    # Draw file edges in blue
-    nx.draw_networkx_edges(G, pos, edgelist=edges_file, edge_color='blue', width=1, ax=ax)
-
-    # Draw diagonal edges in green
-    nx.draw_networkx_edges(G, pos, edgelist=edges_diag, edge_color='green', width=1, ax=ax)
-
-    # Draw labels
-    nx.draw_networkx_labels(G, pos, font_size=8, font_weight='bold', ax=ax)
+    labels = draw_static_layers(G, pos, ax, node_colors)
 
     ax.set_title(title + " (Click: Bishop rays, Shift+Click: Rook rays, Space+Click: Knight hops)")
-    if layout_choice != "2":
-        ax.set_xlabel("Files (A-L)")
-        ax.set_ylabel("Ranks (1-12)")
+    if layout_choice == "1":
+        ax.set_xlabel("Files")
+        ax.set_ylabel("Ranks")
     ax.grid(True, alpha=0.3)
     ax.set_aspect('equal')
     
+    # The highlighted nodes, their labels and the title are redrawn on each click
+    highlights = ax.scatter([], [], s=300, edgecolors='black', linewidths=1, zorder=3)
+    explorer = {
+        'ax': ax,
+        'nodes': nodes,
+        'index': {node: i for i, node in enumerate(nodes)},
+        'xy': np.array([pos[node] for node in nodes]),
+        'pick_radius': float(np.median([np.hypot(*np.subtract(pos[u], pos[v]))
+                                        for u, v, d in G.edges(data='edge_type')
+                                        if d != EdgeType.DIAG.value])) / 2,
+        'labels': labels,
+        'highlights': highlights,
+        'highlighted': [],
+        'background': None,
+        'rook_rays': rook_ray_dict,
+        'knight_hops': knight_hop_dict,
+        'bishop_rays': bishop_ray_dict,
+    }
+    if fig.canvas.supports_blit:
+        # Left out of the saved background; labels of highlighted nodes are redrawn over them
+        highlights.set_animated(True)
+        ax.title.set_animated(True)
+        fig.canvas.mpl_connect('draw_event', lambda event: on_draw(event, explorer))
+    
     # Connect the click event
-    fig.canvas.mpl_connect('button_press_event', lambda event: on_click(event, G, pos, ax, rook_ray_dict, knight_hop_dict, bishop_ray_dict))
+    fig.canvas.mpl_connect('button_press_event', lambda event: on_click(event, explorer))
     
     plt.tight_layout()
     plt.show()
@@ -403,53 +436,36 @@ def create_diagonal_edges(G):
                         diagonal_edges.add(edge_tuple)
 
 def color_nodes(G):
-    """Color nodes based on diagonal reachability from A1.
-    Nodes reachable from A1 using only diagonal edges are 'dark'.
+    """Color nodes by rank and file parity from A1.
+    A1 and the nodes an even number of rank and file steps from it are 'dark',
+    which are exactly the nodes reachable from A1 using only diagonal edges.
     All other nodes are 'light'.
     Returns a dictionary mapping node names to colors."""
+    from topology import derive_square_colors, DARK
     
-    # Start from A1
-    start_node = 'A1'
-    
-    # Find all nodes reachable from A1 using only diagonal edges (BFS)
-    dark_nodes = set()
-    visited = set()
-    queue = [start_node]
-    
-    while queue:
-        current = queue.pop(0)
-        if current in visited:
-            continue
-        visited.add(current)
-        dark_nodes.add(current)
-        
-        # Find all diagonal neighbors
-        for neighbor in G.neighbors(current):
-            edge_data = G.get_edge_data(current, neighbor)
-            if edge_data and edge_data.get('edge_type') == EdgeType.DIAG.value:
-                if neighbor not in visited:
-                    queue.append(neighbor)
-    
-    # Create color mapping
-    node_colors = {}
-    for node in G.nodes():
-        if node in dark_nodes:
-            node_colors[node] = 'dark'
-        else:
-            node_colors[node] = 'light'
+    nodes, rank_neighbors, file_neighbors = typed_neighbors(G)
+    colors = derive_square_colors(rank_neighbors, file_neighbors, nodes.index('A1'))
+    node_colors = {node: 'dark' if color == DARK else 'light' for node, color in zip(nodes, colors)}
     
     # Verify counts
     dark_count = sum(1 for color in node_colors.values() if color == 'dark')
-    light_count = sum(1 for color in node_colors.values() if color == 'light')
-    
-    print(f"Dark nodes: {dark_count}, Light nodes: {light_count}")
-    if dark_count != 48 or light_count != 48:
-        print(f"WARNING: Expected 48 dark and 48 light nodes, but got {dark_count} dark and {light_count} light")
+    if 2*dark_count != len(nodes):
+        print(f"WARNING: Expected {len(nodes)//2} dark and {len(nodes)//2} light nodes, "
+              f"but got {dark_count} dark and {len(nodes) - dark_count} light")
     
     return node_colors
 
 def main():
-    """Main function to create and visualize the 3Chess board."""
+    """Main function to create and visualize the 3Chess board.
+    `python me.py 4x6` explores a generated board of 4 players with 6x6 sectors instead."""
+    if len(sys.argv) > 1:
+        from topology import build_graph, Topology
+        players, size = (int(n) for n in sys.argv[1].lower().split("x"))
+        G = build_graph(players, size)
+        topology = Topology(G)
+        visualize_graph(G, topology.named_rays(topology.rook_rays), topology.named_hops(),
+                        topology.named_rays(topology.bishop_rays), dict(zip(topology.squares, topology.layout)))
+        return
     G = create_3chess_graph()
     print_nodes_by_file(G)
     visualize_graph(G)
@@ -490,10 +506,10 @@ def bishop_rays():
         B8: [[A7], [C7, D6, I5, J9, K10, L11]],
         C1: [[B2, A3], [D2, E3, F4, G9, H10]],
         C2: [[B1], [D1], [B3, A4], [D3, E4, F9, G10, H11]],
-        C3: [[B2, A1], [B4, A5], [D2, E1], [D4, E9, F10, G11, H12], [D4, E9, I5, J6, K7, L8]],
+        C3: [[B2, A1], [B4, A5], [D2, E1], [D4, E9, F10, G11, H12], [D4, I5, J6, K7, L8]],
         C4: [[B3, A2], [B5, A6], [D3, E2, F1], [D5, I6, J7, K8]],
         C5: [[B4, A3], [B6, A7], [D4, E3, F2, G1], [D6, I7, J8]],
-        C6: [[B5, A4], [B7, A8], [D5, E4, F3, G2, H1], [D7, I8]],
+        C6: [[B5, A4], [B7, A8], [D5, E4, F3, G2, H1], [D5, I9, J10, K11, L12], [D7, I8]],
         C7: [[B6, A5], [B8], [D8], [D6, I5, J9, K10, L11]],
         C8: [[B7, A6], [D7, I6, J5, K9, L10]],
         D1: [[C2, B3, A4], [E2, F3, G4, H9]],
@@ -528,7 +544,7 @@ def bishop_rays():
         G10: [[H9], [H11], [F11, E12], [F9, E4, D3, C2, B1]],
         G11: [[H10], [F12], [H12], [F10, E9, D4, C3, B2, A1], [F10, E9, I5, J6, K7, L8]],
         G12: [[H11], [F11, E10, I9, J5, K6, L7]],
-        H1: [[G2, F3, E4, D5, C6, B7, A8], [G2, F3, E4, D5, I9, J10, K11, L12]],
+        H1: [[G2, F3, E4, D5, C6, B7, A8], [G2, F3, E4, I9, J10, K11, L12]],
         H2: [[G1], [G3, F4, E9, I10, J11, K12]],
         H3: [[G2, F1], [G4, F9, E10, I11, J12]],
         H4: [[G3, F2, E1], [G9, F10, E11, I12]],
@@ -549,7 +565,7 @@ def bishop_rays():
         J6: [[I7, D8], [K7, L8], [K5, L9], [I5, E9, F10, G11, H12], [I5, D4, C3, B2, A1]],
         J5: [[K6, L7], [K9, L10], [I6, D7, C8], [I9, E10, F11, G12]],
         J9: [[K5, L6], [K10, L11], [I10, E11, F12], [I5, D6, C7, B8]],
-        J10: [[K11, L12], [I11, E12], [I9, E4, F3, G2, H1], [I9, D5, C6, B7, A8]],
+        J10: [[K11, L12], [K9, L5], [I11, E12], [I9, E4, F3, G2, H1], [I9, D5, C6, B7, A8]],
         J11: [[K12], [I12], [K10, L9], [I10, E9, F4, G3, H2]],
         J12: [[K11, L10], [I11, E10, F9, G4, H3]],
         K8: [[L7], [J7, I6, D5, C4, B3, A2]],
@@ -619,71 +635,41 @@ def rook_rays():
     
     return rook_ray_dict
 
-def knight_hops():
+def typed_neighbors(G):
+    """Rank and file neighbours per node index, read from the edges once.
+    Returns (nodes, rank_neighbors, file_neighbors)."""
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    rank_neighbors = [[] for _ in nodes]
+    file_neighbors = [[] for _ in nodes]
+    for u, v, edge_type in G.edges(data='edge_type'):
+        if edge_type == EdgeType.RANK.value:
+            rank_neighbors[index[u]].append(index[v])
+            rank_neighbors[index[v]].append(index[u])
+        elif edge_type == EdgeType.FILE.value:
+            file_neighbors[index[u]].append(index[v])
+            file_neighbors[index[v]].append(index[u])
+    return nodes, rank_neighbors, file_neighbors
+
+def knight_hops(G=None):
     """Generate knight hops for all nodes.
     Knight moves are L-shaped: 2 steps in one direction, then 1 step orthogonal.
     This covers all patterns: rank-rank-file, file-file-rank, rank-file-file, file-rank-rank.
+    G defaults to the standard board. Hops are listed in node order.
     """
-    G = create_3chess_graph()
-    
-    # Verify we have 96 nodes
-    node_count = len(G.nodes())
-    if node_count != 96:
-        print(f"WARNING: Expected 96 nodes, but got {node_count}")
-    
-    knight_hop_dict = {}
-    
-    for node in G.nodes():
-        hops = set()  # Use set to avoid duplicates
-        
-        # Get all 1-neighbors with their edge types
-        one_neighbors = []
-        for neighbor in G.neighbors(node):
-            edge_data = G.get_edge_data(node, neighbor)
-            if edge_data and edge_data.get('edge_type') in [EdgeType.RANK.value, EdgeType.FILE.value]:
-                one_neighbors.append((neighbor, edge_data.get('edge_type')))
-        
-        # Pattern 1: 2 steps in one direction, then 1 step orthogonal
-        # For each 1-neighbor, find their straight 2-neighbors
-        for one_neighbor, edge_type in one_neighbors:
-            # Find 2-step neighbors in the same direction
-            current = one_neighbor
-            for next_neighbor in G.neighbors(current):
-                next_edge_data = G.get_edge_data(current, next_neighbor)
-                if (next_edge_data and 
-                    next_edge_data.get('edge_type') == edge_type and
-                    next_neighbor != node):
-                    # Now at 2-step neighbor, find orthogonal 1-step
-                    two_step_neighbor = next_neighbor
-                    for final_neighbor in G.neighbors(two_step_neighbor):
-                        final_edge_data = G.get_edge_data(two_step_neighbor, final_neighbor)
-                        if (final_edge_data and 
-                            final_edge_data.get('edge_type') in [EdgeType.RANK.value, EdgeType.FILE.value] and
-                            final_edge_data.get('edge_type') != edge_type and
-                            final_neighbor != current):
-                            hops.add(final_neighbor)
-        
-        # Pattern 2: 1 step in one direction, then 2 steps orthogonal
-        # For each 1-neighbor, find their orthogonal neighbors
-        for one_neighbor, edge_type in one_neighbors:
-            # Find orthogonal neighbors of the 1-neighbor
-            for ortho_neighbor in G.neighbors(one_neighbor):
-                ortho_edge_data = G.get_edge_data(one_neighbor, ortho_neighbor)
-                if (ortho_edge_data and 
-                    ortho_edge_data.get('edge_type') in [EdgeType.RANK.value, EdgeType.FILE.value] and
-                    ortho_edge_data.get('edge_type') != edge_type and
-                    ortho_neighbor != node):
-                    # Now from ortho_neighbor, take another step in the same orthogonal direction
-                    for final_neighbor in G.neighbors(ortho_neighbor):
-                        final_edge_data = G.get_edge_data(ortho_neighbor, final_neighbor)
-                        if (final_edge_data and 
-                            final_edge_data.get('edge_type') == ortho_edge_data.get('edge_type') and
-                            final_neighbor != one_neighbor):
-                            hops.add(final_neighbor)
+    from topology import derive_knight_hops
+
+    if G is None:
+        G = create_3chess_graph()
         
-        knight_hop_dict[node] = list(hops)
-    
-    return knight_hop_dict
+        # Verify we have 96 nodes
+        node_count = len(G.nodes())
+        if node_count != 96:
+            print(f"WARNING: Expected 96 nodes, but got {node_count}")
+    
+    nodes, rank_neighbors, file_neighbors = typed_neighbors(G)
+    hops = derive_knight_hops(rank_neighbors, file_neighbors)
+    return {node: [nodes[j] for j in hops[i]] for i, node in enumerate(nodes)}
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Move-generation parity fixture for the TypeScript engine.
+
+The web client in 3chess-web re-implements the board graph, the ray tables and
+the move rules in TypeScript. This script dumps what the Python side produces
+to a JSON fixture:
+
+    edges        rank, file and diagonal edges as sorted node pairs
+    rookRays     rook rays per node
+    bishopRays   bishop rays per node
+    knightHops   knight destinations per node
+    squareColors "dark" or "light" per node
+    positions    a corpus of positions reached by random play, each with the
+                 destinations of every piece of the player to move
+
+and `npm run parity` in 3chess-web checks the TypeScript engine against it.
+Rays are compared as sets of ordered rays and moves as sets of destinations,
+so neither side has to match the other's iteration order.
+
+    python parity.py                       # write the fixture
+    (cd 3chess-web && npm run parity)      # check the TypeScript engine
+"""
+import argparse
+import json
+import os
+import random
+
+from me import EdgeType
+from rules import GameRules
+from topology import load_topology, DARK
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "3chess-web", "scripts", "parity-fixture.json")
+
+# Edge type names as spelled by EdgeType in 3chess-web/src/types/game.ts
+EDGE_NAMES = {EdgeType.RANK.value: "rank", EdgeType.FILE.value: "file", EdgeType.DIAG.value: "diagonal"}
+
+def topology_to_json():
+    """Return the graph and the ray and hop tables in fixture form."""
+    topology = load_topology()
+    names = topology.squares
+    edges = {}
+    for edge_type, table in ((EdgeType.RANK, topology.rank_neighbors), (EdgeType.FILE, topology.file_neighbors),
+                             (EdgeType.DIAG, topology.diag_neighbors)):
+        edges[EDGE_NAMES[edge_type.value]] = sorted(sorted((names[i], names[j])) for i, neighbors in enumerate(table)
+                                                    for j in neighbors if i < j)
+
+    return {
+        "squares": sorted(names),
+        "edges": edges,
+        "rookRays": dict(sorted(topology.named_rays(topology.rook_rays).items())),
+        "bishopRays": dict(sorted(topology.named_rays(topology.bishop_rays).items())),
+        "knightHops": {node: sorted(hops) for node, hops in sorted(topology.named_hops().items())},
+        "squareColors": {node: "dark" if color == DARK else "light"
+                         for node, color in sorted(zip(names, topology.colors))},
+    }
+
+def position_to_json(rules):
+    """Return one position and the moves of the player to move."""
+    moves = {}
+    for node, (player, _) in sorted(rules.piece_positions.items()):
+        if player == rules.current_player:
+            moves[node] = sorted(set(rules.get_valid_moves(node)))
+    return {
+        "pieces": {node: [player.name, piece.name] for node, (player, piece) in sorted(rules.piece_positions.items())},
+        "currentPlayer": rules.current_player.name,
+        "moves": moves,
+    }
+
+def random_positions(count, seed=0, max_plies=120):
+    """Yield count positions taken at random points of random games."""
+    rng = random.Random(seed)
+    yield GameRules()
+    produced = 1
+    while produced < count:
+        rules = GameRules()
+        for _ in range(rng.randrange(max_plies)):
+            moves = rules.legal_moves()
+            if not moves or rules.is_over():
+                break
+            rules.make_move(*rng.choice(moves))
+        if not rules.is_over():
+            yield rules
+            produced += 1
+
+def build_fixture(count, seed=0):
+    fixture = {"version": 2, "seed": seed}
+    fixture.update(topology_to_json())
+    fixture["positions"] = [position_to_json(rules) for rules in random_positions(count, seed)]
+    return fixture
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the TypeScript parity fixture.")
+    parser.add_argument("--out", default=DEFAULT_FIXTURE, help="fixture path")
+    parser.add_argument("--positions", type=int, default=200, help="number of random positions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fixture = build_fixture(args.positions, args.seed)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(fixture, f, separators=(",", ":"))
+    print(f"Wrote {len(fixture['positions'])} positions and the topology of "
+          f"{len(fixture['squares'])} squares to {args.out}")
+
+if __name__ == "__main__":
+    main()
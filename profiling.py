@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Opt-in timers around move generation, hit testing, drawing and search.
+
+Set THREECHESS_PROFILE before starting any of the programs:
+
+    THREECHESS_PROFILE=1 python unified_chess.py
+    THREECHESS_PROFILE=engine.pstats python engine.py
+
+Functions decorated with timed() then record how long every call took,
+and when the program exits a report goes to stderr: calls, total time
+and the median, 99th percentile and slowest call of each timer, plus the
+counters. Any value but 1 (or 0, which leaves profiling off) is a file
+name: cProfile then also runs over the main thread and its statistics are
+dumped to that file.
+
+Without the variable timed() hands back the function unchanged, so the
+hooks cost nothing. With it every timed call pays for two clock reads and
+a histogram update, about a microsecond; a profiled search runs about a
+tenth slower, so compare profiled runs with profiled runs. Timers nest:
+search.quiesce includes the search.evaluate calls made inside it.
+
+Durations go into power-of-two buckets of microseconds, so percentiles
+are upper bounds good to a factor of two, and memory stays constant
+however long the program runs.
+
+    python profiling.py [--pstats FILE] script.py [args ...]
+
+runs a script with profiling on, the same as setting the variable.
+"""
+import argparse
+import atexit
+import os
+import runpy
+import sys
+import threading
+from time import perf_counter
+
+PROFILE_ENV = "THREECHESS_PROFILE"
+BUCKETS = 40
+
+class Histogram:
+    """Count, total and log2-bucketed durations of one timer."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0]*BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        # Bucket b holds durations under 2**b microseconds
+        self.buckets[min(int(seconds*1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound in seconds on the given fraction of the durations."""
+        wanted = fraction*self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min(2**bucket/1e6, self.max)
+        return self.max
+
+enabled = False
+pstats_path = None
+profiler = None
+timers = {}
+counters = {}
+_local = threading.local()
+
+def enable(path=None):
+    """Turn the timers on; call before importing the modules to profile.
+
+    With path, also profile the main thread with cProfile and dump the
+    statistics there on exit.
+    """
+    global enabled, pstats_path, profiler
+    if enabled:
+        return
+    enabled = True
+    atexit.register(report)
+    if path:
+        import cProfile
+        pstats_path = path
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+def record(name, seconds):
+    """Add one duration to the named timer."""
+    histogram = timers.get(name)
+    if histogram is None:
+        histogram = timers[name] = Histogram()
+    histogram.add(seconds)
+
+def count(name, n=1):
+    """Add n to the named counter."""
+    counters[name] = counters.get(name, 0) + n
+
+def timed(name, key=None, outermost=False):
+    """Decorator timing every call to the function under name.
+
+    key, given the call's arguments, names a sub-timer: name.<key>. With
+    outermost, calls made from inside a timed call of the same function
+    (recursion) are not timed separately.
+    """
+    def decorate(function):
+        if not enabled:
+            return function
+        if key is not None:
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(f"{name}.{key(*args, **kwargs)}", perf_counter() - start)
+        elif outermost:
+            def wrapper(*args, **kwargs):
+                depth = getattr(_local, name, 0)
+                if depth:
+                    return function(*args, **kwargs)
+                setattr(_local, name, 1)
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(name, perf_counter() - start)
+                    setattr(_local, name, 0)
+        else:
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(name, perf_counter() - start)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorate
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds*1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds*1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+def report(out=None):
+    """Write the timers and counters, and dump the cProfile statistics if asked for."""
+    out = out or sys.stderr
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(pstats_path)
+    if not timers and not counters:
+        return
+    out.write(f"\n{'timer':<28} {'calls':>9} {'total':>10} {'median':>10} {'p99':>10} {'max':>10}\n")
+    for name, histogram in sorted(timers.items(), key=lambda item: -item[1].total):
+        out.write(f"{name:<28} {histogram.count:>9} {format_time(histogram.total):>10} "
+                  f"{format_time(histogram.percentile(0.5)):>10} {format_time(histogram.percentile(0.99)):>10} "
+                  f"{format_time(histogram.max):>10}\n")
+    for name, value in sorted(counters.items()):
+        out.write(f"{name:<28} {value:>9}\n")
+    if pstats_path:
+        out.write(f"cProfile statistics in {pstats_path}\n")
+    out.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a script with the profiling hooks on.")
+    parser.add_argument("--pstats", help="also dump cProfile statistics of the main thread to this file")
+    parser.add_argument("script", help="the Python script to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="arguments for the script")
+    args = parser.parse_args()
+
+    # The script imports this file afresh as the profiling module, which
+    # turns itself on from the variable
+    os.environ[PROFILE_ENV] = args.pstats or "1"
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    runpy.run_path(args.script, run_name="__main__")
+
+if __name__ == "__main__":
+    main()
+elif os.environ.get(PROFILE_ENV, "0") not in ("", "0"):
+    enable(None if os.environ[PROFILE_ENV] == "1" else os.environ[PROFILE_ENV])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Headless board-image renderer for thumbnails and replays.
+
+Renders 3Chess positions to PNG files without opening a window, reusing the
+hexagon geometry of `unified_chess.Cell` and its sprite sheet. The board
+itself never changes between images, so it is drawn once per renderer and
+only the pieces are blitted on top of a copy of it.
+
+Positions are dictionaries mapping node names to (Player, PieceType) tuples,
+the same shape as `UnifiedChessGame.piece_positions`. On disk they are JSON
+objects mapping node names to [player, piece] names, e.g. {"E1": ["RED", "KING"]}.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+
+import profiling
+import pygame
+from rules import GameRules, Player, PieceType
+from unified_chess import WIDTH, HEIGHT, Cell, create_node_mapping
+
+BACKGROUND = (25, 25, 25)
+LAST_MOVE_COLOR = (255, 215, 0)
+
+def piece_from_json(value):
+    """Convert a [player, piece] pair of enum names to a piece tuple."""
+    player, piece_type = value
+    return (Player[player], PieceType[piece_type])
+
+def piece_to_json(piece):
+    """Convert a piece tuple to a [player, piece] pair of enum names."""
+    player, piece_type = piece
+    return [player.name, piece_type.name]
+
+def position_from_json(data):
+    """Build a piece placement from its JSON form."""
+    return {node: piece_from_json(value) for node, value in data.items()}
+
+def position_to_json(pieces):
+    """Convert a piece placement to its JSON form."""
+    return {node: piece_to_json(piece) for node, piece in pieces.items()}
+
+def parse_move(move):
+    """Accept a move as "E2 E4" or as a (from, to) pair."""
+    if isinstance(move, str):
+        from_node, to_node = move.split()
+        return from_node, to_node
+    return tuple(move)
+
+def initial_position():
+    """Return the starting piece placement."""
+    return dict(GameRules().piece_positions)
+
+class BoardRenderer:
+    """Offscreen renderer that caches the static board layer."""
+
+    def __init__(self, size=None, background=BACKGROUND):
+        # size is the (width, height) of the output images; None keeps WIDTH x HEIGHT
+        self.size = tuple(size) if size else None
+        self.background = background
+        self.cells = {}
+        for node_name, (x, y) in create_node_mapping().items():
+            self.cells[node_name] = Cell(node_name, x, y)
+        self.board_layer = None
+
+    def get_board_layer(self):
+        """Return the empty board, drawing it on first use."""
+        if self.board_layer is None:
+            layer = pygame.Surface((WIDTH, HEIGHT))
+            layer.fill(self.background)
+            for node_name in sorted(self.cells.keys()):
+                self.cells[node_name].draw(layer, None)
+            self.board_layer = layer
+        return self.board_layer
+
+    @profiling.timed("render.render")
+    def render(self, pieces, last_move=None, moving=None):
+        """Render one position to a new surface.
+
+        last_move is an optional (from, to) pair outlined on the board.
+        moving is an optional (node, piece, (dx, dy)) drawn displaced from the
+        centre of node, used to tween pieces between frames.
+        """
+        surface = self.get_board_layer().copy()
+
+        if last_move:
+            for node in last_move:
+                pygame.draw.polygon(surface, LAST_MOVE_COLOR, self.cells[node].points, 3)
+
+        for node_name, piece in pieces.items():
+            self.cells[node_name].draw_piece(surface, piece)
+
+        if moving:
+            node_name, piece, offset = moving
+            self.cells[node_name].draw_piece(surface, piece, offset)
+
+        if self.size and self.size != (WIDTH, HEIGHT):
+            surface = pygame.transform.smoothscale(surface, self.size)
+        return surface
+
+    def render_batch(self, positions, out_dir, prefix="position"):
+        """Render an iterable of positions to numbered PNG files in out_dir."""
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for i, pieces in enumerate(positions):
+            path = os.path.join(out_dir, f"{prefix}_{i:05d}.png")
+            pygame.image.save(self.render(pieces), path)
+            paths.append(path)
+        return paths
+
+    def replay_frames(self, moves, pieces=None, frames_per_move=1):
+        """Yield one surface per frame while playing moves from pieces.
+
+        With frames_per_move > 1 the moving piece slides from its origin to its
+        destination over that many frames; the final frame of every move shows
+        the settled position.
+        """
+        pieces = dict(pieces if pieces is not None else initial_position())
+        yield self.render(pieces)
+
+        for move in moves:
+            from_node, to_node = parse_move(move)
+            piece = pieces.pop(from_node)
+            start = self.cells[from_node].center
+            end = self.cells[to_node].center
+
+            for frame in range(1, frames_per_move):
+                t = frame / frames_per_move
+                offset = ((end.x - start.x)*t, (end.y - start.y)*t)
+                yield self.render(pieces, moving=(from_node, piece, offset))
+
+            pieces[to_node] = piece
+            yield self.render(pieces, last_move=(from_node, to_node))
+
+    def render_replay(self, moves, out_dir, pieces=None, frames_per_move=1, prefix="frame"):
+        """Write the frames of a replay to numbered PNG files in out_dir."""
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for i, surface in enumerate(self.replay_frames(moves, pieces, frames_per_move)):
+            path = os.path.join(out_dir, f"{prefix}_{i:05d}.png")
+            pygame.image.save(surface, path)
+            paths.append(path)
+        return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Render 3Chess positions or replays to PNG files.")
+    parser.add_argument("input", help="JSON file with a list of positions, or an object with a 'moves' list")
+    parser.add_argument("out_dir", help="directory for the PNG files")
+    parser.add_argument("--size", type=int, default=None, help="output width and height in pixels")
+    parser.add_argument("--frames", type=int, default=1, help="frames per move when rendering a replay")
+    args = parser.parse_args()
+
+    with open(args.input) as f:
+        data = json.load(f)
+
+    renderer = BoardRenderer((args.size, args.size) if args.size else None)
+    if isinstance(data, dict) and "moves" in data:
+        start = position_from_json(data["pieces"]) if "pieces" in data else None
+        paths = renderer.render_replay(data["moves"], args.out_dir, start, args.frames)
+    else:
+        paths = renderer.render_batch((position_from_json(p) for p in data), args.out_dir)
+    print(f"Wrote {len(paths)} images to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
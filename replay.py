@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Seek to any ply of a recorded game without replaying it from the start.
+
+A game record (tournament.py --out) lists its moves from the starting
+position. Its "keyframes" hold the position in notation every interval
+plies, keyframe i being the position after i*interval moves:
+
+    "keyframes": {"interval": 16, "positions": ["<notation>", ...]}
+
+Replay.seek(ply) starts from the nearest keyframe at or before ply, or
+from where the last seek left off when that is closer, so any jump costs
+at most interval make or unmake calls. Records without keyframes get them
+on load, a single pass over the moves. Decoding notation costs about as
+much as a dozen moves, so each keyframe is decoded once and copied after.
+
+Keyframes are notation, so a sought position has no move history before
+its keyframe: repetitions() only counts positions since then.
+
+    python replay.py games.jsonl --game 3 --ply 120 [--png board.png]
+    python replay.py games.jsonl --index indexed.jsonl
+    python replay.py --bench
+"""
+import argparse
+import json
+import random
+import time
+
+from rules import GameRules, PieceType
+from topology import generate_topology
+
+KEYFRAME_INTERVAL = 16
+
+def build_keyframes(moves, interval=KEYFRAME_INTERVAL, topology=None):
+    """Keyframes for moves played from the starting position."""
+    if interval < 1:
+        raise ValueError(f"keyframe interval must be at least 1, got {interval}")
+    rules = GameRules(topology=topology)
+    positions = [rules.to_notation()]
+    for i, (from_node, to_node) in enumerate(moves, 1):
+        rules.make_move(from_node, to_node)
+        if i % interval == 0:
+            positions.append(rules.to_notation())
+    return {"interval": interval, "positions": positions}
+
+def record_topology(record):
+    """The topology of the board a record was played on."""
+    return generate_topology(*record.get("board", (3, 4)))
+
+class Replay:
+    """A game record that can be positioned at any ply."""
+
+    def __init__(self, record, topology=None, interval=KEYFRAME_INTERVAL):
+        self.topology = topology if topology is not None else record_topology(record)
+        self.moves = [tuple(move) for move in record["moves"]]
+        keyframes = record.get("keyframes") or build_keyframes(self.moves, interval, self.topology)
+        self.interval = keyframes["interval"]
+        self.keyframes = keyframes["positions"]
+        if self.interval < 1 or len(self.keyframes) != len(self.moves)//self.interval + 1:
+            raise ValueError(f"{len(self.keyframes)} keyframes do not cover {len(self.moves)} moves "
+                             f"every {self.interval} plies")
+        self.decoded = {}
+        self.rules = None
+        # Ply of the keyframe self.rules was loaded from, and the ply it is at now
+        self.base = self.at = 0
+
+    def __len__(self):
+        return len(self.moves)
+
+    def seek(self, ply):
+        """Return the position after ply moves.
+
+        The position is shared with later seeks; copy it to play on.
+        """
+        if not 0 <= ply <= len(self.moves):
+            raise ValueError(f"ply {ply} is outside the game's {len(self.moves)} plies")
+        key = ply//self.interval
+        if self.rules is None or ply < self.base or abs(ply - self.at) > ply - key*self.interval:
+            if key not in self.decoded:
+                self.decoded[key] = GameRules.from_notation(self.keyframes[key], self.topology)
+            self.rules = self.decoded[key].copy()
+            self.base = self.at = key*self.interval
+        rules = self.rules
+        while self.at < ply:
+            rules.make_move(*self.moves[self.at])
+            self.at += 1
+        while self.at > ply:
+            rules.unmake_move()
+            self.at -= 1
+        return rules
+
+def load_records(path):
+    """Game records from a JSON-lines file."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def random_record(plies, rng):
+    """A record of a random game of up to plies moves."""
+    rules = GameRules()
+    moves = []
+    while len(moves) < plies and rules.winner() is None:
+        legal = rules.legal_moves()
+        if not legal:
+            break
+        # Sparing the kings keeps random games going for long enough to seek in
+        spare = [move for move in legal if rules.piece_positions.get(move[1], (None, None))[1] != PieceType.KING]
+        move = rng.choice(spare or legal)
+        rules.make_move(*move)
+        moves.append(list(move))
+    return {"moves": moves}
+
+def benchmark(records, seeks, interval, seed):
+    """Time random jumps and a backward scrub, from the start and through keyframes."""
+    rng = random.Random(seed)
+    topology = generate_topology(3, 4)
+    for record in records:
+        replay = Replay(dict(record, keyframes=None), topology, interval)
+        targets = [rng.randint(0, len(replay)) for _ in range(seeks)]
+
+        def from_start(ply):
+            rules = GameRules(topology=topology)
+            for move in replay.moves[:ply]:
+                rules.make_move(*move)
+            return rules
+
+        start = time.perf_counter()
+        for ply in targets:
+            from_start(ply)
+        naive = (time.perf_counter() - start)/seeks
+        start = time.perf_counter()
+        for ply in targets:
+            replay.seek(ply)
+        seeking = (time.perf_counter() - start)/seeks
+        for ply in targets[-20:]:
+            if replay.seek(ply).to_notation() != from_start(ply).to_notation():
+                raise AssertionError(f"seek to ply {ply} gave the wrong position")
+        start = time.perf_counter()
+        for ply in range(len(replay), -1, -1):
+            replay.seek(ply)
+        scrub = (time.perf_counter() - start)/(len(replay) + 1)
+        print(f"{len(replay):>5} plies, {len(replay.keyframes):>3} keyframes: random seek "
+              f"{naive*1e6:>8.1f} us from the start, {seeking*1e6:>6.1f} us by keyframe "
+              f"({naive/seeking:>5.1f}x); scrubbing back {scrub*1e6:.1f} us a ply")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seek in recorded games through keyframes.")
+    parser.add_argument("records", nargs="?", help="JSON-lines file of game records")
+    parser.add_argument("--game", type=int, default=0, help="index of the record in the file")
+    parser.add_argument("--ply", type=int, help="print the position after this many moves")
+    parser.add_argument("--png", help="also render the position to this PNG file")
+    parser.add_argument("--index", metavar="OUT", help="write the records with keyframes added to OUT")
+    parser.add_argument("--interval", type=int, default=KEYFRAME_INTERVAL, help="plies between keyframes")
+    parser.add_argument("--bench", action="store_true", help="time seeking, on the records or on random games")
+    parser.add_argument("--seeks", type=int, default=200, help="random seeks per game with --bench")
+    parser.add_argument("--plies", default="100,300,1000", help="lengths of the random games with --bench")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.bench:
+        if args.records:
+            records = load_records(args.records)
+        else:
+            rng = random.Random(args.seed)
+            records = [random_record(int(n), rng) for n in args.plies.split(",")]
+        benchmark(records, args.seeks, args.interval, args.seed)
+        return
+    if not args.records:
+        parser.error("give a records file, or --bench")
+    records = load_records(args.records)
+    if args.index:
+        with open(args.index, "w") as out:
+            for record in records:
+                record["keyframes"] = build_keyframes(record["moves"], args.interval, record_topology(record))
+                out.write(json.dumps(record) + "\n")
+        print(f"Indexed {len(records)} games every {args.interval} plies into {args.index}")
+    if args.ply is not None:
+        if not 0 <= args.game < len(records):
+            parser.error(f"no game {args.game}; the file has {len(records)}")
+        try:
+            rules = Replay(records[args.game], interval=args.interval).seek(args.ply)
+        except ValueError as e:
+            parser.error(str(e))
+        print(rules.to_notation())
+        if args.png:
+            import pygame
+            from render import BoardRenderer
+            last_move = tuple(records[args.game]["moves"][args.ply - 1]) if args.ply else None
+            pygame.image.save(BoardRenderer().render(rules.piece_positions, last_move=last_move), args.png)
+            print(f"Wrote {args.png}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,803 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Rules engine for 3Chess, independent of pygame.
+
+GameRules holds the piece placement and turn state and generates moves from
+the adjacency, ray and hop tables of a board topology (topology.py), the
+standard board unless a generated variant is given. A game ends by king
+capture: a player whose king is taken is eliminated and skipped in the
+turn order, and the last player standing wins. A game is drawn when a
+position comes up for the third time with the same player to move, or after
+FIFTY_MOVES moves by every living player without a capture or a pawn move.
+UnifiedChessGame builds its display on top of this class and the game
+server uses it directly.
+"""
+import profiling
+import random
+import re
+import struct
+from enum import Enum
+from topology import load_topology
+
+class PieceType(Enum):
+    KING = 0
+    PAWN = 1
+    KNIGHT = 2
+    BISHOP = 3
+    ROOK = 4
+    QUEEN = 5
+
+class Player(Enum):
+    WHITE = 0  # Match yalta.py sprite ordering
+    RED = 1
+    BLACK = 2
+
+
+PLAYER_NAMES = ("RED", "WHITE", "BLACK", "BLUE", "GREEN", "YELLOW", "ORANGE", "PURPLE")
+_variant_players = {}
+
+def variant_players(count):
+    """Players of a board with count sectors, in sector (and turn) order.
+    
+    The standard board uses Player; other boards get an enum of their own
+    whose values count from 0 in sector order.
+    """
+    if count == 3:
+        return (Player.RED, Player.WHITE, Player.BLACK)
+    if count not in _variant_players:
+        names = [PLAYER_NAMES[i] if i < len(PLAYER_NAMES) else f"PLAYER{i+1}" for i in range(count)]
+        _variant_players[count] = tuple(Enum(f"Player{count}", names, start=0))
+    return _variant_players[count]
+
+# Centipawn material; kings are priceless but their capture ends the game
+# for their player, which the evaluation accounts for separately
+PIECE_MATERIAL = {
+    PieceType.PAWN: 100,
+    PieceType.KNIGHT: 300,
+    PieceType.BISHOP: 320,
+    PieceType.ROOK: 500,
+    PieceType.QUEEN: 900,
+    PieceType.KING: 0,
+}
+
+def piece_square_score(piece_type, own, depth, index, size):
+    """Centipawn material plus placement of a piece on (depth, index) of a sector.
+    
+    own tells whether the sector is its player's own. Depth 0 touches the
+    centre and size - 1 is the back rank; index runs along the rank, so
+    the middle files are size - 1 and size.
+    """
+    # Steps in from the outer files and towards the centre, 0 on the rim
+    lateral = min(index, 2*size - 1 - index)
+    centrality = lateral + size - 1 - depth
+    score = PIECE_MATERIAL[piece_type]
+    if piece_type == PieceType.PAWN:
+        # Steps left to a foreign back rank, counted along the pawn's path
+        remaining = depth + size if own else size - 1 - depth
+        progress = max(2*size - 2 - remaining, 0)
+        score += 4*progress + progress*progress
+    elif piece_type == PieceType.KNIGHT:
+        score += 6*centrality - 3*size
+    elif piece_type in (PieceType.BISHOP, PieceType.QUEEN):
+        score += 2*centrality
+    elif piece_type == PieceType.ROOK:
+        # Rooks on the second rank of another player's sector
+        score += 20 if not own and depth == size - 2 else 0
+    elif piece_type == PieceType.KING:
+        # Safest on the home back rank, worse with every step away from it
+        away = size - 1 - depth if own else size + depth
+        score += 20 - 15*away
+    return score
+
+class RuleTables:
+    """Name-keyed move tables and hash keys for one board topology.
+    
+    Built once per topology and shared by every game played on it.
+    """
+    
+    def __init__(self, topology):
+        names = topology.squares
+        self.topology = topology
+        self.squares = names
+        self.square_index = topology.index
+        self.size = topology.size
+        # Sector p belongs to players[p]; play goes round in sector order
+        self.players = variant_players(topology.players)
+        self.players_by_value = {player.value: player for player in self.players}
+        self.players_by_name = {player.name: player for player in self.players}
+        
+        def named(table):
+            return {names[i]: [names[j] for j in entries] for i, entries in enumerate(table)}
+        self.neighbors = named(topology.neighbors)
+        self.file_neighbors = named(topology.file_neighbors)
+        self.diag_neighbors = named(topology.diag_neighbors)
+        self.rook_rays = topology.named_rays(topology.rook_rays)
+        self.bishop_rays = topology.named_rays(topology.bishop_rays)
+        self.knight_hops = topology.named_hops()
+        # node -> topology.DARK or topology.LIGHT
+        self.square_colors = dict(zip(names, topology.colors))
+        
+        # node -> (sector owner, depth, file index), and back. Depth 0
+        # touches the centre and size - 1 is the back rank.
+        self.coords = {names[i]: (self.players[sector], depth, index)
+                       for i, (sector, depth, index) in enumerate(topology.coords)}
+        self.coord_squares = {coords: node for node, coords in self.coords.items()}
+        
+        # Turning the board one sector maps the graph and the ray tables onto
+        # themselves, so move generation must commute with it
+        self.player_rotation = {player: self.players[(i + 1) % len(self.players)]
+                                for i, player in enumerate(self.players)}
+        self.square_rotation = {names[i]: names[j] for i, j in enumerate(topology.rotation)}
+        
+        # Zobrist keys per square and piece code, player to move and
+        # eliminated player. Seeded so hashes are the same in every process.
+        rng = random.Random(0x3C)
+        codes = len(self.players)*len(PieceType)
+        self.zobrist_pieces = [[rng.getrandbits(64) for _ in range(codes)] for _ in names]
+        self.zobrist_turn = [rng.getrandbits(64) for _ in self.players]
+        self.zobrist_eliminated = [rng.getrandbits(64) for _ in self.players]
+        
+        # Material plus placement score per square and piece code, laid out
+        # like the Zobrist keys, so games can keep a running score per player
+        self.piece_square = [[0]*codes for _ in names]
+        for i, (sector, depth, index) in enumerate(topology.coords):
+            for owner, player in enumerate(self.players):
+                for piece_type in PieceType:
+                    self.piece_square[i][player.value*len(PieceType) + piece_type.value] = \
+                        piece_square_score(piece_type, sector == owner, depth, index, self.size)
+    
+    def piece_key(self, node, piece):
+        """Zobrist key of a (player, PieceType) piece standing on node."""
+        player, piece_type = piece
+        return self.zobrist_pieces[self.square_index[node]][player.value*len(PieceType) + piece_type.value]
+    
+    def piece_score(self, node, piece):
+        """Score a (player, PieceType) piece on node adds to its player's running score."""
+        player, piece_type = piece
+        return self.piece_square[self.square_index[node]][player.value*len(PieceType) + piece_type.value]
+
+STANDARD_TABLES = RuleTables(load_topology())
+_variant_tables = {}
+
+def rule_tables(topology=None):
+    """Return the shared tables of a topology (the standard board by default)."""
+    if topology is None or topology is STANDARD_TABLES.topology:
+        return STANDARD_TABLES
+    if topology not in _variant_tables:
+        _variant_tables[topology] = RuleTables(topology)
+    return _variant_tables[topology]
+
+# Canonical square order of the standard board used by the binary encoding
+SQUARES = STANDARD_TABLES.squares
+SQUARE_INDEX = STANDARD_TABLES.square_index
+SQUARE_ROTATION = STANDARD_TABLES.square_rotation
+PLAYER_ROTATION = STANDARD_TABLES.player_rotation
+
+# Binary position: ply, player to move, eliminated-player bitmask, halfmove
+# clock, then one byte per square in SQUARES order (0 = empty, else
+# 1 + player*6 + piece)
+POSITION_HEADER = struct.Struct("!IBBH")
+POSITION_SIZE = POSITION_HEADER.size + len(SQUARES)
+
+# Text notation: piece letters, in the order pieces are listed per player
+NOTATION_LETTERS = {PieceType.KING: "K", PieceType.QUEEN: "Q", PieceType.ROOK: "R",
+                    PieceType.BISHOP: "B", PieceType.KNIGHT: "N", PieceType.PAWN: "P"}
+NOTATION_PIECES = {letter: piece_type for piece_type, letter in NOTATION_LETTERS.items()}
+NOTATION_ORDER = list(NOTATION_LETTERS)
+NOTATION_PIECE = re.compile(r"([KQRBNP])([A-Z]\d+)")
+
+# Draw rules: moves per living player without a capture or a pawn move, and
+# occurrences of one position
+FIFTY_MOVES = 50
+REPETITIONS = 3
+
+class GameRules:
+    """Position, turn state and move generation of one game.
+    
+    topology selects a generated variant board (see topology.py); games on
+    the standard board need none.
+    """
+    def __init__(self, setup=True, topology=None):
+        self.tables = rule_tables(topology)
+        self.rook_ray_dict = self.tables.rook_rays
+        self.bishop_ray_dict = self.tables.bishop_rays
+        self.knight_hop_dict = self.tables.knight_hops
+        
+        self.piece_positions = {}
+        if setup:
+            if self.tables is STANDARD_TABLES:
+                self.setup_initial_pieces()
+            else:
+                self.setup_variant_pieces()
+        
+        self.turn_order = list(self.tables.players)
+        self.current_player = self.turn_order[0]
+        self.eliminated = set()
+        self.ply = 0
+        # Plies since the last capture or pawn move
+        self.halfmove_clock = 0
+        # Undo records for unmake_move: (from, to, moved, captured, previous player, previous hash,
+        # previous halfmove clock); the hashes double as the record of earlier positions
+        self.history = []
+        self.hash = self.compute_hash()
+        # Zobrist hash over the pawns alone, for caching pawn-structure terms
+        self.pawn_hash = self.compute_pawn_hash()
+        # Material plus piece-square score per player value, kept up to date by make_move
+        self.scores = self.compute_scores()
+    
+    def setup_initial_pieces(self):
+        """Place pieces in their starting positions."""
+        # Red pieces (A1-H1)
+        red_back_rank = ['A1', 'B1', 'C1', 'D1', 'E1', 'F1', 'G1', 'H1']
+        red_pawn_rank = ['A2', 'B2', 'C2', 'D2', 'E2', 'F2', 'G2', 'H2']
+        
+        # Place red pieces
+        self.piece_positions['A1'] = (Player.RED, PieceType.ROOK)
+        self.piece_positions['B1'] = (Player.RED, PieceType.KNIGHT)
+        self.piece_positions['C1'] = (Player.RED, PieceType.BISHOP)
+        self.piece_positions['D1'] = (Player.RED, PieceType.QUEEN)
+        self.piece_positions['E1'] = (Player.RED, PieceType.KING)
+        self.piece_positions['F1'] = (Player.RED, PieceType.BISHOP)
+        self.piece_positions['G1'] = (Player.RED, PieceType.KNIGHT)
+        self.piece_positions['H1'] = (Player.RED, PieceType.ROOK)
+        
+        for node in red_pawn_rank:
+            self.piece_positions[node] = (Player.RED, PieceType.PAWN)
+        
+        # White pieces (A8-L8)
+        white_back_rank = ['A8', 'B8', 'C8', 'D8', 'I8', 'J8', 'K8', 'L8']
+        white_pawn_rank = ['A7', 'B7', 'C7', 'D7', 'I7', 'J7', 'K7', 'L7']
+        
+        # Place white pieces
+        self.piece_positions['A8'] = (Player.WHITE, PieceType.ROOK)
+        self.piece_positions['B8'] = (Player.WHITE, PieceType.KNIGHT)
+        self.piece_positions['C8'] = (Player.WHITE, PieceType.BISHOP)
+        self.piece_positions['D8'] = (Player.WHITE, PieceType.QUEEN)
+        self.piece_positions['I8'] = (Player.WHITE, PieceType.KING)
+        self.piece_positions['J8'] = (Player.WHITE, PieceType.BISHOP)
+        self.piece_positions['K8'] = (Player.WHITE, PieceType.KNIGHT)
+        self.piece_positions['L8'] = (Player.WHITE, PieceType.ROOK)
+        
+        for node in white_pawn_rank:
+            self.piece_positions[node] = (Player.WHITE, PieceType.PAWN)
+        
+        # Black pieces (H12-L12, remember the ordering: H, G, F, E, I, J, K, L)
+        black_back_rank = ['H12', 'G12', 'F12', 'E12', 'I12', 'J12', 'K12', 'L12']
+        black_pawn_rank = ['H11', 'G11', 'F11', 'E11', 'I11', 'J11', 'K11', 'L11']
+        
+        # Place black pieces
+        self.piece_positions['H12'] = (Player.BLACK, PieceType.ROOK)
+        self.piece_positions['G12'] = (Player.BLACK, PieceType.KNIGHT)
+        self.piece_positions['F12'] = (Player.BLACK, PieceType.BISHOP)
+        self.piece_positions['E12'] = (Player.BLACK, PieceType.QUEEN)
+        self.piece_positions['I12'] = (Player.BLACK, PieceType.KING)
+        self.piece_positions['J12'] = (Player.BLACK, PieceType.BISHOP)
+        self.piece_positions['K12'] = (Player.BLACK, PieceType.KNIGHT)
+        self.piece_positions['L12'] = (Player.BLACK, PieceType.ROOK)
+        
+        for node in black_pawn_rank:
+            self.piece_positions[node] = (Player.BLACK, PieceType.PAWN)
+    
+    def setup_variant_pieces(self):
+        """Place pieces on a generated board.
+        
+        Every player gets a rank of pawns in front of a back rank that runs
+        rook, knight, bishop, then alternating knights and bishops from both
+        edges in, with the queen and king in the middle.
+        """
+        size = self.tables.size
+        edge = ([PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP] + [PieceType.KNIGHT, PieceType.BISHOP]*size)[:size - 1]
+        back_rank = edge + [PieceType.QUEEN, PieceType.KING] + edge[::-1]
+        for player in self.tables.players:
+            for index, piece_type in enumerate(back_rank):
+                self.piece_positions[self.tables.coord_squares[(player, size - 1, index)]] = (player, piece_type)
+                self.piece_positions[self.tables.coord_squares[(player, size - 2, index)]] = (player, PieceType.PAWN)
+    
+    def get_pawn_moves(self, node, player):
+        """Get valid pawn moves for a given node.
+        
+        Pawns march through their own sector towards the centre, cross it
+        along their file and then move away from the centre through the
+        sector they entered. Captures go to the diagonals in the same
+        direction, and a pawn on its starting rank may move two squares.
+        """
+        moves = []
+        sector, depth, index = self.tables.coords[node]
+        
+        forward = self.pawn_forward_square(node, player)
+        if forward and forward not in self.piece_positions:
+            moves.append(forward)
+            if sector == player and depth == self.tables.size - 2 and depth >= 2:
+                double = self.tables.coord_squares[(player, depth - 2, index)]
+                if double not in self.piece_positions:
+                    moves.append(double)
+        
+        for neighbor in self.tables.diag_neighbors[node]:
+            target = self.piece_positions.get(neighbor)
+            if target and target[0] != player and self.is_pawn_forward(node, neighbor, player):
+                moves.append(neighbor)
+        
+        return moves
+    
+    def pawn_forward_square(self, node, player):
+        """Return the square in front of a pawn, or None on a far back rank."""
+        sector, depth, index = self.tables.coords[node]
+        if sector != player:
+            if depth == self.tables.size - 1:
+                return None
+            return self.tables.coord_squares[(sector, depth + 1, index)]
+        if depth > 0:
+            return self.tables.coord_squares[(sector, depth - 1, index)]
+        # Across the centre: the file continues into another sector
+        for neighbor in self.tables.file_neighbors[node]:
+            if self.tables.coords[neighbor][0] != sector:
+                return neighbor
+        return None
+    
+    def is_pawn_forward(self, node, target, player):
+        """Whether target lies in the direction a pawn of player on node moves."""
+        sector, depth, _ = self.tables.coords[node]
+        target_sector, target_depth, _ = self.tables.coords[target]
+        if sector != player:
+            return target_sector == sector and target_depth == depth + 1
+        if depth > 0:
+            return target_sector == sector and target_depth == depth - 1
+        return target_sector != sector
+    
+    def is_promotion_square(self, node, player):
+        """Pawns promote on the back rank of another player's sector."""
+        sector, depth, _ = self.tables.coords[node]
+        return sector != player and depth == self.tables.size - 1
+    
+    def get_rook_moves(self, node):
+        """Get valid rook moves using ray casting."""
+        moves = []
+        
+        if node in self.rook_ray_dict:
+            for ray in self.rook_ray_dict[node]:
+                for square in ray:
+                    if square in self.piece_positions:
+                        # Can capture if enemy piece
+                        piece_player, _ = self.piece_positions[square]
+                        if piece_player != self.current_player:
+                            moves.append(square)
+                        break  # Ray is blocked
+                    else:
+                        moves.append(square)
+        
+        return moves
+    
+    def get_bishop_moves(self, node):
+        """Get valid bishop moves using ray casting."""
+        moves = []
+        
+        if node in self.bishop_ray_dict:
+            for ray in self.bishop_ray_dict[node]:
+                for square in ray:
+                    if square in self.piece_positions:
+                        # Can capture if enemy piece
+                        piece_player, _ = self.piece_positions[square]
+                        if piece_player != self.current_player:
+                            moves.append(square)
+                        break  # Ray is blocked
+                    else:
+                        moves.append(square)
+        
+        return moves
+    
+    def get_knight_moves(self, node):
+        """Get valid knight moves."""
+        moves = []
+        
+        if node in self.knight_hop_dict:
+            for square in self.knight_hop_dict[node]:
+                if square in self.piece_positions:
+                    piece_player, _ = self.piece_positions[square]
+                    if piece_player != self.current_player:
+                        moves.append(square)
+                else:
+                    moves.append(square)
+        
+        return moves
+    
+    def get_queen_moves(self, node):
+        """Queen moves like rook + bishop."""
+        return self.get_rook_moves(node) + self.get_bishop_moves(node)
+    
+    def get_king_moves(self, node):
+        """King moves one square in any direction."""
+        moves = []
+        
+        # King can move to any adjacent node (rank, file, or diagonal)
+        for neighbor in self.tables.neighbors[node]:
+            if neighbor in self.piece_positions:
+                piece_player, _ = self.piece_positions[neighbor]
+                if piece_player != self.current_player:
+                    moves.append(neighbor)
+            else:
+                moves.append(neighbor)
+        
+        return moves
+    
+    @profiling.timed("moves", key=lambda self, node: self.piece_positions[node][1].name.lower()
+                     if node in self.piece_positions else "empty")
+    def get_valid_moves(self, node):
+        """Get all valid moves for the piece at the given node."""
+        if node not in self.piece_positions:
+            return []
+        
+        player, piece_type = self.piece_positions[node]
+        
+        if player != self.current_player:
+            return []
+        
+        if piece_type == PieceType.PAWN:
+            return self.get_pawn_moves(node, player)
+        elif piece_type == PieceType.ROOK:
+            return self.get_rook_moves(node)
+        elif piece_type == PieceType.BISHOP:
+            return self.get_bishop_moves(node)
+        elif piece_type == PieceType.KNIGHT:
+            return self.get_knight_moves(node)
+        elif piece_type == PieceType.QUEEN:
+            return self.get_queen_moves(node)
+        elif piece_type == PieceType.KING:
+            return self.get_king_moves(node)
+        
+        return []
+    
+    
+    def copy(self):
+        """Return an independent copy of the game state sharing the tables."""
+        game = GameRules(setup=False, topology=self.tables.topology)
+        game.piece_positions = dict(self.piece_positions)
+        game.current_player = self.current_player
+        game.eliminated = set(self.eliminated)
+        game.ply = self.ply
+        game.halfmove_clock = self.halfmove_clock
+        game.history = list(self.history)
+        game.hash = self.hash
+        game.pawn_hash = self.pawn_hash
+        game.scores = list(self.scores)
+        return game
+    
+    def legal_moves(self):
+        """List every (from, to) move available to the current player."""
+        moves = []
+        for node, (player, _) in list(self.piece_positions.items()):
+            if player == self.current_player:
+                for target in self.get_valid_moves(node):
+                    moves.append((node, target))
+        return moves
+    
+    def is_legal(self, from_node, to_node):
+        """Check a move for the current player."""
+        return to_node in self.get_valid_moves(from_node)
+    
+    def next_player(self, player):
+        """Return the player after the given one, skipping eliminated players."""
+        idx = self.turn_order.index(player)
+        for step in range(1, len(self.turn_order) + 1):
+            candidate = self.turn_order[(idx + step) % len(self.turn_order)]
+            if candidate not in self.eliminated:
+                return candidate
+        return player
+    
+    def make_move(self, from_node, to_node):
+        """Play a move for the current player and return the captured piece, if any.
+        
+        Pawns reaching a promotion square become queens. The move is not
+        validated; call is_legal first for untrusted input.
+        """
+        moved = self.piece_positions.pop(from_node)
+        captured = self.piece_positions.get(to_node)
+        placed = moved
+        if moved[1] == PieceType.PAWN and self.is_promotion_square(to_node, moved[0]):
+            placed = (moved[0], PieceType.QUEEN)
+        self.piece_positions[to_node] = placed
+        self.history.append((from_node, to_node, moved, captured, self.current_player, self.hash,
+                             self.halfmove_clock))
+        self.ply += 1
+        if captured or moved[1] == PieceType.PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        
+        tables = self.tables
+        h = self.hash ^ tables.piece_key(from_node, moved) ^ tables.piece_key(to_node, placed)
+        self.scores[moved[0].value] += tables.piece_score(to_node, placed) - tables.piece_score(from_node, moved)
+        if moved[1] == PieceType.PAWN:
+            self.pawn_hash ^= tables.piece_key(from_node, moved)
+            if placed[1] == PieceType.PAWN:
+                self.pawn_hash ^= tables.piece_key(to_node, placed)
+        if captured:
+            h ^= tables.piece_key(to_node, captured)
+            self.scores[captured[0].value] -= tables.piece_score(to_node, captured)
+            if captured[1] == PieceType.PAWN:
+                self.pawn_hash ^= tables.piece_key(to_node, captured)
+            if captured[1] == PieceType.KING:
+                self.eliminated.add(captured[0])
+                h ^= tables.zobrist_eliminated[captured[0].value]
+        
+        previous = self.current_player
+        self.current_player = self.next_player(previous)
+        self.hash = h ^ tables.zobrist_turn[previous.value] ^ tables.zobrist_turn[self.current_player.value]
+        return captured
+    
+    def unmake_move(self):
+        """Take back the last move played with make_move."""
+        from_node, to_node, moved, captured, player, previous_hash, self.halfmove_clock = self.history.pop()
+        self.ply -= 1
+        tables = self.tables
+        placed = self.piece_positions[to_node]
+        self.scores[moved[0].value] += tables.piece_score(from_node, moved) - tables.piece_score(to_node, placed)
+        if moved[1] == PieceType.PAWN:
+            self.pawn_hash ^= tables.piece_key(from_node, moved)
+            if placed[1] == PieceType.PAWN:
+                self.pawn_hash ^= tables.piece_key(to_node, placed)
+        self.piece_positions[from_node] = moved
+        if captured:
+            self.scores[captured[0].value] += tables.piece_score(to_node, captured)
+            if captured[1] == PieceType.PAWN:
+                self.pawn_hash ^= tables.piece_key(to_node, captured)
+            self.piece_positions[to_node] = captured
+            if captured[1] == PieceType.KING:
+                self.eliminated.discard(captured[0])
+        else:
+            del self.piece_positions[to_node]
+        self.current_player = player
+        self.hash = previous_hash
+    
+    def repetitions(self):
+        """How many times the current position has come up, this time included.
+        
+        Captures and pawn moves can't be taken back, so only the positions
+        since the last of them are looked at, and of those only the ones
+        with the same player to move: every len(living players) plies, as
+        the captures that eliminate players also reset the clock.
+        """
+        history = self.history
+        step = len(self.turn_order) - len(self.eliminated)
+        stop = max(len(history) - self.halfmove_clock, 0)
+        count = 1
+        for i in range(len(history) - step, stop - 1, -step):
+            if history[i][5] == self.hash:
+                count += 1
+        return count
+    
+    def is_fifty_move_draw(self):
+        """Whether every living player has made FIFTY_MOVES moves without a capture or a pawn move."""
+        return self.halfmove_clock >= FIFTY_MOVES*(len(self.turn_order) - len(self.eliminated))
+    
+    def is_draw(self):
+        """Whether the game is drawn by repetition or by the fifty-move rule."""
+        return self.is_fifty_move_draw() or self.repetitions() >= REPETITIONS
+    
+    def position_hashes(self):
+        """Hashes of the positions repetitions() looks back on, oldest first."""
+        return [entry[5] for entry in self.history[max(len(self.history) - self.halfmove_clock, 0):]]
+    
+    def restore_history(self, hashes):
+        """Refill the move history of a decoded position from position_hashes.
+    
+        The entries only hold the hashes, for repetitions(); unmake_move
+        cannot take back the moves before the decoded position.
+        """
+        self.history = [(None, None, None, None, None, h, None) for h in hashes]
+    
+    def compute_hash(self):
+        """Zobrist hash of the position computed from scratch."""
+        tables = self.tables
+        h = tables.zobrist_turn[self.current_player.value]
+        for node, piece in self.piece_positions.items():
+            h ^= tables.piece_key(node, piece)
+        for player in self.eliminated:
+            h ^= tables.zobrist_eliminated[player.value]
+        return h
+    
+    def compute_pawn_hash(self):
+        """Zobrist hash of the pawns alone computed from scratch."""
+        h = 0
+        for node, piece in self.piece_positions.items():
+            if piece[1] == PieceType.PAWN:
+                h ^= self.tables.piece_key(node, piece)
+        return h
+    
+    def compute_scores(self):
+        """Running scores per player value computed from scratch."""
+        scores = [0]*len(self.tables.players)
+        for node, piece in self.piece_positions.items():
+            scores[piece[0].value] += self.tables.piece_score(node, piece)
+        return scores
+    
+    def rotated(self):
+        """Return the position turned one sector, without its move history."""
+        squares, players = self.tables.square_rotation, self.tables.player_rotation
+        game = GameRules(setup=False, topology=self.tables.topology)
+        game.piece_positions = {squares[node]: (players[player], piece_type)
+                                for node, (player, piece_type) in self.piece_positions.items()}
+        game.current_player = players[self.current_player]
+        game.eliminated = {players[player] for player in self.eliminated}
+        game.ply = self.ply
+        game.halfmove_clock = self.halfmove_clock
+        game.hash = game.compute_hash()
+        game.pawn_hash = game.compute_pawn_hash()
+        game.scores = game.compute_scores()
+        return game
+    
+    def living_players(self):
+        """Players that still have their king, in turn order."""
+        return [p for p in self.turn_order if p not in self.eliminated]
+    
+    def bishop_colors(self, player=None):
+        """Square colors of the bishops of player, or of every bishop, one entry per bishop."""
+        colors = self.tables.square_colors
+        return [colors[node] for node, (owner, piece_type) in self.piece_positions.items()
+                if piece_type == PieceType.BISHOP and (player is None or owner == player)]
+    
+    def has_bishop_pair(self, player):
+        """Whether player has bishops on both colors."""
+        return len(set(self.bishop_colors(player))) == 2
+    
+    def bishops_on_one_color(self):
+        """Whether there are bishops and all of them, of every player, stand on one color."""
+        return len(set(self.bishop_colors())) == 1
+    
+    def winner(self):
+        """Return the last player standing, or None while the game goes on."""
+        living = self.living_players()
+        if len(living) == 1:
+            return living[0]
+        return None
+    
+    def is_over(self):
+        """The game ends with one player left, in a draw or when the player to move is stuck."""
+        return self.winner() is not None or self.is_draw() or not self.legal_moves()
+    
+    def export_state(self):
+        """Return a plain, picklable description of the position."""
+        pieces = {node: (player.name, piece_type.name) for node, (player, piece_type) in self.piece_positions.items()}
+        return {
+            "pieces": pieces,
+            "current_player": self.current_player.name,
+            "eliminated": sorted(player.name for player in self.eliminated),
+            "ply": self.ply,
+            "halfmove_clock": self.halfmove_clock,
+        }
+    
+    @classmethod
+    def from_state(cls, state, topology=None):
+        """Rebuild a game from export_state output (the move history is not kept)."""
+        game = cls(setup=False, topology=topology)
+        players = game.tables.players_by_name
+        for node, (player, piece_type) in state["pieces"].items():
+            game.piece_positions[node] = (players[player], PieceType[piece_type])
+        game.current_player = players[state["current_player"]]
+        game.eliminated = {players[name] for name in state["eliminated"]}
+        game.ply = state.get("ply", 0)
+        game.halfmove_clock = state.get("halfmove_clock", 0)
+        game.hash = game.compute_hash()
+        game.pawn_hash = game.compute_pawn_hash()
+        game.scores = game.compute_scores()
+        return game
+    
+    def to_bytes(self):
+        """Encode the position in POSITION_SIZE bytes (the move history is not kept).
+        
+        Variant boards use the same header and one byte per square.
+        """
+        eliminated = 0
+        for player in self.eliminated:
+            eliminated |= 1 << player.value
+        board = bytearray(len(self.tables.squares))
+        index = self.tables.square_index
+        for node, (player, piece_type) in self.piece_positions.items():
+            board[index[node]] = 1 + player.value*6 + piece_type.value
+        return POSITION_HEADER.pack(self.ply, self.current_player.value, eliminated, self.halfmove_clock) + bytes(board)
+    
+    @classmethod
+    def from_bytes(cls, data, topology=None):
+        """Rebuild a game from to_bytes output."""
+        ply, current, eliminated, clock = POSITION_HEADER.unpack_from(data)
+        game = cls(setup=False, topology=topology)
+        players, squares = game.tables.players_by_value, game.tables.squares
+        game.ply = ply
+        game.halfmove_clock = clock
+        game.current_player = players[current]
+        game.eliminated = {player for player in players.values() if eliminated & (1 << player.value)}
+        for i, code in enumerate(data[POSITION_HEADER.size:POSITION_HEADER.size + len(squares)]):
+            if code:
+                player, piece_type = divmod(code - 1, 6)
+                game.piece_positions[squares[i]] = (players[player], PieceType(piece_type))
+        game.hash = game.compute_hash()
+        game.pawn_hash = game.compute_pawn_hash()
+        game.scores = game.compute_scores()
+        return game
+
+    def to_notation(self):
+        """Encode the position as one line of text (the move history is not kept).
+        
+        Each player in sector order gets a group of pieces, a letter and a
+        square each, and groups are separated by "/"; the group of an
+        eliminated player starts with "-". The player to move, the ply and
+        the halfmove clock follow:
+        
+            KE1QD1RA1.../KH8.../-KL9... WHITE 31 4
+        """
+        index = self.tables.square_index
+        groups = {player: [] for player in self.tables.players}
+        for node, (player, piece_type) in self.piece_positions.items():
+            groups[player].append((NOTATION_ORDER.index(piece_type), index[node], NOTATION_LETTERS[piece_type] + node))
+        fields = []
+        for player in self.tables.players:
+            pieces = "".join(text for _, _, text in sorted(groups[player]))
+            fields.append(("-" if player in self.eliminated else "") + pieces)
+        return f"{'/'.join(fields)} {self.current_player.name} {self.ply} {self.halfmove_clock}"
+    
+    @classmethod
+    def from_notation(cls, text, topology=None):
+        """Rebuild a game from to_notation output; raise ValueError if it doesn't parse.
+        
+        The halfmove clock may be left out and then starts at 0.
+        """
+        fields = text.split()
+        if len(fields) == 3:
+            fields.append("0")
+        if len(fields) != 4 or not fields[2].isdigit() or not fields[3].isdigit():
+            raise ValueError(f"expected '<pieces> <player> <ply> [<clock>]', got {text!r}")
+        placement, current, ply, clock = fields
+        game = cls(setup=False, topology=topology)
+        groups = placement.split("/")
+        if len(groups) != len(game.tables.players):
+            raise ValueError(f"expected {len(game.tables.players)} groups of pieces, got {len(groups)}")
+        for player, group in zip(game.tables.players, groups):
+            if group.startswith("-"):
+                game.eliminated.add(player)
+                group = group[1:]
+            pieces = NOTATION_PIECE.findall(group)
+            if "".join(letter + node for letter, node in pieces) != group:
+                raise ValueError(f"cannot read the pieces {group!r}")
+            for letter, node in pieces:
+                if node not in game.tables.square_index or node in game.piece_positions:
+                    raise ValueError(f"{node} is not a free square of the board")
+                game.piece_positions[node] = (player, NOTATION_PIECES[letter])
+        if current not in game.tables.players_by_name:
+            raise ValueError(f"no player {current}")
+        game.current_player = game.tables.players_by_name[current]
+        game.ply = int(ply)
+        game.halfmove_clock = int(clock)
+        game.hash = game.compute_hash()
+        game.pawn_hash = game.compute_pawn_hash()
+        game.scores = game.compute_scores()
+        return game
+
+PIECE_VALUES = {
+    PieceType.PAWN: 1,
+    PieceType.KNIGHT: 3,
+    PieceType.BISHOP: 3,
+    PieceType.ROOK: 5,
+    PieceType.QUEEN: 9,
+    PieceType.KING: 100,
+}
+
+def choose_bot_move(state, rng=random, topology=None):
+    """Pick a move for the player to move in an exported state.
+    
+    Takes the most valuable capture available, otherwise a random move.
+    Returns None when there is nothing to play.
+    """
+    game = GameRules.from_state(state, topology)
+    moves = game.legal_moves()
+    if not moves:
+        return None
+    
+    best_value, best_moves = 0, []
+    for from_node, to_node in moves:
+        target = game.piece_positions.get(to_node)
+        value = PIECE_VALUES[target[1]] if target else 0
+        if value > best_value:
+            best_value, best_moves = value, [(from_node, to_node)]
+        elif value == best_value and value > 0:
+            best_moves.append((from_node, to_node))
+    
+    return rng.choice(best_moves or moves)
@@ -0,0 +1,741 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Paranoid alpha-beta search with quiescence and static exchange evaluation.
+
+The player to move at the root maximises its relative score (evaluate.py)
+and assumes every opponent plays to minimise it, so the search is a plain
+alpha-beta over a three-way turn order with two minimising plies in a row.
+Iterative deepening orders each iteration by the best moves of the last one
+through a transposition table.
+
+A fixed-depth search stops in the middle of exchanges, and with two
+opponents able to recapture the evaluation at the horizon is often wrong by
+a piece. At depth 0 the search continues with captures only (quiescence):
+the side to move may stand pat on the static score, captures are tried
+most valuable victim first, and two prunings keep the tree small:
+
+    delta   skip a capture that cannot bring the score back to the window
+            even if the victim were free
+    SEE     skip a capture that loses material once the exchange on its
+            square is played out (static_exchange)
+
+Below the root a position that repeats one from earlier in the game or the
+search, or that the fifty-move rule draws, scores DRAW_SCORE: a player who
+could steer back to it once can do so again.
+
+After every iteration the search reports its statistics (iteration_stats)
+to an optional callback and as one JSON line to an optional log:
+
+    nodes, qnodes        alpha-beta and quiescence nodes of the iteration
+    tt_hits              probes that found their position
+    tt_cutoffs           hits that ended the node without a search
+    tt_stores            entries written
+    tt_collisions        stores that overwrote another position's entry
+    cutoffs              beta cutoffs by the index of the move that caused
+                         them, the last bucket holding later moves
+    branching_factor     nodes of this iteration over those of the last
+    time, nps            seconds and nodes (both kinds) per second
+    tb_hits              nodes a tablebase (tablebase.py) settled
+    pv                   the principal variation, read from the table
+
+A search can also be limited by nodes or time, or stopped from another
+thread through an event, as engine.py does; it then returns the result of
+the last iteration it finished. Limits given as SearchLimits can be set
+from another thread while the search runs, as engine.py does on ponderhit.
+
+The transposition table outlives a search. Entries carry the generation of
+the search that stored them; a shallower entry only replaces a deeper one
+of another position once that entry is two searches old, so the subtree
+searched for the last move is still there for the next. A PonderingPlayer
+uses this to think during the two opponent moves between its turns: it
+searches the position its principal variation predicts for its next turn,
+and carries on from there when the opponents play the predicted replies.
+
+Run `python search.py --depth 4 --stats` to print them,
+`python search.py --bench` to compare node counts and time with and without
+quiescence and pruning on positions from random games, and
+`python search.py --ponder` to compare reply times with and without
+pondering.
+"""
+import argparse
+import json
+import profiling
+import random
+import threading
+import time
+
+from evaluate import Evaluator, relative_score, random_positions
+from rules import GameRules, PieceType, PIECE_MATERIAL, choose_bot_move
+from tablebase import DRAW, WIN
+from topology import generate_topology
+
+INFINITY = 10**9
+
+# Exchange values: losing the king ends the game for its player
+SEE_VALUES = dict(PIECE_MATERIAL)
+SEE_VALUES[PieceType.KING] = 20000
+
+DELTA_MARGIN = 200
+MAX_QUIESCENCE_DEPTH = 8
+
+# Transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Cutoff histogram buckets; the last counts every later move
+CUTOFF_BUCKETS = 8
+
+# Iterations of a search limited by nodes, time or a stop event only
+MAX_DEPTH = 64
+# Nodes between checks of the limits
+CHECK_INTERVAL = 256
+
+# Score of a repeated position or one drawn by the fifty-move rule
+DRAW_SCORE = 0
+
+# A won tablebase position, less its distance in plies: above any
+# evaluation, below eliminating every opponent
+TABLEBASE_WIN = 500000
+
+SLIDERS = {
+    "rook": (PieceType.ROOK, PieceType.QUEEN),
+    "bishop": (PieceType.BISHOP, PieceType.QUEEN),
+}
+
+class SearchStopped(Exception):
+    """Unwinds a search that hit its limits or was told to stop."""
+
+class SearchLimits:
+    """Node and time limits of a search, which another thread may set while it runs.
+
+    A node limit set during a search counts the nodes searched from then
+    on, and a movetime the seconds from then on.
+    """
+
+    def __init__(self, nodes=None, movetime=None):
+        self.set(nodes, movetime)
+
+    def set(self, nodes=None, movetime=None):
+        # The searching thread notes its node count at its next check
+        self.start_nodes = None
+        self.nodes = nodes
+        self.deadline = time.perf_counter() + movetime if movetime is not None else None
+
+def attackers(rules, square, gone=()):
+    """Return (value, node, player) for every piece that could capture on square.
+
+    Pieces on gone squares have already been exchanged off and neither
+    attack nor block. Rays and knight hops are symmetric, so they are read
+    outwards from the square itself.
+    """
+    positions = rules.piece_positions
+    tables = rules.tables
+    found = []
+    for node in rules.knight_hop_dict[square]:
+        piece = positions.get(node)
+        if piece and piece[1] is PieceType.KNIGHT and node not in gone:
+            found.append((SEE_VALUES[PieceType.KNIGHT], node, piece[0]))
+    for rays, kind in ((rules.rook_ray_dict, "rook"), (rules.bishop_ray_dict, "bishop")):
+        for ray in rays[square]:
+            for node in ray:
+                piece = positions.get(node)
+                if piece is None or node in gone:
+                    continue
+                if piece[1] in SLIDERS[kind]:
+                    found.append((SEE_VALUES[piece[1]], node, piece[0]))
+                break
+    for node in tables.neighbors[square]:
+        piece = positions.get(node)
+        if piece and piece[1] is PieceType.KING and node not in gone:
+            found.append((SEE_VALUES[PieceType.KING], node, piece[0]))
+    for node in tables.diag_neighbors[square]:
+        piece = positions.get(node)
+        if (piece and piece[1] is PieceType.PAWN and node not in gone
+                and rules.is_pawn_forward(node, square, piece[0])):
+            found.append((SEE_VALUES[PieceType.PAWN], node, piece[0]))
+    return found
+
+def static_exchange(rules, from_node, to_node):
+    """Material the player to move wins by capturing from from_node to to_node.
+
+    The exchange alternates between the mover and its opponents, who are
+    treated as one side: after each capture the other side recaptures with
+    its least valuable attacker, whichever opponent it belongs to, and
+    either side may stop when going on would lose material. Pieces of
+    eliminated players never recapture.
+    """
+    positions = rules.piece_positions
+    mover = positions[from_node][0]
+    victim = positions.get(to_node)
+    gains = [SEE_VALUES[victim[1]] if victim else 0]
+    on_square = positions[from_node]
+    gone = {from_node}
+    movers_turn = False
+    while True:
+        candidates = [attacker for attacker in attackers(rules, to_node, gone)
+                      if (attacker[2] == mover) == movers_turn and attacker[2] not in rules.eliminated]
+        if not candidates:
+            break
+        _, node, _ = min(candidates)
+        gains.append(SEE_VALUES[on_square[1]] - gains[-1])
+        on_square = positions[node]
+        gone.add(node)
+        movers_turn = not movers_turn
+    # Back up the swap list: each side only continues while it pays
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
+
+class Search:
+    """Iterative-deepening paranoid search for the player to move.
+
+    quiescence, delta_pruning and see_pruning switch the horizon handling
+    for comparisons; the transposition table has 2**tt_bits slots.
+    on_iteration is called with the statistics of every iteration, and log,
+    a path or a writable text file, gets them as JSON lines. A tablebase
+    (tablebase.Tablebase) settles the positions its tables cover.
+    """
+
+    def __init__(self, evaluator=None, tt_bits=18, quiescence=True, delta_pruning=True, see_pruning=True,
+                 on_iteration=None, log=None, tablebase=None):
+        self.evaluator = evaluator or Evaluator()
+        self.tablebase = tablebase
+        self.on_iteration = on_iteration
+        self.log = log
+        self.iterations = []
+        self.quiescence = quiescence
+        self.delta_pruning = delta_pruning
+        self.see_pruning = see_pruning
+        self.tt_mask = (1 << tt_bits) - 1
+        self.tt = [None] * (1 << tt_bits)
+        # Scores are from the root player's side, so entries are keyed by it too
+        rng = random.Random(0x5EA)
+        self.root_keys = [rng.getrandbits(64) for _ in range(16)]
+        self.root = None
+        self.root_ply = 0
+        self.root_move = None
+        self.generation = 0
+        self.stop = None
+        self.limits = SearchLimits()
+        self.spent = 0
+        self.reset_counters()
+
+    def clear(self):
+        """Forget the transposition table and the evaluation caches, as for a new game."""
+        self.tt = [None] * len(self.tt)
+        self.generation = 0
+        self.evaluator.clear()
+
+    def reset_counters(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.tt_stores = 0
+        self.tt_collisions = 0
+        self.tb_hits = 0
+        self.cutoffs = [0] * CUTOFF_BUCKETS
+
+    @profiling.timed("search")
+    def search(self, rules, depth=MAX_DEPTH, nodes=None, movetime=None, stop=None, limits=None):
+        """Return (best move, score) for the player to move, searching depth plies.
+        
+        nodes and movetime (in seconds) limit the whole search, and setting
+        stop, a threading.Event, ends it early. A search cut short returns
+        the last finished iteration, or the best move found so far when not
+        even the first one finished. limits, a SearchLimits, replaces nodes
+        and movetime when given.
+        """
+        rules = rules.copy()
+        self.root = rules.current_player
+        self.root_key = self.root_keys[self.root.value]
+        self.root_ply = rules.ply
+        self.root_move = None
+        self.generation += 1
+        self.stop = stop
+        self.limits = limits if limits is not None else SearchLimits(nodes, movetime)
+        self.spent = 0
+        if self.limits.nodes is not None and self.limits.start_nodes is None:
+            self.limits.start_nodes = 0
+        self.iterations = []
+        best_move, score = None, 0
+        for iteration in range(1, depth + 1):
+            self.reset_counters()
+            start = time.perf_counter()
+            try:
+                iteration_score = self.alphabeta(rules, iteration, -INFINITY, INFINITY)
+            except SearchStopped:
+                self.spent += self.nodes + self.qnodes
+                break
+            elapsed = time.perf_counter() - start
+            if profiling.enabled:
+                profiling.record("search.iteration", elapsed)
+                profiling.count("search.nodes", self.nodes)
+                profiling.count("search.qnodes", self.qnodes)
+            score = iteration_score
+            entry = self.tt[(rules.hash ^ self.root_key) & self.tt_mask]
+            if entry and entry[0] == rules.hash ^ self.root_key and entry[4]:
+                best_move = entry[4]
+            self.spent += self.nodes + self.qnodes
+            self.report(self.iteration_stats(iteration, elapsed, best_move, score,
+                                             self.principal_variation(rules, iteration)))
+        if best_move is None:
+            best_move = self.root_move
+        return best_move, score
+
+    def check_limits(self):
+        limits = self.limits
+        if limits.nodes is not None:
+            searched = self.spent + self.nodes + self.qnodes
+            if limits.start_nodes is None:
+                limits.start_nodes = searched
+            if searched - limits.start_nodes >= limits.nodes:
+                raise SearchStopped()
+        if ((self.stop is not None and self.stop.is_set())
+                or (limits.deadline is not None and time.perf_counter() >= limits.deadline)):
+            raise SearchStopped()
+
+    def principal_variation(self, rules, depth):
+        """Follow the best moves stored in the table from the root, at most depth plies."""
+        rules = rules.copy()
+        pv = []
+        seen = set()
+        while len(pv) < depth and rules.hash not in seen:
+            seen.add(rules.hash)
+            key = rules.hash ^ self.root_key
+            entry = self.tt[key & self.tt_mask]
+            if not entry or entry[0] != key or not entry[4] or not rules.is_legal(*entry[4]):
+                break
+            pv.append(entry[4])
+            rules.make_move(*entry[4])
+        return pv
+
+    def predicted_turn(self, rules, move):
+        """Return (replies, position) expected after playing move in rules.
+
+        The replies are the opponent moves that follow move in the principal
+        variation of the last finished iteration, up to the next turn of the
+        player to move, and position the position they lead to. None when
+        that variation starts with another move or ends too early.
+        """
+        if not self.iterations:
+            return None
+        pv = [tuple(step) for step in self.iterations[-1]["pv"]]
+        if not pv or pv[0] != tuple(move):
+            return None
+        player = rules.current_player
+        rules = rules.copy()
+        rules.make_move(*move)
+        replies = []
+        for reply in pv[1:]:
+            if rules.current_player == player or rules.winner() is not None:
+                break
+            rules.make_move(*reply)
+            replies.append(reply)
+        if rules.current_player != player or rules.winner() is not None:
+            return None
+        return replies, rules
+
+    @property
+    def total_nodes(self):
+        """Alpha-beta and quiescence nodes of the whole last search."""
+        return sum(stats["nodes"] + stats["qnodes"] for stats in self.iterations)
+
+    def iteration_stats(self, depth, elapsed, best_move, score, pv=()):
+        previous = self.iterations[-1]["nodes"] if self.iterations else 0
+        cutoffs = sum(self.cutoffs)
+        return {
+            "depth": depth,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "tt_hits": self.tt_hits,
+            "tt_cutoffs": self.tt_cutoffs,
+            "tt_stores": self.tt_stores,
+            "tt_collisions": self.tt_collisions,
+            "tb_hits": self.tb_hits,
+            "cutoffs": list(self.cutoffs),
+            "first_move_cutoffs": self.cutoffs[0] / cutoffs if cutoffs else 0.0,
+            "branching_factor": self.nodes / previous if previous else float(self.nodes),
+            "time": elapsed,
+            "nps": (self.nodes + self.qnodes) / elapsed if elapsed else 0.0,
+            "best_move": list(best_move) if best_move else None,
+            "score": score,
+            "pv": [list(move) for move in pv],
+        }
+
+    def report(self, stats):
+        self.iterations.append(stats)
+        if self.on_iteration:
+            self.on_iteration(stats)
+        if self.log:
+            line = json.dumps(stats) + "\n"
+            if isinstance(self.log, str):
+                with open(self.log, "a") as f:
+                    f.write(line)
+            else:
+                self.log.write(line)
+
+    @profiling.timed("search.evaluate")
+    def static_score(self, rules):
+        return relative_score(self.evaluator.evaluate(rules), self.root)
+
+    def is_terminal(self, rules):
+        return self.root in rules.eliminated or rules.winner() is not None
+
+    @profiling.timed("search.tablebase")
+    def tablebase_score(self, rules):
+        """Score of a position from the tablebase, or None where it doesn't decide it.
+
+        Tables assume the strong side's opponents work together, as this
+        search does for the root player, so they settle every position the
+        root player is the strong side of, and those the strong side wins
+        against it.
+        """
+        probe = self.tablebase.probe(rules)
+        if probe is None:
+            return None
+        strong, outcome, distance = probe
+        if strong == self.root:
+            if outcome == DRAW:
+                return 0
+            return TABLEBASE_WIN - distance if outcome == WIN else distance - TABLEBASE_WIN
+        if outcome == WIN:
+            return distance - TABLEBASE_WIN
+        return None
+
+    @profiling.timed("search.order_moves")
+    def order_moves(self, rules, moves, tt_move=None):
+        """TT move, then captures most valuable victim first and least valuable attacker first, then the rest."""
+        positions = rules.piece_positions
+        def key(move):
+            if move == tt_move:
+                return (0, 0, 0)
+            victim = positions.get(move[1])
+            if victim:
+                return (1, -SEE_VALUES[victim[1]], SEE_VALUES[positions[move[0]][1]])
+            return (2, 0, 0)
+        return sorted(moves, key=key)
+
+    def alphabeta(self, rules, depth, alpha, beta):
+        self.nodes += 1
+        if (self.nodes + self.qnodes) % CHECK_INTERVAL == 0:
+            self.check_limits()
+        if self.is_terminal(rules):
+            return self.static_score(rules)
+        # A single repetition counts as the draw
+        if rules.ply > self.root_ply and (rules.repetitions() > 1 or rules.is_fifty_move_draw()):
+            return DRAW_SCORE
+        # The root itself needs a move, not just its score
+        if self.tablebase and rules.ply > self.root_ply:
+            score = self.tablebase_score(rules)
+            if score is not None:
+                self.tb_hits += 1
+                return score
+        if depth <= 0:
+            if self.quiescence:
+                return self.quiesce(rules, alpha, beta, 0)
+            return self.static_score(rules)
+
+        key = rules.hash ^ self.root_key
+        slot = key & self.tt_mask
+        entry = self.tt[slot]
+        tt_move = None
+        if entry and entry[0] == key:
+            self.tt_hits += 1
+            _, entry_depth, bound, entry_score, tt_move, _ = entry
+            if entry_depth >= depth:
+                if (bound == EXACT or (bound == LOWER and entry_score >= beta)
+                        or (bound == UPPER and entry_score <= alpha)):
+                    self.tt_cutoffs += 1
+                    return entry_score
+
+        moves = rules.legal_moves()
+        if not moves:
+            return self.static_score(rules)
+
+        maximizing = rules.current_player == self.root
+        original_alpha, original_beta = alpha, beta
+        best_score = -INFINITY if maximizing else INFINITY
+        best_move = None
+        for index, move in enumerate(self.order_moves(rules, moves, tt_move)):
+            rules.make_move(*move)
+            score = self.alphabeta(rules, depth - 1, alpha, beta)
+            rules.unmake_move()
+            if maximizing:
+                if score > best_score:
+                    best_score, best_move = score, move
+                    alpha = max(alpha, score)
+                    if rules.ply == self.root_ply:
+                        self.root_move = move
+            else:
+                if score < best_score:
+                    best_score, best_move = score, move
+                    beta = min(beta, score)
+            if alpha >= beta:
+                self.cutoffs[min(index, CUTOFF_BUCKETS - 1)] += 1
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= original_beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        # Keep a deeper entry of another position from this search or the last
+        if entry and entry[0] != key:
+            if entry[1] > depth and self.generation - entry[5] < 2:
+                return best_score
+            self.tt_collisions += 1
+        self.tt[slot] = (key, depth, bound, best_score, best_move, self.generation)
+        self.tt_stores += 1
+        return best_score
+
+    @profiling.timed("search.quiesce", outermost=True)
+    def quiesce(self, rules, alpha, beta, qdepth):
+        """Search captures only, standing pat on the static score."""
+        self.qnodes += 1
+        if (self.nodes + self.qnodes) % CHECK_INTERVAL == 0:
+            self.check_limits()
+        stand_pat = self.static_score(rules)
+        if qdepth >= MAX_QUIESCENCE_DEPTH or self.is_terminal(rules):
+            return stand_pat
+
+        maximizing = rules.current_player == self.root
+        if maximizing:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+
+        positions = rules.piece_positions
+        captures = [move for move in rules.legal_moves() if move[1] in positions]
+        best_score = stand_pat
+        for from_node, to_node in self.order_moves(rules, captures):
+            victim = positions[to_node]
+            if self.delta_pruning and victim[1] is not PieceType.KING:
+                # The most this capture can move the root player's score
+                if maximizing and stand_pat + SEE_VALUES[victim[1]] + DELTA_MARGIN <= alpha:
+                    continue
+                swing = SEE_VALUES[victim[1]] if victim[0] == self.root else 0
+                if not maximizing and stand_pat - swing - DELTA_MARGIN >= beta:
+                    continue
+            if self.see_pruning and static_exchange(rules, from_node, to_node) < 0:
+                continue
+
+            rules.make_move(from_node, to_node)
+            score = self.quiesce(rules, alpha, beta, qdepth + 1)
+            rules.unmake_move()
+            if maximizing:
+                if score > best_score:
+                    best_score = score
+                    alpha = max(alpha, score)
+            else:
+                if score < best_score:
+                    best_score = score
+                    beta = min(beta, score)
+            if alpha >= beta:
+                break
+        return best_score
+
+class PonderingPlayer:
+    """Plays one seat with a Search, thinking on through the opponents' turns.
+
+    After every move it predicts the opponents' replies, each by a search
+    of reply_depth plies from that opponent's side, and searches the
+    position they lead to in a background thread. If the opponents play
+    those replies (a ponder hit), that search goes on for what is left of
+    movetime counted from the end of the move; otherwise it is stopped and
+    a new search starts, still with the transposition table both share.
+    depth caps either search, and pondering, the predictions included,
+    stops after ponder_factor times movetime, so a player that is never
+    asked for its move does not think on forever.
+
+    halt() and close() may be called from another thread than choose();
+    after close() the player no longer ponders.
+    """
+
+    def __init__(self, search=None, movetime=1.0, depth=MAX_DEPTH, reply_depth=2, ponder_factor=3.0):
+        self.search = search or Search()
+        self.movetime = movetime
+        self.ponder_factor = ponder_factor
+        self.depth = depth
+        self.reply_depth = reply_depth
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop = None
+        self.closed = False
+        self.predicted = None
+        self.result = None
+        self.started = 0.0
+        self.ponder_hits = self.ponder_misses = 0
+
+    def choose(self, rules):
+        """Return the move to play in rules, or None without one, and start pondering."""
+        move = None
+        with self.lock:
+            thread = self.thread
+        if thread is not None:
+            if self.is_predicted(rules):
+                self.ponder_hits += 1
+                thread.join(max(self.movetime - (time.perf_counter() - self.started), 0))
+                self.halt()
+                move = self.result[0]
+            else:
+                self.ponder_misses += 1
+                self.halt()
+        if move is None or not rules.is_legal(*move):
+            move, _ = self.search.search(rules, self.depth, movetime=self.movetime)
+        if move is not None:
+            self.ponder(rules, move)
+        return move
+
+    def is_predicted(self, rules):
+        predicted = self.predicted
+        return (predicted is not None and rules.hash == predicted.hash
+                and rules.current_player == predicted.current_player
+                and rules.piece_positions == predicted.piece_positions
+                and rules.eliminated == predicted.eliminated)
+
+    def ponder(self, rules, move):
+        """Think in the background about the turn after playing move in rules."""
+        position = rules.copy()
+        position.make_move(*move)
+        with self.lock:
+            if self.closed:
+                return
+            self.predicted = None
+            self.result = (None, 0)
+            self.stop = threading.Event()
+            self.started = time.perf_counter()
+            limits = SearchLimits(movetime=self.ponder_factor*self.movetime)
+            self.thread = threading.Thread(target=self.think, args=(position, rules.current_player, self.stop, limits),
+                                           daemon=True)
+            self.thread.start()
+
+    def think(self, rules, player, stop, limits):
+        while rules.current_player != player:
+            if rules.winner() is not None or player in rules.eliminated:
+                return
+            reply, _ = self.search.search(rules, self.reply_depth, stop=stop, limits=limits)
+            if reply is None or stop.is_set():
+                return
+            rules.make_move(*reply)
+        self.predicted = rules.copy()
+        self.result = self.search.search(rules, self.depth, stop=stop, limits=limits)
+
+    def halt(self):
+        """Stop pondering, if it is, and wait for the search to unwind."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+            if thread is not None:
+                self.stop.set()
+        if thread is not None:
+            thread.join()
+
+    def close(self):
+        """Stop pondering for good, for a player that will not move again."""
+        with self.lock:
+            self.closed = True
+        self.halt()
+
+def ponder_benchmark(moves, movetime, depth, think, opponents, seed, topology):
+    """Play games against two opponents that take think seconds per move,
+    once with a pondering player and once without, and print its reply times.
+
+    opponents is "search", a two-ply search from their own side, or
+    "greedy", the server's bot (rules.choose_bot_move).
+    """
+    for pondering in (False, True):
+        rng = random.Random(seed)
+        player = PonderingPlayer(movetime=movetime, depth=depth)
+        opponent = Search(tt_bits=14)
+        replies = []
+        rules = GameRules(topology=topology)
+        seat = rules.current_player
+        while len(replies) < moves:
+            if rules.winner() is not None or seat in rules.eliminated or not rules.legal_moves():
+                player.halt()
+                rules = GameRules(topology=topology)
+                # Vary the openings with a random first move
+                rules.make_move(*rng.choice(rules.legal_moves()))
+            if rules.current_player == seat:
+                start = time.perf_counter()
+                move = player.choose(rules) if pondering else player.search.search(rules, depth, movetime=movetime)[0]
+                replies.append(time.perf_counter() - start)
+            else:
+                time.sleep(think)
+                if opponents == "greedy":
+                    move = choose_bot_move(rules.export_state(), rng, topology)
+                else:
+                    move = opponent.search(rules, 2)[0]
+            rules.make_move(*move)
+        player.halt()
+        replies.sort()
+        name = "pondering" if pondering else "not pondering"
+        print(f"{name:<14} mean reply {sum(replies)/len(replies):.3f} s, median {replies[len(replies)//2]:.3f} s, "
+              f"ponder hits {player.ponder_hits}, misses {player.ponder_misses}")
+
+def benchmark(positions, depth):
+    """Search every position with each horizon treatment and print the cost."""
+    modes = [
+        ("static eval at the horizon", dict(quiescence=False), depth),
+        ("quiescence, all captures", dict(delta_pruning=False, see_pruning=False), depth),
+        ("quiescence, delta + SEE", dict(), depth),
+        (f"all moves to depth {depth + 1}", dict(quiescence=False), depth + 1),
+    ]
+    print(f"{'':<28} {'nodes':>9} {'qnodes':>9} {'total':>9} {'time':>8}")
+    for name, options, mode_depth in modes:
+        nodes = qnodes = 0
+        start = time.perf_counter()
+        for rules in positions:
+            search = Search(tt_bits=16, **options)
+            search.search(rules, mode_depth)
+            nodes += sum(stats["nodes"] for stats in search.iterations)
+            qnodes += sum(stats["qnodes"] for stats in search.iterations)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28} {nodes:>9} {qnodes:>9} {nodes + qnodes:>9} {elapsed:>7.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a position or compare horizon treatments.")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--bench", action="store_true", help="compare node counts on random positions")
+    parser.add_argument("--positions", type=int, default=10, help="positions searched with --bench")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--board", default="3x4", help="PLAYERSxSIZE of the board (default 3x4, the standard board)")
+    parser.add_argument("--stats", action="store_true", help="print the statistics of every iteration")
+    parser.add_argument("--log", help="append the statistics of every iteration to this JSON-lines file")
+    parser.add_argument("--ponder", action="store_true", help="compare reply times with and without pondering")
+    parser.add_argument("--moves", type=int, default=20, help="replies timed with --ponder")
+    parser.add_argument("--movetime", type=float, default=1.0, help="seconds per reply with --ponder")
+    parser.add_argument("--think", type=float, default=1.0, help="seconds each opponent takes with --ponder")
+    parser.add_argument("--opponents", choices=("search", "greedy"), default="search", help="opponents with --ponder")
+    args = parser.parse_args()
+
+    players, size = (int(n) for n in args.board.lower().split("x"))
+    topology = generate_topology(players, size)
+    if args.ponder:
+        ponder_benchmark(args.moves, args.movetime, args.depth, args.think, args.opponents, args.seed, topology)
+        return
+    if args.bench:
+        benchmark(random_positions(args.positions, args.seed, max_plies=60, topology=topology), args.depth)
+        return
+
+    def print_stats(stats):
+        cutoffs = " ".join(str(count) for count in stats["cutoffs"])
+        print(f"depth {stats['depth']}: {stats['nodes']} nodes, {stats['qnodes']} qnodes, "
+              f"branching {stats['branching_factor']:.1f}, {stats['time']:.2f} s, {stats['nps']:.0f} nps, "
+              f"tt {stats['tt_hits']} hits / {stats['tt_cutoffs']} cutoffs / {stats['tt_stores']} stores / "
+              f"{stats['tt_collisions']} collisions, cutoffs by move [{cutoffs}] "
+              f"({stats['first_move_cutoffs']:.0%} first)")
+
+    search = Search(on_iteration=print_stats if args.stats else None, log=args.log)
+    start = time.perf_counter()
+    move, score = search.search(GameRules(topology=topology), args.depth)
+    elapsed = time.perf_counter() - start
+    print(f"Best move {move[0]}-{move[1]} scoring {score} after {search.total_nodes} nodes in {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    main()
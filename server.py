@@ -0,0 +1,644 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Async game server exposing the 3Chess rules engine over WebSocket.
+
+The server is the authority for hosted games: every move is checked against
+GameRules before it is applied, and clients only ever receive the resulting
+state deltas. Many three-player rooms run concurrently on one event loop;
+seats can be handed to the engine bot, which runs in a process pool so that
+move search never blocks the loop.
+
+HTTP endpoints:
+    GET /rooms          summary of every room
+    GET /rooms/<id>     full state of one room
+
+WebSocket endpoint /ws, JSON text messages:
+    -> {"type": "join", "room": "r1", "seat": "RED"}    omit seat to spectate an
+                                                        existing room
+    -> {"type": "move", "from": "E2", "to": "E3"}
+    -> {"type": "bot", "seat": "WHITE"}                 give a free seat of your room
+                                                        to the bot
+    <- {"type": "state", ...}                           full state, sent on join
+    <- {"type": "delta", "ply": 1, "player": "RED", "from": "E2", "to": "E3",
+        "captured": null, "next": "WHITE", "eliminated": [], "winner": null,
+        "draw": false}
+    <- {"type": "closed", "room": "r1"}                 the last seated client left
+    <- {"type": "error", "message": "..."}
+
+A room closes when its last seated client leaves; spectators neither
+create rooms nor keep them open, and their leaving never closes one.
+
+With --bot-movetime the bots search instead (search.py), each bot seat with
+a PonderingPlayer of its own that thinks on the predicted position while
+the other two seats move and keeps its transposition table for the whole
+game. These searches run in threads of the server process, so pondering
+stops after three times the movetime to keep it from holding the
+interpreter against the event loop between turns.
+
+With --data-dir the server keeps a RoomStore there: every move is appended
+to a log and all live rooms are snapshotted periodically, so a restarted
+server picks its games up where they stopped.
+
+Run `python server.py serve` to host games and `python server.py loadtest`
+against it to simulate many rooms of random players.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from rules import GameRules, Player, choose_bot_move
+from search import PonderingPlayer, Search
+from snapshots import RoomStore
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+MAX_FRAME = 1 << 16
+
+# ---------------------------------------------------------------------------
+# WebSocket framing (RFC 6455, unfragmented frames only)
+# ---------------------------------------------------------------------------
+
+def websocket_accept(key):
+    """Compute the Sec-WebSocket-Accept value for a handshake key."""
+    digest = hashlib.sha1((key + WS_GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+def apply_mask(payload, mask):
+    """XOR a payload with a 4-byte masking key."""
+    if not payload:
+        return payload
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+def encode_frame(opcode, payload, mask=False):
+    """Build a single final frame; clients must mask, servers must not."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < (1 << 16):
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if mask:
+        key = os.urandom(4)
+        return bytes(header) + key + apply_mask(payload, key)
+    return bytes(header) + payload
+
+async def read_frame(reader):
+    """Read one frame and return (opcode, payload)."""
+    head = await reader.readexactly(2)
+    opcode = head[0] & 0x0F
+    masked = head[1] & 0x80
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_FRAME:
+        raise ConnectionError(f"frame of {length} bytes is too large")
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = apply_mask(payload, mask)
+    return opcode, payload
+
+async def read_http_head(reader):
+    """Read an HTTP request or response head; return (start line, headers)."""
+    raw = await reader.readuntil(b"\r\n\r\n")
+    lines = raw.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+async def open_websocket(host, port):
+    """Connect to the server's /ws endpoint as a client; return (reader, writer)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        "GET /ws HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n".encode()
+    )
+    status, headers = await read_http_head(reader)
+    if " 101 " not in status or headers.get("sec-websocket-accept") != websocket_accept(key):
+        writer.close()
+        raise ConnectionError(f"handshake failed: {status}")
+    return reader, writer
+
+# ---------------------------------------------------------------------------
+# Rooms
+# ---------------------------------------------------------------------------
+
+class Connection:
+    """One WebSocket client, seated or spectating."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.room = None
+        self.seat = None
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            return
+        try:
+            self.writer.write(encode_frame(OP_TEXT, json.dumps(message).encode()))
+            await self.writer.drain()
+        except (ConnectionError, RuntimeError):
+            self.closed = True
+
+class Room:
+    """A three-player game with its seated clients, bots and spectators."""
+
+    def __init__(self, room_id, rules=None, bots=None):
+        self.room_id = room_id
+        self.rules = rules or GameRules()
+        self.seats = {player: None for player in self.rules.turn_order}
+        self.bots = set(bots or ())
+        self.clients = set()
+        self.bot_task = None
+        self.engines = {}
+        self.created = time.time()
+
+    def seat_names(self):
+        names = {}
+        for player in self.rules.turn_order:
+            if player in self.bots:
+                names[player.name] = "bot"
+            elif self.seats[player] is not None:
+                names[player.name] = "human"
+            else:
+                names[player.name] = None
+        return names
+
+    def summary(self):
+        winner = self.rules.winner()
+        return {
+            "room": self.room_id,
+            "ply": self.rules.ply,
+            "current_player": self.rules.current_player.name,
+            "seats": self.seat_names(),
+            "spectators": sum(1 for c in self.clients if c.seat is None),
+            "winner": winner.name if winner else None,
+            "draw": self.rules.is_draw(),
+        }
+
+    def state_message(self):
+        message = {"type": "state", "room": self.room_id, "seats": self.seat_names()}
+        message.update(self.rules.export_state())
+        winner = self.rules.winner()
+        message["winner"] = winner.name if winner else None
+        message["draw"] = self.rules.is_draw()
+        return message
+
+    def halt_engines(self, players=None):
+        """Stop the search bots of players, or of all of them, for good.
+
+        Halting waits for a search to unwind, so it runs in the default
+        executor rather than on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        for player, engine in self.engines.items():
+            if players is None or player in players:
+                loop.run_in_executor(None, engine.close)
+
+    async def broadcast(self, message):
+        if self.clients:
+            await asyncio.gather(*(client.send(message) for client in list(self.clients)))
+
+class GameServer:
+    def __init__(self, executor=None, bot_delay=0.0, store=None, bot_movetime=0.0):
+        self.rooms = {}
+        self.executor = executor
+        self.bot_delay = bot_delay
+        self.bot_movetime = bot_movetime
+        self.store = store
+        self.moves_played = 0
+
+    # Persistence
+
+    def recover(self):
+        """Reload the rooms saved in the store and restart their bots."""
+        for room_id, (rules, bots) in self.store.recover().items():
+            self.rooms[room_id] = Room(room_id, rules, bots)
+        for room in self.rooms.values():
+            self.schedule_bot(room)
+        return len(self.rooms)
+
+    def snapshot(self):
+        rooms = ((room.room_id, room.rules, room.bots) for room in self.rooms.values())
+        return self.store.snapshot(rooms)
+
+    async def snapshot_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            if self.store.pending:
+                self.snapshot()
+
+    # HTTP / WebSocket entry point
+
+    async def handle_client(self, reader, writer):
+        try:
+            request_line, headers = await read_http_head(reader)
+            method, path, _ = request_line.split(" ", 2)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            writer.close()
+            return
+
+        if headers.get("upgrade", "").lower() == "websocket" and path.startswith("/ws"):
+            await self.handle_websocket(reader, writer, headers)
+        else:
+            await self.handle_http(writer, method, path)
+
+    async def handle_http(self, writer, method, path):
+        status, body = "404 Not Found", {"error": "not found"}
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if method == "GET" and parts == ["rooms"]:
+            status, body = "200 OK", [room.summary() for room in self.rooms.values()]
+        elif method == "GET" and len(parts) == 2 and parts[0] == "rooms" and parts[1] in self.rooms:
+            status, body = "200 OK", self.rooms[parts[1]].state_message()
+
+        data = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: application/json\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode() + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            writer.close()
+            return
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        conn = Connection(writer)
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, payload[:2]))
+                    break
+                elif opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+                elif opcode == OP_TEXT:
+                    try:
+                        message = json.loads(payload)
+                    except ValueError:
+                        await conn.send({"type": "error", "message": "invalid JSON"})
+                        continue
+                    await self.handle_message(conn, message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            conn.closed = True
+            self.leave(conn)
+            writer.close()
+
+    # Messages
+
+    async def handle_message(self, conn, message):
+        if not isinstance(message, dict):
+            await conn.send({"type": "error", "message": "messages must be JSON objects"})
+            return
+        for field in ("room", "seat", "from", "to"):
+            if message.get(field) is not None and not isinstance(message[field], str):
+                await conn.send({"type": "error", "message": f"{field} must be a string"})
+                return
+        kind = message.get("type")
+        if kind == "join":
+            await self.join(conn, message.get("room"), message.get("seat"))
+        elif kind == "move":
+            await self.move(conn, message.get("from"), message.get("to"))
+        elif kind == "bot":
+            await self.add_bot(conn, message.get("room") or (conn.room and conn.room.room_id), message.get("seat"))
+        else:
+            await conn.send({"type": "error", "message": f"unknown message type {kind!r}"})
+
+    def get_room(self, room_id):
+        if room_id not in self.rooms:
+            self.rooms[room_id] = Room(room_id)
+        return self.rooms[room_id]
+
+    async def join(self, conn, room_id, seat):
+        if not room_id:
+            await conn.send({"type": "error", "message": "join needs a room"})
+            return
+        if conn.room:
+            self.leave(conn)
+        if seat is None and str(room_id) not in self.rooms:
+            await conn.send({"type": "error", "message": f"no room {room_id}"})
+            return
+        room = self.get_room(str(room_id))
+
+        player = None
+        if seat is not None:
+            player = Player.__members__.get(str(seat).upper())
+            if player is None or room.seats[player] is not None or player in room.bots:
+                await conn.send({"type": "error", "message": f"seat {seat} is not available"})
+                if not room.clients and not room.bots and room.rules.ply == 0:
+                    del self.rooms[room.room_id]
+                return
+            room.seats[player] = conn
+
+        conn.room, conn.seat = room, player
+        room.clients.add(conn)
+        await conn.send(room.state_message())
+
+    def leave(self, conn):
+        room = conn.room
+        if room is None:
+            return
+        room.clients.discard(conn)
+        seated = conn.seat is not None
+        if seated and room.seats.get(conn.seat) is conn:
+            room.seats[conn.seat] = None
+        conn.room, conn.seat = None, None
+        # Only the last seated client closes a room; spectators come and go,
+        # and recovered or bot-only rooms have no client to wait for
+        if seated and not any(client.seat is not None for client in room.clients):
+            self.close_room(room)
+
+    def close_room(self, room):
+        """Drop a room and tell its remaining spectators."""
+        if room.bot_task:
+            room.bot_task.cancel()
+        room.halt_engines()
+        self.rooms.pop(room.room_id, None)
+        if self.store:
+            self.store.log_close(room.room_id)
+        for client in list(room.clients):
+            client.room = None
+            asyncio.ensure_future(client.send({"type": "closed", "room": room.room_id}))
+        room.clients.clear()
+
+    async def add_bot(self, conn, room_id, seat):
+        room = conn.room
+        if room is None or conn.seat is None or room_id != room.room_id:
+            await conn.send({"type": "error", "message": "take a seat in the room before adding a bot"})
+            return
+        player = Player.__members__.get(seat.upper()) if seat else None
+        if player is None:
+            await conn.send({"type": "error", "message": "bot needs a seat"})
+            return
+        if room.seats[player] is not None or player in room.bots:
+            await conn.send({"type": "error", "message": f"seat {seat} is not available"})
+            return
+        room.bots.add(player)
+        if self.store:
+            self.store.log_bot(room.room_id, player)
+        await room.broadcast(room.state_message())
+        self.schedule_bot(room)
+
+    async def move(self, conn, from_node, to_node):
+        room = conn.room
+        if room is None or conn.seat is None:
+            await conn.send({"type": "error", "message": "join a seat before moving"})
+            return
+        rules = room.rules
+        if rules.winner() is not None or rules.is_draw():
+            await conn.send({"type": "error", "message": "the game is over"})
+            return
+        if conn.seat != rules.current_player:
+            await conn.send({"type": "error", "message": f"it is {rules.current_player.name}'s turn"})
+            return
+        if from_node not in rules.piece_positions or not rules.is_legal(from_node, to_node):
+            await conn.send({"type": "error", "message": f"illegal move {from_node} {to_node}"})
+            return
+        await self.apply_move(room, from_node, to_node)
+
+    async def apply_move(self, room, from_node, to_node):
+        rules = room.rules
+        player = rules.current_player
+        captured = rules.make_move(from_node, to_node)
+        self.moves_played += 1
+        if self.store:
+            self.store.log_move(room.room_id, rules.ply, from_node, to_node)
+        winner = rules.winner()
+        draw = rules.is_draw()
+        if room.engines:
+            room.halt_engines(None if winner is not None or draw else rules.eliminated)
+        await room.broadcast({
+            "type": "delta",
+            "ply": rules.ply,
+            "player": player.name,
+            "from": from_node,
+            "to": to_node,
+            "captured": [captured[0].name, captured[1].name] if captured else None,
+            "next": rules.current_player.name,
+            "eliminated": sorted(p.name for p in rules.eliminated),
+            "winner": winner.name if winner else None,
+            "draw": draw,
+        })
+        self.schedule_bot(room)
+
+    # Bots
+
+    def schedule_bot(self, room):
+        if room.rules.current_player in room.bots and (room.bot_task is None or room.bot_task.done()):
+            room.bot_task = asyncio.ensure_future(self.run_bot(room))
+
+    async def run_bot(self, room):
+        loop = asyncio.get_running_loop()
+        rules = room.rules
+        while (rules.current_player in room.bots and rules.winner() is None and not rules.is_draw()
+               and room.room_id in self.rooms):
+            ply = rules.ply
+            if self.bot_delay:
+                await asyncio.sleep(self.bot_delay)
+            if self.bot_movetime:
+                engine = room.engines.get(rules.current_player)
+                if engine is None:
+                    engine = room.engines[rules.current_player] = PonderingPlayer(
+                        Search(tt_bits=16), movetime=self.bot_movetime)
+                move = await loop.run_in_executor(None, engine.choose, rules.copy())
+            else:
+                move = await loop.run_in_executor(self.executor, choose_bot_move, rules.export_state())
+            if move is None or rules.ply != ply:
+                break
+            await self.apply_move(room, *move)
+
+async def serve(host, port, bot_workers, bot_delay, data_dir=None, snapshot_interval=30.0, bot_movetime=0.0):
+    if bot_workers > 0:
+        executor = ProcessPoolExecutor(max_workers=bot_workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=1)
+    store = RoomStore(data_dir) if data_dir else None
+    game_server = GameServer(executor, bot_delay, store, bot_movetime)
+
+    snapshot_task = None
+    if store:
+        start = time.perf_counter()
+        count = game_server.recover()
+        print(f"Recovered {count} rooms from {data_dir} in {time.perf_counter()-start:.2f}s")
+        snapshot_task = asyncio.ensure_future(game_server.snapshot_loop(snapshot_interval))
+
+    server = await asyncio.start_server(game_server.handle_client, host, port)
+    print(f"3Chess server listening on ws://{host}:{port}/ws")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if store:
+            snapshot_task.cancel()
+            game_server.snapshot()
+            store.close()
+        for room in game_server.rooms.values():
+            room.halt_engines()
+        executor.shutdown(cancel_futures=True)
+
+# ---------------------------------------------------------------------------
+# Load testing
+# ---------------------------------------------------------------------------
+
+class LoadTestClient:
+    """A seated client that mirrors the game locally and plays random moves."""
+
+    def __init__(self, room_id, seat, stats, max_plies, rng):
+        self.room_id = room_id
+        self.seat = seat
+        self.stats = stats
+        self.max_plies = max_plies
+        self.rng = rng
+        self.rules = None
+        self.ply = 0
+        self.sent_at = None
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await open_websocket(host, port)
+
+    async def send(self, message):
+        self.writer.write(encode_frame(OP_TEXT, json.dumps(message).encode(), mask=True))
+        await self.writer.drain()
+
+    async def play_if_my_turn(self):
+        rules = self.rules
+        if rules.current_player.name != self.seat or rules.winner() is not None or rules.is_draw():
+            return False
+        if self.ply >= self.max_plies:
+            return False
+        moves = rules.legal_moves()
+        if not moves:
+            return False
+        from_node, to_node = self.rng.choice(moves)
+        self.sent_at = time.perf_counter()
+        await self.send({"type": "move", "from": from_node, "to": to_node})
+        return True
+
+    async def run(self):
+        await self.send({"type": "join", "room": self.room_id, "seat": self.seat})
+        while True:
+            opcode, payload = await read_frame(self.reader)
+            if opcode != OP_TEXT:
+                continue
+            message = json.loads(payload)
+            kind = message["type"]
+            if kind == "state":
+                self.rules = GameRules.from_state(message)
+                self.ply = message["ply"]
+            elif kind == "delta":
+                if message["player"] == self.seat and self.sent_at is not None:
+                    self.stats["latencies"].append(time.perf_counter() - self.sent_at)
+                    self.sent_at = None
+                self.rules.make_move(message["from"], message["to"])
+                self.ply = message["ply"]
+                if self.rules.current_player.name != message["next"]:
+                    self.stats["desyncs"] += 1
+            elif kind == "error":
+                self.stats["errors"] += 1
+
+            if self.rules is None:
+                continue
+            if self.rules.winner() is not None or self.rules.is_draw() or self.ply >= self.max_plies:
+                break
+            if self.sent_at is None:
+                await self.play_if_my_turn()
+        self.writer.write(encode_frame(OP_CLOSE, struct.pack("!H", 1000), mask=True))
+        self.writer.close()
+
+async def loadtest(host, port, rooms, max_plies, seed):
+    stats = {"latencies": [], "errors": 0, "desyncs": 0}
+    rng = random.Random(seed)
+    clients = []
+    for r in range(rooms):
+        for player in (Player.RED, Player.WHITE, Player.BLACK):
+            client = LoadTestClient(f"load-{seed}-{r}", player.name, stats, max_plies, random.Random(rng.random()))
+            await client.connect(host, port)
+            clients.append(client)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client.run() for client in clients))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(stats["latencies"])
+    moves = len(latencies)
+    print(f"Rooms: {rooms}, clients: {len(clients)}, moves: {moves} in {elapsed:.2f}s ({moves/elapsed:.0f} moves/s)")
+    if latencies:
+        p50 = latencies[len(latencies)//2]*1000
+        p95 = latencies[int(len(latencies)*0.95)]*1000
+        print(f"Move round-trip latency: p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {latencies[-1]*1000:.2f} ms")
+    print(f"Errors: {stats['errors']}, desyncs: {stats['desyncs']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="3Chess game server")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="host games")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--bot-workers", type=int, default=2, help="bot processes (0 runs bots in a thread)")
+    p_serve.add_argument("--bot-delay", type=float, default=0.0, help="seconds a bot waits before moving")
+    p_serve.add_argument("--bot-movetime", type=float, default=0.0,
+                         help="seconds a searching, pondering bot thinks per move (0 keeps the greedy bot)")
+    p_serve.add_argument("--data-dir", default=None, help="directory for room snapshots and move logs")
+    p_serve.add_argument("--snapshot-interval", type=float, default=30.0, help="seconds between snapshots")
+
+    p_load = sub.add_parser("loadtest", help="play random games against a running server")
+    p_load.add_argument("--host", default="127.0.0.1")
+    p_load.add_argument("--port", type=int, default=8765)
+    p_load.add_argument("--rooms", type=int, default=50)
+    p_load.add_argument("--plies", type=int, default=150, help="stop each game after this many plies")
+    p_load.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.bot_workers, args.bot_delay,
+                          args.data_dir, args.snapshot_interval, args.bot_movetime))
+    else:
+        asyncio.run(loadtest(args.host, args.port, args.rooms, args.plies, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Spectator view: many running games tiled in one pygame window.
+
+Every tile shows one game, kept in its own GameRules. Tiles of one size
+share a TileSet: the empty board and the piece sprites scaled once to that
+size, and the sprite position and outline of every square. A tile only
+redraws when its game changed, and only the tiles redrawn are pushed to
+the screen, so a frame where nothing moved costs next to nothing.
+
+Games come from a feed:
+
+    --server HOST:PORT   spectate the rooms of a running `server.py serve`,
+                         joining each without a seat
+    --records FILE       replay game records, JSON lines as written by
+                         `tournament.py --out`, one after another per tile;
+                         records of other boards than 3x4 are skipped
+    (neither)            random games, to try the view out
+
+Feeds hand the view events: ("state", key, rules, title) shows a new game
+for key, ("move", key, from, to) plays a move in it and ("close", key)
+frees its tile. Records and random games advance --speed plies per second.
+
+    python spectator.py --boards 36
+    python spectator.py --records games.jsonl --speed 4
+    python spectator.py --server 127.0.0.1:8765
+    python spectator.py --bench --boards 36
+
+--bench plays random games offscreen, frames as fast as they go with the
+games advancing as if at --fps, and reports the frame times against the
+frame budget.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import profiling
+import queue
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+
+import pygame
+from render import BoardRenderer, BACKGROUND, LAST_MOVE_COLOR
+from rules import GameRules, PieceType, Player
+from server import OP_CLOSE, OP_TEXT, encode_frame, open_websocket, read_frame, read_http_head
+from unified_chess import WIDTH, sprites
+
+SPRITE_SIZE = 40  # sprites are drawn 40x40 on the WIDTH x HEIGHT board
+TITLE_COLOR = (200, 200, 200)
+FINISHED_COLOR = (255, 215, 0)
+
+class TileSet:
+    """The board, sprites and square positions scaled to one tile size."""
+
+    @profiling.timed("spectator.tileset")
+    def __init__(self, size):
+        self.size = size
+        scale = size / WIDTH
+        renderer = BoardRenderer()
+        self.board = pygame.transform.smoothscale(renderer.get_board_layer(), (size, size))
+        side = max(1, round(SPRITE_SIZE*scale))
+        self.sprites = [[pygame.transform.smoothscale(sprite, (side, side)) for sprite in row] for row in sprites]
+        if pygame.display.get_surface() is not None:
+            # In the display's pixel format blits skip a conversion every time
+            self.board = self.board.convert()
+            self.sprites = [[sprite.convert_alpha() for sprite in row] for row in self.sprites]
+        # By piece tuple, as GameRules.piece_positions holds them
+        self.piece_sprites = {(player, piece_type): self.sprites[player.value][piece_type.value]
+                              for player in Player for piece_type in PieceType}
+        self.positions = {node: (round(cell.center.x*scale - side/2), round(cell.center.y*scale - side/2))
+                          for node, cell in renderer.cells.items()}
+        self.outlines = {node: [(x*scale, y*scale) for x, y in cell.points] for node, cell in renderer.cells.items()}
+        self.font = pygame.font.SysFont("monospace", max(10, size//28), bold=True)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def for_size(cls, size):
+        """The shared TileSet of a size; build it after the display is set up."""
+        return cls(size)
+
+class Tile:
+    """One board of the view, with the game it shows, drawn on its part of window."""
+
+    def __init__(self, window, rect):
+        self.rect = pygame.Rect(rect)
+        self.tiles = TileSet.for_size(self.rect.width)
+        self.surface = window.subsurface(self.rect)
+        self.key = None
+        self.rules = None
+        self.title = None
+        self.last_move = None
+        self.dirty = True
+
+    def show(self, key, rules, title):
+        self.key, self.rules = key, rules
+        self.title = self.tiles.font.render(title, True, TITLE_COLOR) if title else None
+        self.last_move = None
+        self.dirty = True
+
+    def play(self, from_node, to_node):
+        rules = self.rules
+        if rules is None or from_node not in rules.piece_positions:
+            return
+        rules.make_move(from_node, to_node)
+        self.last_move = (from_node, to_node)
+        self.dirty = True
+
+    def clear(self):
+        self.show(None, None, "")
+
+    def draw(self):
+        """Redraw the tile if its game changed; return whether it did."""
+        if not self.dirty:
+            return False
+        tiles, surface = self.tiles, self.surface
+        surface.blit(tiles.board, (0, 0))
+        if self.rules is not None:
+            if self.last_move:
+                for node in self.last_move:
+                    pygame.draw.polygon(surface, LAST_MOVE_COLOR, tiles.outlines[node], 2)
+            positions, piece_sprites = tiles.positions, tiles.piece_sprites
+            surface.blits([(piece_sprites[piece], positions[node])
+                           for node, piece in self.rules.piece_positions.items()], False)
+            winner = self.rules.winner()
+            if winner is not None:
+                status, color = f"{winner.name} wins", FINISHED_COLOR
+            elif self.rules.is_draw():
+                status, color = "draw", FINISHED_COLOR
+            else:
+                status, color = f"ply {self.rules.ply}", TITLE_COLOR
+            if self.title:
+                surface.blit(self.title, (4, 2))
+            surface.blit(tiles.font.render(status, True, color), (4, 4 + tiles.font.get_linesize()))
+        self.dirty = False
+        return True
+
+def layout(count, width, height):
+    """Columns, rows and tile side that fit count square tiles into width x height best."""
+    best = None
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        side = min(width // columns, height // rows)
+        if best is None or side > best[2]:
+            best = (columns, rows, side)
+    return best
+
+class SpectatorView:
+    """A grid of tiles, handed out to games as a feed reports them."""
+
+    def __init__(self, count, window):
+        width, height = window.get_size()
+        columns, rows, side = layout(count, width, height)
+        left, top = (width - columns*side) // 2, (height - rows*side) // 2
+        self.tiles = [Tile(window, (left + (i % columns)*side, top + (i // columns)*side, side, side))
+                      for i in range(count)]
+        self.by_key = {}
+
+    def handle(self, event):
+        kind, key = event[0], event[1]
+        tile = self.by_key.get(key)
+        if kind == "state":
+            if tile is None:
+                tile = next((tile for tile in self.tiles if tile.key is None), None)
+                if tile is None:
+                    return
+                self.by_key[key] = tile
+            tile.show(key, event[2], event[3])
+        elif tile is None:
+            return
+        elif kind == "move":
+            tile.play(event[2], event[3])
+        elif kind == "close":
+            del self.by_key[key]
+            tile.clear()
+
+    @profiling.timed("spectator.draw")
+    def draw(self):
+        """Redraw the changed tiles; return their rectangles of the window."""
+        return [tile.rect for tile in self.tiles if tile.draw()]
+
+class RecordFeed:
+    """Replays game records on boards slots, advancing speed plies per second.
+
+    A finished game stays up for hold seconds, then the next record takes
+    its board; the records are played round and round.
+    """
+
+    def __init__(self, records, slots, speed, hold=3.0):
+        self.records = records
+        self.slots = slots
+        self.speed = speed
+        self.hold = hold
+        self.next_record = 0
+        self.playing = {}
+
+    def poll(self, now):
+        events = []
+        for slot in range(self.slots):
+            game = self.playing.get(slot)
+            if game is None:
+                events.append(self.start(slot, now + slot/(self.slots*self.speed)))
+                continue
+            while now >= game["due"]:
+                move = self.next_move(slot)
+                if move is None:
+                    if now >= game["due"] + self.hold:
+                        events.append(self.start(slot, now))
+                    break
+                events.append(("move", slot, move[0], move[1]))
+                game["due"] += 1/self.speed
+        return events
+
+    def start(self, slot, due):
+        record = self.records[self.next_record % len(self.records)]
+        self.next_record += 1
+        self.playing[slot] = {"record": record, "ply": 0, "due": due}
+        seats = " ".join(record.get("seats", {}).values())
+        return ("state", slot, GameRules(), f"#{record.get('game', self.next_record)} {seats}")
+
+    def next_move(self, slot):
+        game = self.playing[slot]
+        moves = game["record"]["moves"]
+        if game["ply"] >= len(moves):
+            return None
+        game["ply"] += 1
+        return moves[game["ply"] - 1]
+
+class RandomFeed(RecordFeed):
+    """Random games on boards slots, speed plies per second."""
+
+    def __init__(self, slots, speed, seed=0, max_plies=300, hold=1.0):
+        super().__init__([], slots, speed, hold)
+        self.rng = random.Random(seed)
+        self.max_plies = max_plies
+
+    def start(self, slot, due):
+        self.next_record += 1
+        rules = GameRules()
+        self.playing[slot] = {"rules": rules, "due": due}
+        return ("state", slot, rules.copy(), f"random #{self.next_record}")
+
+    def next_move(self, slot):
+        rules = self.playing[slot]["rules"]
+        moves = rules.legal_moves()
+        if not moves or rules.winner() is not None or rules.is_draw() or rules.ply >= self.max_plies:
+            return None
+        move = self.rng.choice(moves)
+        rules.make_move(*move)
+        return move
+
+class ServerFeed:
+    """Spectates the rooms of a running server from a background thread.
+
+    The room list is fetched every interval seconds and up to slots rooms
+    are joined without a seat; their state and delta messages become
+    events for the view. A room is let go once its game ends or it closes,
+    which frees its board for another.
+    """
+
+    def __init__(self, host, port, slots, interval=2.0):
+        self.host, self.port = host, port
+        self.slots = slots
+        self.interval = interval
+        self.events = queue.Queue()
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self.thread.start()
+
+    def poll(self, now):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    async def fetch_rooms(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(f"GET /rooms HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n\r\n".encode())
+        try:
+            _, headers = await read_http_head(reader)
+            return json.loads(await reader.readexactly(int(headers.get("content-length", 0))))
+        finally:
+            writer.close()
+
+    async def run(self):
+        watching = {}
+        while True:
+            try:
+                rooms = await self.fetch_rooms()
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                print(f"cannot list rooms: {e}", file=sys.stderr)
+                rooms = []
+            for room_id, task in list(watching.items()):
+                if task.done():
+                    del watching[room_id]
+                    self.events.put(("close", room_id))
+            for summary in rooms:
+                room_id = summary["room"]
+                if summary["winner"] or summary["draw"]:
+                    continue
+                if room_id not in watching and len(watching) < self.slots:
+                    watching[room_id] = asyncio.ensure_future(self.watch(room_id))
+            await asyncio.sleep(self.interval)
+
+    async def watch(self, room_id):
+        try:
+            reader, writer = await open_websocket(self.host, self.port)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            return
+        try:
+            writer.write(encode_frame(OP_TEXT, json.dumps({"type": "join", "room": room_id}).encode(), mask=True))
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    break
+                if opcode != OP_TEXT:
+                    continue
+                message = json.loads(payload)
+                if message["type"] == "state":
+                    self.events.put(("state", room_id, GameRules.from_state(message), room_id))
+                    if message["winner"] or message["draw"]:
+                        break
+                elif message["type"] == "delta":
+                    self.events.put(("move", room_id, message["from"], message["to"]))
+                    if message["winner"] or message["draw"]:
+                        break
+                elif message["type"] in ("closed", "error"):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+def load_records(path):
+    """Game records with moves from a JSON-lines file.
+
+    The tiles draw the standard board only, so records played on another
+    (tournament.py --board) are skipped.
+    """
+    records = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("moves") and list(record.get("board", (3, 4))) == [3, 4]:
+                    records.append(record)
+    if not records:
+        raise ValueError(f"no game records with moves on the standard board in {path}")
+    return records
+
+def run(view, feed, window, fps, frames=None):
+    """Feed the view and draw it at fps until the window closes.
+
+    With frames given, run that many frames as fast as possible instead,
+    the feed seeing time advance 1/fps per frame, and return for each
+    the seconds spent feeding and drawing, and the tiles redrawn.
+    """
+    window.fill(BACKGROUND)
+    pygame.display.flip()
+    clock = pygame.time.Clock()
+    timings = []
+    start = time.perf_counter()
+    while frames is None or len(timings) < frames:
+        frame_start = time.perf_counter()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return timings
+        now = frame_start if frames is None else start + len(timings)/fps
+        for event in feed.poll(now):
+            view.handle(event)
+        fed = time.perf_counter()
+        rects = view.draw()
+        if rects:
+            pygame.display.update(rects)
+        if frames is None:
+            clock.tick(fps)
+        else:
+            timings.append((fed - frame_start, time.perf_counter() - fed, len(rects)))
+    return timings
+
+def report(timings, fps):
+    """Print frame-time percentiles of a timed run, feeding and drawing apart."""
+    budget = 1/fps
+    totals = sorted(feed + draw for feed, draw, _ in timings)
+    draws = sorted(draw for _, draw, _ in timings)
+    redrawn = sum(count for _, _, count in timings)
+    def ms(values, q):
+        return values[min(int(len(values)*q), len(values) - 1)]*1000
+    print(f"{len(timings)} frames, {redrawn/len(timings):.1f} tiles redrawn per frame")
+    print(f"  frame  median {ms(totals, 0.5):6.2f} ms  p99 {ms(totals, 0.99):6.2f} ms  max {totals[-1]*1000:6.2f} ms")
+    print(f"  draw   median {ms(draws, 0.5):6.2f} ms  p99 {ms(draws, 0.99):6.2f} ms  max {draws[-1]*1000:6.2f} ms")
+    over = sum(1 for total in totals if total > budget)
+    print(f"  {over} frames over the {budget*1000:.1f} ms budget of {fps} fps")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show many running games tiled in one window.")
+    parser.add_argument("--boards", type=int, default=16, help="tiles in the window")
+    parser.add_argument("--size", default="1600x900", help="WIDTHxHEIGHT of the window")
+    parser.add_argument("--server", metavar="HOST:PORT", help="spectate the rooms of a running server")
+    parser.add_argument("--records", help="replay game records from this JSON-lines file")
+    parser.add_argument("--speed", type=float, default=2.0, help="plies per second of records and random games")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench", action="store_true", help="time frames of random games offscreen")
+    parser.add_argument("--frames", type=int, default=600, help="frames timed with --bench")
+    args = parser.parse_args()
+
+    width, height = (int(n) for n in args.size.lower().split("x"))
+    if args.bench:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    window = pygame.display.set_mode((width, height))
+    pygame.display.set_caption("3Chess spectator")
+
+    if args.bench:
+        start = time.perf_counter()
+        view = SpectatorView(args.boards, window)
+        print(f"{args.boards} boards of {view.tiles[0].rect.width} px, set up in "
+              f"{(time.perf_counter() - start)*1000:.0f} ms, {args.speed} plies/s each")
+        report(run(view, RandomFeed(args.boards, args.speed, args.seed), window, args.fps, args.frames), args.fps)
+        pygame.quit()
+        return
+
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        feed = ServerFeed(host or "127.0.0.1", int(port), args.boards)
+    elif args.records:
+        try:
+            feed = RecordFeed(load_records(args.records), args.boards, args.speed)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    else:
+        feed = RandomFeed(args.boards, args.speed, args.seed)
+    view = SpectatorView(args.boards, window)
+    run(view, feed, window, args.fps)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Endgame tablebases for small material sets, built by retrograde analysis.
+
+A material set lists the pieces of each living player in turn order,
+starting with the strong side, e.g. KR-K-K: the player with king and rook,
+then the two bare kings in the order they move. Only the strong side may
+have pieces besides its king, and there are no pawns, so which sector a
+player owns never matters and un-moves are just moves played backwards.
+
+Tables are solved the way search.py plays: the strong side against its
+opponents as one coalition. Every position is a win for the strong side
+(the last opponent king is captured), a loss (its own king is captured) or
+a draw, with the distance to the end in plies under best play: the winner
+hurries, the loser delays. Captures leave the table for a smaller one, so
+a build solves those first, down to K-K.
+
+The board turns onto itself one sector at a time, so a table only holds
+positions with the strong king in sector 0 and probes turn the others
+there first. A table of m living players and pieces on k squares has
+m * (squares / players) * squares**(k - 1) entries of two bytes:
+
+    board   KR-K    K-K-K   KR-K-K
+    3x2     9 k     14 k    330 k
+    3x3     105 k   157 k   8.5 M
+    3x4     590 k   885 k   85 M
+
+Pure Python solves some 35 k positions a second, so three-player sets with
+a rook are only practical on the smaller boards for now.
+
+Tables are written to .tablebase/ next to this file with a header naming
+their board, material and sources, and are read through mmap, so probing
+a table costs no load time and processes share its pages:
+
+    python tablebase.py KR-K K-K-K                # standard board
+    python tablebase.py KR-K-K --board 3x3
+    python tablebase.py KR-K --verify 2000        # check saved tables
+"""
+import argparse
+import hashlib
+import itertools
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+from rules import PieceType, rule_tables
+from topology import generate_topology, source_checksum
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tablebase")
+TABLEBASE_MAGIC = b"3CTB"
+TABLEBASE_VERSION = 1
+# magic, format version, source checksum, players, size, material, entries
+TABLEBASE_HEADER = struct.Struct("!4sH32sBB16sQ")
+ENTRY = struct.Struct("<H")
+
+# Outcomes for the strong side, in the low two bits of an entry; the
+# distance in plies is the rest
+DRAW, WIN, LOSS, INVALID = 0, 1, 2, 3
+
+PIECE_LETTERS = {"K": PieceType.KING, "Q": PieceType.QUEEN, "R": PieceType.ROOK,
+                 "B": PieceType.BISHOP, "N": PieceType.KNIGHT}
+LETTERS = {piece_type: letter for letter, piece_type in PIECE_LETTERS.items()}
+LETTER_ORDER = "KQRBN"
+
+def parse_material(text):
+    """Return the slots of a material set like "KR-K-K", each piece string ordered KQRBN."""
+    slots = tuple("".join(sorted(slot.upper(), key=LETTER_ORDER.index)) for slot in text.split("-"))
+    if len(slots) < 2 or any(not slot or slot.count("K") != 1 or slot[0] != "K" for slot in slots):
+        raise ValueError(f"{text}: every player needs exactly one king and there must be two players")
+    if any(letter not in PIECE_LETTERS for slot in slots for letter in slot):
+        raise ValueError(f"{text}: pieces must be K, Q, R, B or N")
+    if any(slot != "K" for slot in slots[1:]):
+        raise ValueError(f"{text}: only the strong side may have pieces besides its king")
+    return slots
+
+def material_name(slots):
+    return "-".join(slots)
+
+def sources_checksum():
+    """SHA-256 of the topology sources and this module, which decide every entry."""
+    digest = hashlib.sha256(source_checksum())
+    with open(os.path.abspath(__file__), "rb") as f:
+        digest.update(f.read())
+    return digest.digest()
+
+class Board:
+    """Integer move tables of a topology, shared by the tables built on it."""
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.players = topology.players
+        self.squares = len(topology.squares)
+        self.sectors = [sector for sector, _, _ in topology.coords]
+        # Squares of sector 0, where tables keep the strong king
+        self.home = [i for i in range(self.squares) if self.sectors[i] == 0]
+        self.home_index = {square: i for i, square in enumerate(self.home)}
+        # rotations[r][i]: square i turned r sectors on
+        self.rotations = [list(range(self.squares))]
+        for _ in range(self.players - 1):
+            self.rotations.append([topology.rotation[i] for i in self.rotations[-1]])
+        self.rays = {
+            "K": [[(j,) for j in neighbors] for neighbors in topology.neighbors],
+            "N": [[(j,) for j in hops] for hops in topology.knight_hops],
+            "R": topology.rook_rays,
+            "B": topology.bishop_rays,
+        }
+        self.rays["Q"] = [rook + bishop for rook, bishop in zip(topology.rook_rays, topology.bishop_rays)]
+
+    def canonical(self, squares):
+        """Turn squares so the first, the strong king, stands in sector 0."""
+        sector = self.sectors[squares[0]]
+        if sector == 0:
+            return squares
+        rotation = self.rotations[(self.players - sector) % self.players]
+        return [rotation[square] for square in squares]
+
+class Table:
+    """Outcomes of every position of one material set on one board.
+
+    Entries are indexed by the mover's slot, the strong king's square in
+    sector 0, then the squares of the other pieces in material order.
+    """
+
+    def __init__(self, board, slots, data):
+        self.board = board
+        self.slots = slots
+        self.name = material_name(slots)
+        self.letters = [letter for slot in slots for letter in slot]
+        self.owners = [owner for owner, slot in enumerate(slots) for _ in slot]
+        self.pieces_of = [[i for i, owner in enumerate(self.owners) if owner == slot] for slot in range(len(slots))]
+        self.kings = [pieces[0] for pieces in self.pieces_of]
+        n = board.squares
+        self.strides = [n**(len(self.letters) - 1 - i) for i in range(len(self.letters))]
+        self.mover_stride = len(board.home) * self.strides[0]
+        self.entries = len(slots) * self.mover_stride
+        self.data = data
+
+    def index(self, mover, squares):
+        """Entry of a position whose squares are already canonical."""
+        index = mover*self.mover_stride + self.board.home_index[squares[0]]*self.strides[0]
+        for square, stride in zip(squares[1:], self.strides[1:]):
+            index += square*stride
+        return index
+
+    def entry(self, index):
+        return ENTRY.unpack_from(self.data, 2*index)[0]
+
+    def lookup(self, mover, squares):
+        """(outcome, distance) of a position, turning it to sector 0 first."""
+        value = self.entry(self.index(mover, self.board.canonical(squares)))
+        return value & 3, value >> 2
+
+    def positions(self):
+        """Yield (index, mover, squares) for every entry in index order."""
+        n = self.board.squares
+        ranges = [range(len(self.slots)), self.board.home] + [range(n)]*(len(self.letters) - 1)
+        for index, state in enumerate(itertools.product(*ranges)):
+            yield index, state[0], state[1:]
+
+    def counts(self):
+        counts = {DRAW: 0, WIN: 0, LOSS: 0, INVALID: 0}
+        longest = {WIN: 0, LOSS: 0}
+        for index in range(self.entries):
+            value = self.entry(index)
+            counts[value & 3] += 1
+            if value & 3 in longest:
+                longest[value & 3] = max(longest[value & 3], value >> 2)
+        return counts, longest
+
+def after_capture(table, mover, victim):
+    """Return (material left, piece numbers kept, slot to move) once mover takes victim.
+
+    The material is None when the capture ends the game. Taking a king
+    eliminates its player, so the slots after it move up one.
+    """
+    slots, owner = table.slots, table.owners[victim]
+    kept = [piece for piece in range(len(table.owners)) if piece != victim]
+    following = (mover + 1) % len(slots)
+    if victim in table.kings:
+        if owner == 0 or len(slots) == 2:
+            return None, None, None
+        if following == owner:
+            following = (following + 1) % len(slots)
+        return slots[:owner] + slots[owner + 1:], kept, following - (following > owner)
+    letters = slots[owner]
+    taken = victim - table.kings[owner]
+    remaining = slots[:owner] + (letters[:taken] + letters[taken + 1:],) + slots[owner + 1:]
+    return remaining, kept, following
+
+def smaller(table):
+    """Material sets a capture can lead to from a table's."""
+    found = set()
+    for victim in range(len(table.letters)):
+        capturer = (table.owners[victim] + 1) % len(table.slots)
+        remaining, _, _ = after_capture(table, capturer, victim)
+        if remaining is not None:
+            found.add(remaining)
+    return found
+
+def solve(table, subtables):
+    """Fill table.data by retrograde analysis; subtables maps slots to solved Tables."""
+    board = table.board
+    rays = board.rays
+    letters, owners, pieces_of = table.letters, table.owners, table.pieces_of
+    living = len(table.slots)
+    values = array("H", bytes(2*table.entries))
+    counters = bytearray(table.entries)
+    # events[distance]: (position, outcome) where a successor of position
+    # has that outcome at that distance
+    events = {}
+
+    def push(distance, index, outcome):
+        if distance in events:
+            events[distance].append((index, outcome))
+        else:
+            events[distance] = [(index, outcome)]
+
+    def push_capture(index, mover, squares, piece, target, victim):
+        remaining, kept, following = after_capture(table, mover, victim)
+        if remaining is None:
+            push(0, index, LOSS if owners[victim] == 0 else WIN)
+            return
+        after = list(squares)
+        after[piece] = target
+        outcome, distance = subtables[remaining].lookup(following, [after[i] for i in kept])
+        if outcome != DRAW:
+            push(distance, index, outcome)
+
+    for index, mover, squares in table.positions():
+        if len(set(squares)) < len(squares):
+            values[index] = INVALID
+            continue
+        occupied = {square: piece for piece, square in enumerate(squares)}
+        moves = 0
+        for piece in pieces_of[mover]:
+            # A queen may reach a square along two rays near the centre;
+            # the position after is the same, so count it once
+            seen = set()
+            for ray in rays[letters[piece]][squares[piece]]:
+                for target in ray:
+                    victim = occupied.get(target)
+                    if target not in seen:
+                        seen.add(target)
+                        if victim is None:
+                            moves += 1
+                        elif owners[victim] != mover:
+                            moves += 1
+                            push_capture(index, mover, squares, piece, target, victim)
+                    if victim is not None:
+                        break
+        if moves > 255:
+            raise ValueError(f"{table.name}: more than 255 moves in one position")
+        counters[index] = moves
+
+    distance = 0
+    while events:
+        for index, outcome in events.pop(distance, ()):
+            if values[index]:
+                continue
+            mover = index // table.mover_stride
+            if outcome == (WIN if mover == 0 else LOSS):
+                counters[index] = 0
+            else:
+                counters[index] -= 1
+                if counters[index]:
+                    continue
+            values[index] = outcome | (distance + 1) << 2
+            # Un-move a piece of the player who moved into this position
+            squares = decode(table, index)
+            previous = (mover - 1) % living
+            occupied = set(squares)
+            for piece in pieces_of[previous]:
+                origins = set()
+                for ray in rays[letters[piece]][squares[piece]]:
+                    for origin in ray:
+                        if origin in occupied:
+                            break
+                        if origin in origins:
+                            continue
+                        origins.add(origin)
+                        before = list(squares)
+                        before[piece] = origin
+                        if piece == 0:
+                            before = board.canonical(before)
+                        push(distance + 1, table.index(previous, before), outcome)
+        distance += 1
+    if sys.byteorder == "big":
+        values.byteswap()
+    table.data = values.tobytes()
+
+def decode(table, index):
+    """Squares of the position at index."""
+    index %= table.mover_stride
+    home, index = divmod(index, table.strides[0])
+    squares = [table.board.home[home]]
+    for stride in table.strides[1:]:
+        square, index = divmod(index, stride)
+        squares.append(square)
+    return squares
+
+def table_path(directory, topology, slots):
+    return os.path.join(directory, f"{topology.players}x{topology.size}-{material_name(slots)}.bin")
+
+def write_table(path, table):
+    """Write a table atomically with its header."""
+    topology = table.board.topology
+    header = TABLEBASE_HEADER.pack(TABLEBASE_MAGIC, TABLEBASE_VERSION, sources_checksum(), topology.players,
+                                   topology.size, table.name.encode(), table.entries)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + f".{os.getpid()}.tmp", "wb") as f:
+        f.write(header)
+        f.write(table.data)
+    os.replace(path + f".{os.getpid()}.tmp", path)
+
+def map_table(path, board, slots):
+    """Return the table in a file through mmap, or None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    table = Table(board, slots, None)
+    if len(data) != TABLEBASE_HEADER.size + 2*table.entries:
+        return None
+    magic, version, checksum, players, size, name, entries = TABLEBASE_HEADER.unpack_from(data)
+    if (magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION or checksum != sources_checksum()
+            or (players, size) != (board.players, board.topology.size)
+            or name.rstrip(b"\0").decode() != table.name or entries != table.entries):
+        return None
+    table.data = memoryview(data)[TABLEBASE_HEADER.size:]
+    return table
+
+class Tablebase:
+    """The tables of one board, mapped from directory on first use.
+
+    probe() answers for GameRules positions; tables not on disk are built
+    by build() only, never while probing.
+    """
+
+    def __init__(self, topology=None, directory=TABLEBASE_DIR):
+        self.topology = topology or generate_topology(3, 4)
+        self.tables = rule_tables(self.topology)
+        self.board = Board(self.topology)
+        self.directory = directory
+        self.loaded = {}
+        self.probes = self.hits = 0
+
+    def table(self, slots):
+        """Return the mapped table of a material set, or None if it isn't built."""
+        if slots not in self.loaded:
+            self.loaded[slots] = map_table(table_path(self.directory, self.topology, slots), self.board, slots)
+        return self.loaded[slots]
+
+    def build(self, slots, report=None):
+        """Return the table of a material set, solving it and any it depends on first.
+
+        report, if given, is called with (table, seconds) for every table solved.
+        """
+        table = self.table(slots)
+        if table is not None:
+            return table
+        table = Table(self.board, slots, None)
+        subtables = {remaining: self.build(remaining, report) for remaining in smaller(table)}
+        start = time.perf_counter()
+        solve(table, subtables)
+        elapsed = time.perf_counter() - start
+        path = table_path(self.directory, self.topology, slots)
+        write_table(path, table)
+        self.loaded.pop(slots, None)
+        if report:
+            report(table, elapsed)
+        return self.table(slots)
+
+    def probe(self, rules):
+        """Return (strong player, outcome, distance) of a position, or None.
+
+        The strong player is the one with more than a king, or the player
+        to move when every player has a bare king. None means the material
+        has no table here, or a piece belongs to an eliminated player.
+        """
+        self.probes += 1
+        positions = rules.piece_positions
+        living = rules.living_players()
+        if len(positions) > 5 or len(living) < 2:
+            return None
+        by_player = {player: [] for player in living}
+        for node, (player, piece_type) in positions.items():
+            if player not in by_player or piece_type is PieceType.PAWN:
+                return None
+            by_player[player].append((piece_type, node))
+        strong = [player for player in living if len(by_player[player]) > 1]
+        if len(strong) > 1:
+            return None
+        strong = strong[0] if strong else rules.current_player
+        start = living.index(strong)
+        order = living[start:] + living[:start]
+        slots, squares = [], []
+        index = self.tables.square_index
+        for player in order:
+            pieces = sorted(by_player[player], key=lambda piece: LETTER_ORDER.index(LETTERS[piece[0]]))
+            slots.append("".join(LETTERS[piece_type] for piece_type, _ in pieces))
+            squares += [index[node] for _, node in pieces]
+        table = self.table(tuple(slots))
+        if table is None:
+            return None
+        outcome, distance = table.lookup(order.index(rules.current_player), squares)
+        self.hits += 1
+        return strong, outcome, distance
+
+def verify(table, subtables, samples, seed=0):
+    """Check random entries against their successors; return the number that disagree.
+
+    A win or loss must be one ply further than the best successor for the
+    mover, and a draw must have a drawn successor or no decisive one
+    reachable for the mover.
+    """
+    board = table.board
+    rng = random.Random(seed)
+    wrong = 0
+    for _ in range(samples):
+        index = rng.randrange(table.entries)
+        value = table.entry(index)
+        if value & 3 == INVALID:
+            continue
+        mover = index // table.mover_stride
+        squares = decode(table, index)
+        occupied = {square: piece for piece, square in enumerate(squares)}
+        results = []
+        for piece in table.pieces_of[mover]:
+            for ray in board.rays[table.letters[piece]][squares[piece]]:
+                for target in ray:
+                    victim = occupied.get(target)
+                    if victim is not None and table.owners[victim] == mover:
+                        break
+                    after = list(squares)
+                    after[piece] = target
+                    if victim is None:
+                        results.append(table.lookup((mover + 1) % len(table.slots), after))
+                        continue
+                    remaining, kept, following = after_capture(table, mover, victim)
+                    if remaining is None:
+                        results.append((LOSS if table.owners[victim] == 0 else WIN, 0))
+                    else:
+                        results.append(subtables[remaining].lookup(following, [after[i] for i in kept]))
+                    break
+        good, bad = (WIN, LOSS) if mover == 0 else (LOSS, WIN)
+        if any(outcome == good for outcome, _ in results):
+            expected = (good, 1 + min(distance for outcome, distance in results if outcome == good))
+        elif results and all(outcome == bad for outcome, _ in results):
+            expected = (bad, 1 + max(distance for _, distance in results))
+        else:
+            expected = (DRAW, 0)
+        if (value & 3, value >> 2) != expected:
+            wrong += 1
+    return wrong
+
+def main():
+    parser = argparse.ArgumentParser(description="Build endgame tablebases by retrograde analysis.")
+    parser.add_argument("materials", nargs="+", help="material sets such as KR-K or KR-K-K")
+    parser.add_argument("--board", default="3x4", help="PLAYERSxSIZE of the board (default 3x4, the standard board)")
+    parser.add_argument("--dir", default=TABLEBASE_DIR, help="tablebase directory")
+    parser.add_argument("--verify", type=int, default=0, metavar="SAMPLES",
+                        help="check this many random entries of each table against its successors")
+    args = parser.parse_args()
+
+    players, size = (int(n) for n in args.board.lower().split("x"))
+    tablebase = Tablebase(generate_topology(players, size), args.dir)
+
+    def report(table, elapsed):
+        counts, longest = table.counts()
+        positions = table.entries - counts[INVALID]
+        print(f"{table.name}: {positions} positions in {elapsed:.1f} s, {counts[WIN]} wins (longest {longest[WIN]} "
+              f"plies), {counts[LOSS]} losses (longest {longest[LOSS]}), {counts[DRAW]} draws")
+
+    for text in args.materials:
+        slots = parse_material(text)
+        if len(slots) > players:
+            parser.error(f"{text}: more players than the {players} of the board")
+        table = tablebase.build(slots, report)
+        if args.verify:
+            subtables = {remaining: tablebase.table(remaining) for remaining in smaller(table)}
+            wrong = verify(table, subtables, args.verify)
+            print(f"{table.name}: {wrong} of {args.verify} sampled entries disagree with their successors")
+            if wrong:
+                raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Integer-indexed board topology derived from the board graph.
+
+A Topology numbers the squares of a board graph and keeps, per square index:
+
+    rank_neighbors, file_neighbors, diag_neighbors   typed adjacency
+    rook_rays, bishop_rays                           rays as tuples of indices
+    knight_hops                                      knight destinations, sorted
+    colors                                           square color, DARK or LIGHT
+
+Rook rays follow rank and file edges straight on. Bishop rays are derived from
+the faces of the rank/file graph: a diagonal step crosses a corner of a square
+face to its opposite corner, and a ray continues through the corner on the far
+side of the square it arrived at. The only face that is not a square is the
+hexagon at the centre of the board; a ray entering it can leave through
+either of the two squares two steps around the hexagon, so it forks
+(D4 -> E9 -> F10... and D4 -> I5 -> J6...).
+
+build_graph() generates the board for any number of players and sector size
+(each sector is size ranks of 2*size files, and the centre is a polygon with
+a corner per half-sector). The standard board is build_graph(3, 4), named and
+connected exactly as create_3chess_graph().
+
+Deriving the tables needs networkx and the board code in me.py, which pull in
+matplotlib and take a good part of a second to import, so every derived
+topology is also stored as an artifact in .topology/: the tables as marshalled
+tuples behind a header with a format version, a checksum of the sources they
+were derived from and a checksum of the payload. load_topology() and
+generate_topology() read the artifact when it is current and rebuild and
+rewrite it when it is missing, stale or damaged, so a worker process only
+imports the graph code when the board code has changed.
+
+    python topology.py                   # compare with me.py
+    python topology.py --build 4x4 4x6   # write artifacts ahead of time
+    python topology.py --bench           # time each stage of a build
+
+The comparison checks the generated standard board and derived bishop rays
+against me.create_3chess_graph() and the hand-written table in
+me.bishop_rays().
+"""
+import argparse
+import hashlib
+import marshal
+import math
+import os
+import struct
+import time
+import zlib
+from collections import deque
+
+FILE_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Square colors; A1, the left corner of the first sector's back rank, is dark
+DARK = 0
+LIGHT = 1
+
+# Generated boards
+
+def file_letter(players, size, sector, index):
+    """Letter of the file through square index of sector on a generated board.
+
+    Each file runs through two neighbouring sectors, so the letters are
+    grouped by the boundary they cross. The groups and their direction
+    reproduce the standard board: A-D between Red and White, E-H between
+    Black and Red and I-L between White and Black.
+    """
+    if index >= size:
+        # The same file as the matching square of the previous sector
+        return file_letter(players, size, (sector - 1) % players, 2*size - 1 - index)
+    if sector == 0:
+        group, offset = 0, index
+    else:
+        group = 1 if sector == players - 1 else sector + 1
+        offset = size - 1 - index
+    return FILE_LETTERS[group*size + offset]
+
+def square_name(players, size, sector, depth, index):
+    rank = size - depth if sector == 0 else sector*size + 1 + depth
+    return f"{file_letter(players, size, sector, index)}{rank}"
+
+def kite_point(corners, size, lane, row):
+    """Bilinear point of a kite (vertex, own-side midpoint, other midpoint, centre)."""
+    vertex, own_mid, other_mid, centre = corners
+    s, t = lane/size, row/size
+    return tuple((1-s)*(1-t)*v + s*(1-t)*a + (1-s)*t*b + s*t*c
+                 for v, a, b, c in zip(vertex, own_mid, other_mid, centre))
+
+def square_polygon(players, size, sector, depth, index):
+    """Corners of a square on a regular 2k-gon board of radius 1, y up.
+
+    Sector p owns side 2p of the polygon as its back rank. Each half of the
+    sector is a kite spanning a polygon vertex, the midpoints of the two
+    sides meeting there and the centre.
+    """
+    step = 2*math.pi / (2*players)
+    def vertex(j):
+        angle = -math.pi/2 + step/2 - j*step
+        return (math.cos(angle), math.sin(angle))
+    def midpoint(j):
+        a, b = vertex(j), vertex(j + 1)
+        return ((a[0] + b[0])/2, (a[1] + b[1])/2)
+
+    if index < size:
+        corners = (vertex(2*sector + 1), midpoint(2*sector), midpoint(2*sector + 1), (0.0, 0.0))
+        lane = index
+    else:
+        corners = (vertex(2*sector), midpoint(2*sector), midpoint(2*sector - 1), (0.0, 0.0))
+        lane = 2*size - 1 - index
+    row = size - 1 - depth
+    return tuple(kite_point(corners, size, u, w) for u, w in
+                 ((lane, row), (lane + 1, row), (lane + 1, row + 1), (lane, row + 1)))
+
+def build_graph(players=3, size=4, order=None):
+    """Board graph for players sectors of size x 2*size squares.
+
+    Squares carry their (sector, depth, index) coordinates and display
+    polygon as node attributes; depth 0 touches the centre and index runs
+    along the rank. order optionally fixes the node order by square name.
+    """
+    import networkx as nx
+    from me import create_diagonal_edges, EdgeType
+
+    if players < 2 or size < 2:
+        raise ValueError("a board needs at least 2 players and sectors of size 2")
+    if players*size > len(FILE_LETTERS):
+        raise ValueError(f"{players} players with sectors of size {size} need more than {len(FILE_LETTERS)} files")
+
+    names = {}
+    for sector in range(players):
+        for depth in range(size):
+            for index in range(2*size):
+                names[(sector, depth, index)] = square_name(players, size, sector, depth, index)
+    coords = {name: key for key, name in names.items()}
+    if order is not None:
+        order = list(order)
+        if set(order) != set(coords):
+            raise ValueError("order does not name the squares of the board")
+    else:
+        order = list(names.values())
+
+    G = nx.Graph(players=players, size=size)
+    for name in order:
+        G.add_node(name, coords=coords[name], polygon=square_polygon(players, size, *coords[name]))
+
+    for (sector, depth, index), name in names.items():
+        if index + 1 < 2*size:
+            G.add_edge(name, names[(sector, depth, index + 1)], edge_type=EdgeType.RANK.value)
+        if depth + 1 < size:
+            G.add_edge(name, names[(sector, depth + 1, index)], edge_type=EdgeType.FILE.value)
+        if depth == 0 and index < size:
+            # Across the centre into the next sector
+            G.add_edge(name, names[((sector + 1) % players, 0, 2*size - 1 - index)], edge_type=EdgeType.FILE.value)
+    create_diagonal_edges(G)
+    return G
+
+def derive_knight_hops(rank_neighbors, file_neighbors):
+    """Knight destinations per square from rank and file adjacency tables.
+
+    A knight goes two steps along one line type and one along the other, in
+    either order: one step then straight on then a turn, or one step then a
+    turn then straight on. Returns sorted tuples of square indices.
+    """
+    hops = []
+    for square in range(len(rank_neighbors)):
+        targets = set()
+        for lines, other in ((rank_neighbors, file_neighbors), (file_neighbors, rank_neighbors)):
+            for first in lines[square]:
+                for second in lines[first]:
+                    if second != square:
+                        targets.update(n for n in other[second] if n != first)
+                for second in other[first]:
+                    if second != square:
+                        targets.update(n for n in other[second] if n != first)
+        hops.append(tuple(sorted(targets)))
+    return tuple(hops)
+
+def derive_square_colors(rank_neighbors, file_neighbors, anchor=0):
+    """Color per square: DARK for anchor and every square an even number of
+    rank and file steps away, LIGHT for the rest.
+
+    Neighbours along a rank or file always differ in color, and a diagonal
+    step (two such steps) keeps it, so a bishop never changes color.
+    """
+    colors = [None] * len(rank_neighbors)
+    colors[anchor] = DARK
+    queue = deque([anchor])
+    while queue:
+        square = queue.popleft()
+        for neighbor in rank_neighbors[square] + file_neighbors[square]:
+            if colors[neighbor] is None:
+                colors[neighbor] = 1 - colors[square]
+                queue.append(neighbor)
+    return tuple(colors)
+
+class Topology:
+    """Squares, adjacency and move tables of a board graph, indexed by integers."""
+
+    # Attributes stored in an artifact; the rest are derived from them on load
+    FIELDS = ("squares", "players", "size", "coords", "layout", "rotation",
+              "rank_neighbors", "file_neighbors", "diag_neighbors",
+              "rook_rays", "bishop_rays", "knight_hops", "colors")
+
+    def __init__(self, graph):
+        from me import EdgeType
+
+        self.squares = tuple(graph.nodes())
+        self.index = {name: i for i, name in enumerate(self.squares)}
+        self.players = graph.graph.get('players')
+        self.size = graph.graph.get('size')
+        # (sector, depth, index) and display polygon per square, on generated boards
+        self.coords = tuple(graph.nodes[name].get('coords') for name in self.squares)
+        self.layout = tuple(graph.nodes[name].get('polygon') for name in self.squares)
+        self.rotation = None
+        if self.players:
+            at = {coords: i for i, coords in enumerate(self.coords)}
+            # Square index after turning the board one sector
+            self.rotation = tuple(at[((sector + 1) % self.players, depth, index)]
+                                  for sector, depth, index in self.coords)
+
+        by_type = {edge_type.value: [[] for _ in self.squares] for edge_type in EdgeType}
+        for name in self.squares:
+            i = self.index[name]
+            for neighbor, data in graph[name].items():
+                by_type[data['edge_type']][i].append(self.index[neighbor])
+        self.rank_neighbors = tuple(tuple(sorted(n)) for n in by_type[EdgeType.RANK.value])
+        self.file_neighbors = tuple(tuple(sorted(n)) for n in by_type[EdgeType.FILE.value])
+        self.diag_neighbors = tuple(tuple(sorted(n)) for n in by_type[EdgeType.DIAG.value])
+        self.derive_neighbors()
+
+        self.rook_rays = tuple(self.derive_rook_rays(i) for i in range(len(self.squares)))
+        self.bishop_rays = tuple(self.derive_bishop_rays(i) for i in range(len(self.squares)))
+        self.knight_hops = derive_knight_hops(self.rank_neighbors, self.file_neighbors)
+        anchor = self.coords.index((0, self.size - 1, 0)) if self.players else 0
+        self.colors = derive_square_colors(self.rank_neighbors, self.file_neighbors, anchor)
+
+    def derive_neighbors(self):
+        self.neighbors = tuple(tuple(sorted(r + f + d)) for r, f, d in
+                               zip(self.rank_neighbors, self.file_neighbors, self.diag_neighbors))
+
+    @classmethod
+    def from_tables(cls, tables):
+        """Rebuild a topology from the tuple of FIELDS values in an artifact."""
+        topology = cls.__new__(cls)
+        for field, value in zip(cls.FIELDS, tables):
+            setattr(topology, field, value)
+        topology.index = {name: i for i, name in enumerate(topology.squares)}
+        topology.derive_neighbors()
+        return topology
+
+    def tables(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    # Rays
+
+    def derive_rook_rays(self, square):
+        rays = []
+        for lines in (self.rank_neighbors, self.file_neighbors):
+            for first in lines[square]:
+                ray = [first]
+                previous, current = square, first
+                while True:
+                    ahead = [n for n in lines[current] if n != previous]
+                    if not ahead or ahead[0] in ray or ahead[0] == square:
+                        break
+                    previous, current = current, ahead[0]
+                    ray.append(current)
+                rays.append(tuple(ray))
+        return tuple(rays)
+
+    def square_face(self, square, rank_neighbor, file_neighbor):
+        """Return the corner opposite square in the square face on these two edges.
+
+        Returns None when the two edges bound the central hexagon instead.
+        """
+        for corner in self.file_neighbors[rank_neighbor]:
+            if corner != square and corner in self.rank_neighbors[file_neighbor]:
+                return corner
+        return None
+
+    def diagonal_steps(self, square, rank_neighbor, file_neighbor):
+        """Squares reached diagonally through one corner of square.
+
+        Yields (landing square, rank edge, file edge) where the two edges are
+        the neighbours of the landing square on the face just crossed.
+        """
+        corner = self.square_face(square, rank_neighbor, file_neighbor)
+        if corner is not None:
+            yield corner, file_neighbor, rank_neighbor
+            return
+        # Two steps around the hexagon in either direction
+        for landing in self.file_neighbors[rank_neighbor]:
+            if self.square_face(rank_neighbor, square, landing) is None:
+                for rank_edge in self.rank_neighbors[landing]:
+                    if self.square_face(landing, rank_edge, rank_neighbor) is None:
+                        yield landing, rank_edge, rank_neighbor
+        for landing in self.rank_neighbors[file_neighbor]:
+            if self.square_face(file_neighbor, landing, square) is None:
+                for file_edge in self.file_neighbors[landing]:
+                    if self.square_face(landing, file_neighbor, file_edge) is None:
+                        yield landing, file_neighbor, file_edge
+
+    def follow_diagonal(self, ray, square, rank_edge, file_edge, rays):
+        """Extend ray from square, which was entered across rank_edge and file_edge."""
+        ahead_rank = [n for n in self.rank_neighbors[square] if n != rank_edge]
+        ahead_file = [n for n in self.file_neighbors[square] if n != file_edge]
+        if not ahead_rank or not ahead_file:
+            rays.append(tuple(ray))
+            return
+        for landing, next_rank, next_file in self.diagonal_steps(square, ahead_rank[0], ahead_file[0]):
+            if landing in ray:
+                rays.append(tuple(ray))
+            else:
+                self.follow_diagonal(ray + [landing], landing, next_rank, next_file, rays)
+
+    def derive_bishop_rays(self, square):
+        rays = []
+        for rank_neighbor in self.rank_neighbors[square]:
+            for file_neighbor in self.file_neighbors[square]:
+                for landing, rank_edge, file_edge in self.diagonal_steps(square, rank_neighbor, file_neighbor):
+                    self.follow_diagonal([landing], landing, rank_edge, file_edge, rays)
+        return tuple(rays)
+
+    # Name-keyed views for code that works with square names
+
+    def named_rays(self, rays):
+        return {self.squares[i]: [[self.squares[j] for j in ray] for ray in square_rays]
+                for i, square_rays in enumerate(rays)}
+
+    def named_hops(self):
+        return {self.squares[i]: [self.squares[j] for j in hops] for i, hops in enumerate(self.knight_hops)}
+
+# Artifacts
+
+ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".topology")
+ARTIFACT_MAGIC = b"3CTP"
+ARTIFACT_VERSION = 1
+# magic, format version, source checksum, payload length, payload CRC-32
+ARTIFACT_HEADER = struct.Struct("!4sH32sII")
+# Modules whose code decides what a topology contains
+ARTIFACT_SOURCES = ("topology.py", "me.py")
+
+_source_checksum = None
+_topologies = {}
+
+def source_checksum():
+    """SHA-256 of the sources the topology tables are derived from."""
+    global _source_checksum
+    if _source_checksum is None:
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in ARTIFACT_SOURCES:
+            with open(os.path.join(here, name), "rb") as f:
+                digest.update(f.read())
+        _source_checksum = digest.digest()
+    return _source_checksum
+
+def artifact_path(players, size):
+    return os.path.join(ARTIFACT_DIR, f"topology-{players}x{size}.bin")
+
+def encode_topology(topology):
+    payload = marshal.dumps(topology.tables())
+    header = ARTIFACT_HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, source_checksum(),
+                                  len(payload), zlib.crc32(payload))
+    return header + payload
+
+def decode_topology(data):
+    """Return the topology in an artifact, or None if it is stale or damaged."""
+    if len(data) < ARTIFACT_HEADER.size:
+        return None
+    magic, version, checksum, length, crc = ARTIFACT_HEADER.unpack_from(data)
+    payload = data[ARTIFACT_HEADER.size:]
+    if (magic != ARTIFACT_MAGIC or version != ARTIFACT_VERSION or checksum != source_checksum()
+            or length != len(payload) or zlib.crc32(payload) != crc):
+        return None
+    try:
+        tables = marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(tables, tuple) or len(tables) != len(Topology.FIELDS):
+        return None
+    return Topology.from_tables(tables)
+
+def read_artifact(players, size):
+    try:
+        with open(artifact_path(players, size), "rb") as f:
+            return decode_topology(f.read())
+    except OSError:
+        return None
+
+def write_artifact(players, size, topology):
+    """Write an artifact atomically; return False if the directory isn't writable."""
+    path = artifact_path(players, size)
+    try:
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        with open(path + f".{os.getpid()}.tmp", "wb") as f:
+            f.write(encode_topology(topology))
+        os.replace(path + f".{os.getpid()}.tmp", path)
+    except OSError:
+        return False
+    return True
+
+def build_topology(players, size):
+    """Derive a topology from its board graph, ignoring any artifact."""
+    if (players, size) == (3, 4):
+        from me import create_nodes
+        # Squares numbered in create_nodes() order, which the binary
+        # position encoding relies on
+        return Topology(build_graph(3, 4, order=create_nodes().nodes()))
+    return Topology(build_graph(players, size))
+
+def generate_topology(players, size):
+    """Return the topology of a board, from its artifact when that is current."""
+    key = (players, size)
+    if key not in _topologies:
+        topology = read_artifact(players, size)
+        if topology is None:
+            topology = build_topology(players, size)
+            write_artifact(players, size, topology)
+        _topologies[key] = topology
+    return _topologies[key]
+
+def load_topology():
+    """Return the topology of the standard board."""
+    return generate_topology(3, 4)
+
+def same_edges(a, b):
+    """Whether two board graphs have the same typed edges."""
+    def typed(G):
+        return {(frozenset((u, v)), data['edge_type']) for u, v, data in G.edges(data=True)}
+    return set(a.nodes()) == set(b.nodes()) and typed(a) == typed(b)
+
+def compare_bishop_table(topology):
+    """Return {square: (table only, derived only)} where the two disagree."""
+    from me import bishop_rays
+    table = bishop_rays()
+    derived = topology.named_rays(topology.bishop_rays)
+    differences = {}
+    for name in topology.squares:
+        table_rays = {tuple(ray) for ray in table[name]}
+        derived_rays = {tuple(ray) for ray in derived[name]}
+        if table_rays != derived_rays:
+            differences[name] = (sorted(table_rays - derived_rays), sorted(derived_rays - table_rays))
+    return differences
+
+def build(boards):
+    """Write the artifacts of boards, timing a build and a load of each."""
+    for players, size in boards:
+        start = time.perf_counter()
+        topology = build_topology(players, size)
+        built = time.perf_counter() - start
+        if not write_artifact(players, size, topology):
+            print(f"Could not write {artifact_path(players, size)}")
+            continue
+        start = time.perf_counter()
+        loaded = read_artifact(players, size)
+        elapsed = time.perf_counter() - start
+        assert loaded is not None and loaded.tables() == topology.tables()
+        print(f"{players}x{size}: {len(topology.squares)} squares, built in {built*1000:.1f} ms, "
+              f"loaded in {elapsed*1000:.2f} ms, {os.path.getsize(artifact_path(players, size))} bytes")
+
+def bench(boards, repeat=5):
+    """Time each stage of deriving a topology, best of repeat runs."""
+    print(f"{'board':>6} {'squares':>8} {'graph':>9} {'topology':>9} {'knights':>9} {'load':>9}   (ms)")
+    for players, size in boards:
+        times = {"graph": [], "topology": [], "knights": [], "load": []}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            graph = build_graph(players, size)
+            times["graph"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            topology = Topology(graph)
+            times["topology"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            derive_knight_hops(topology.rank_neighbors, topology.file_neighbors)
+            times["knights"].append(time.perf_counter() - start)
+            data = encode_topology(topology)
+            start = time.perf_counter()
+            decode_topology(data)
+            times["load"].append(time.perf_counter() - start)
+        print(f"{players}x{size:<4} {len(topology.squares):>8} "
+              + " ".join(f"{min(times[stage])*1000:>9.2f}" for stage in times))
+
+def compare():
+    from me import create_3chess_graph
+
+    topology = load_topology()
+    if not same_edges(build_graph(3, 4), create_3chess_graph()):
+        print("Generated 3-player board differs from create_3chess_graph()")
+    differences = compare_bishop_table(topology)
+    for name, (table_only, derived_only) in differences.items():
+        print(f"{name}:")
+        for ray in table_only:
+            print(f"  table only   {' '.join(ray)}")
+        for ray in derived_only:
+            print(f"  derived only {' '.join(ray)}")
+    rays = sum(len(r) for r in topology.bishop_rays)
+    print(f"{rays} derived bishop rays on {len(topology.squares)} squares, "
+          f"{len(differences)} squares differ from the table")
+
+def parse_board(value):
+    players, size = value.lower().split("x")
+    return int(players), int(size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the standard board or build topology artifacts.")
+    parser.add_argument("--build", type=parse_board, nargs="*", metavar="PLAYERSxSIZE",
+                        help="write artifacts for these boards (the standard board always included)")
+    parser.add_argument("--bench", type=parse_board, nargs="*", metavar="PLAYERSxSIZE",
+                        help="time deriving the topology of these boards (default 3x4 4x4 3x6 4x6 6x4)")
+    args = parser.parse_args()
+
+    if args.bench is not None:
+        bench(args.bench or [(3, 4), (4, 4), (3, 6), (4, 6), (6, 4)])
+    elif args.build is not None:
+        build([(3, 4)] + [board for board in args.build if board != (3, 4)])
+    else:
+        compare()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Engine-vs-engine tournaments of three-player games, run in parallel.
+
+Every engine is given as NAME:KIND[:KEY=VALUE,...]:
+
+    d2:search:depth=2                   Search in process, 2 plies a move
+    fast:search:movetime=50,quiescence=0
+    tb:search:depth=2,tablebase=1
+    greedy:greedy                       choose_bot_move
+    rand:random
+    ext:process:cmd=python engine.py,depth=2
+                                        engine.py or any engine speaking its
+                                        protocol, one subprocess per seat;
+                                        depth 2 without depth, nodes or
+                                        movetime
+
+Each lineup of engines plays in every seating, both directions round the
+board in every rotation, so no engine profits from its place in the turn
+order; with two engines one of them takes two seats. --rounds repeats the
+schedule from different random openings. Games run in a process pool,
+--concurrency at a time.
+
+A game ends when one player is left or the player to move is stuck, or at
+--max-plies, when the material leader wins if it leads by at least
+--margin centipawns. The winner scores 1; otherwise the players still in
+the game share the point. The results table lists points and the CPU time
+each engine spent per move, for telling whether a faster engine is also a
+stronger one per CPU second. For process engines that is wall time.
+--out writes one JSON record per game: seats, opening, moves, result and
+times, with keyframes every 16 plies for seeking in the game (replay.py).
+
+    python tournament.py --engine d1:search:depth=1 --engine d2:search:depth=2 \\
+        --engine greedy:greedy --concurrency 4
+"""
+import argparse
+import itertools
+import json
+import random
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from replay import build_keyframes
+from rules import GameRules, PIECE_MATERIAL, REPETITIONS, choose_bot_move
+from search import Search, MAX_DEPTH
+from tablebase import Tablebase
+from topology import generate_topology
+
+DEFAULT_ENGINES = ["d1:search:depth=1", "d2:search:depth=2", "greedy:greedy"]
+
+def parse_engine(text):
+    """Return (name, kind, options) of an engine given as NAME:KIND[:KEY=VALUE,...]."""
+    fields = text.split(":", 2)
+    if len(fields) < 2 or fields[1] not in ENGINE_KINDS:
+        raise ValueError(f"{text}: expected NAME:KIND[:KEY=VALUE,...] with KIND one of {', '.join(ENGINE_KINDS)}")
+    options = {}
+    if len(fields) == 3 and fields[2]:
+        for option in fields[2].split(","):
+            key, _, value = option.partition("=")
+            options[key.strip()] = value.strip()
+    return fields[0], fields[1], options
+
+class SearchEngine:
+    """Search in this process, a fresh one for every game."""
+
+    def __init__(self, options, topology, seed):
+        # Two plies unless the search is limited some other way
+        self.depth = int(options.get("depth", MAX_DEPTH if "nodes" in options or "movetime" in options else 2))
+        self.nodes = int(options["nodes"]) if "nodes" in options else None
+        self.movetime = int(options["movetime"])/1000 if "movetime" in options else None
+        flags = {key: options.get(key, "1") != "0" for key in ("quiescence", "delta_pruning", "see_pruning")}
+        tablebase = Tablebase(topology) if options.get("tablebase", "0") != "0" else None
+        self.search = Search(tt_bits=int(options.get("tt_bits", 18)), tablebase=tablebase, **flags)
+
+    def choose(self, rules):
+        move, _ = self.search.search(rules, self.depth, self.nodes, self.movetime)
+        return move
+
+    def close(self):
+        pass
+
+class GreedyEngine:
+    """choose_bot_move: the most valuable capture, else a random move."""
+
+    def __init__(self, options, topology, seed):
+        self.topology = topology
+        self.rng = random.Random(seed)
+
+    def choose(self, rules):
+        return choose_bot_move(rules.export_state(), self.rng, self.topology)
+
+    def close(self):
+        pass
+
+class RandomEngine:
+    def __init__(self, options, topology, seed):
+        self.rng = random.Random(seed)
+
+    def choose(self, rules):
+        moves = rules.legal_moves()
+        return self.rng.choice(moves) if moves else None
+
+    def close(self):
+        pass
+
+class ProcessEngine:
+    """An engine speaking the engine.py protocol in a subprocess."""
+
+    def __init__(self, options, topology, seed):
+        if "cmd" not in options:
+            raise ValueError("process engines need cmd=...")
+        # Two plies unless the search is limited some other way, as for SearchEngine;
+        # a bare go would search until stop
+        limits = {key: options[key] for key in ("depth", "nodes", "movetime") if key in options} or {"depth": 2}
+        self.go = "go " + " ".join(f"{key} {value}" for key, value in limits.items())
+        self.process = subprocess.Popen(options["cmd"].split(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self.send("uci")
+        self.read_until("uciok")
+        if (topology.players, topology.size) != (3, 4):
+            self.send(f"setoption name Board value {topology.players}x{topology.size}")
+        self.send("ucinewgame")
+        self.send("isready")
+        self.read_until("readyok")
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def read_until(self, prefix):
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("engine process exited")
+            if line.startswith(prefix):
+                return line.split()
+
+    def choose(self, rules):
+        # Start from the last capture or pawn move, so the engine sees repetitions
+        start = rules.copy()
+        since = []
+        for _ in range(min(rules.halfmove_clock, len(rules.history))):
+            since.append(start.history[-1][:2])
+            start.unmake_move()
+        moves = "".join(f" {a} {b}" for a, b in reversed(since))
+        self.send(f"position notation {start.to_notation()}" + (f" moves{moves}" if moves else ""))
+        self.send(self.go)
+        words = self.read_until("bestmove")
+        return tuple(words[1:3]) if len(words) >= 3 else None
+
+    def close(self):
+        try:
+            self.send("quit")
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+ENGINE_KINDS = {
+    "search": SearchEngine,
+    "greedy": GreedyEngine,
+    "random": RandomEngine,
+    "process": ProcessEngine,
+}
+
+def schedule(names, rounds, seed):
+    """Return the games to play as (game number, seat names in turn order, opening seed)."""
+    if len(names) >= 3:
+        lineups = list(itertools.combinations(names, 3))
+    else:
+        lineups = [(names[0], names[0], names[1]), (names[0], names[1], names[1])]
+    seatings = []
+    for lineup in lineups:
+        seatings += sorted(set(itertools.permutations(lineup)))
+    rng = random.Random(seed)
+    games = []
+    for _ in range(rounds):
+        opening = rng.getrandbits(32)
+        for seats in seatings:
+            games.append((len(games), seats, opening))
+    return games
+
+def material(rules):
+    """Centipawn material of every player by player value."""
+    totals = [0]*len(rules.tables.players)
+    for player, piece_type in rules.piece_positions.values():
+        totals[player.value] += PIECE_MATERIAL[piece_type]
+    return totals
+
+def adjudicate(rules, margin):
+    """Return the player whose material leads the rest by margin, or None."""
+    totals = material(rules)
+    living = sorted(rules.living_players(), key=lambda player: totals[player.value], reverse=True)
+    if len(living) > 1 and totals[living[0].value] - totals[living[1].value] >= margin:
+        return living[0]
+    return None
+
+def play_game(game, engines, board, opening_plies, max_plies, margin):
+    """Play one game and return its record; runs in a worker process."""
+    number, seats, opening = game
+    topology = generate_topology(*board)
+    rules = GameRules(topology=topology)
+    players = rules.turn_order
+    seat_of = dict(zip(players, seats))
+
+    # A few random moves so repeated seatings don't replay the same game
+    rng = random.Random(opening)
+    moves = []
+    for _ in range(opening_plies):
+        legal = rules.legal_moves()
+        if not legal or rules.winner() is not None:
+            break
+        move = rng.choice(legal)
+        rules.make_move(*move)
+        moves.append(list(move))
+    opening_moves = len(moves)
+
+    instances = {}
+    times = {name: 0.0 for name in set(seats)}
+    counts = {name: 0 for name in set(seats)}
+    result = {"winner": None, "reason": None}
+    forfeit = None
+    try:
+        for player in players:
+            name = seat_of[player]
+            _, kind, options = engines[name]
+            instances[player] = ENGINE_KINDS[kind](options, topology, opening + players.index(player))
+        while result["reason"] is None:
+            if rules.winner() is not None:
+                result = {"winner": rules.winner(), "reason": "last player standing"}
+            elif rules.is_fifty_move_draw():
+                result = {"winner": None, "reason": "fifty-move rule"}
+            elif rules.repetitions() >= REPETITIONS:
+                result = {"winner": None, "reason": "repetition"}
+            elif not rules.legal_moves():
+                result = {"winner": adjudicate(rules, margin), "reason": f"{rules.current_player.name} has no moves"}
+            elif rules.ply >= max_plies:
+                result = {"winner": adjudicate(rules, margin), "reason": "move limit"}
+            else:
+                player = rules.current_player
+                name = seat_of[player]
+                clock = time.perf_counter if isinstance(instances[player], ProcessEngine) else time.process_time
+                start = clock()
+                move = instances[player].choose(rules)
+                times[name] += clock() - start
+                counts[name] += 1
+                if move is None or not rules.is_legal(*move):
+                    forfeit = player
+                    result = {"winner": None, "reason": f"illegal move {move} by {player.name}"}
+                else:
+                    rules.make_move(*move)
+                    moves.append(list(move))
+    finally:
+        for instance in instances.values():
+            instance.close()
+
+    winner = result["winner"]
+    living = [player for player in rules.living_players() if player != forfeit]
+    points = {player.name: 0.0 for player in players}
+    if winner is not None:
+        points[winner.name] = 1.0
+    else:
+        for player in living:
+            points[player.name] = 1.0/len(living)
+    return {
+        "game": number,
+        "board": list(board),
+        "seats": {player.name: seat_of[player] for player in players},
+        "opening_seed": opening,
+        "opening_plies": opening_moves,
+        "moves": moves,
+        "plies": rules.ply,
+        "winner": winner.name if winner else None,
+        "reason": result["reason"],
+        "eliminated": sorted(player.name for player in rules.eliminated),
+        "material": {player.name: material(rules)[player.value] for player in players},
+        "points": points,
+        "engine_seconds": times,
+        "engine_moves": counts,
+        "keyframes": build_keyframes(moves, topology=topology),
+    }
+
+def results_table(records, names):
+    """Per-engine totals over the game records, best first."""
+    rows = {name: {"games": 0, "wins": 0, "points": 0.0, "moves": 0, "seconds": 0.0} for name in names}
+    for record in records:
+        for player, name in record["seats"].items():
+            row = rows[name]
+            row["games"] += 1
+            row["points"] += record["points"][player]
+            if record["winner"] == player:
+                row["wins"] += 1
+        for name, seconds in record["engine_seconds"].items():
+            rows[name]["seconds"] += seconds
+            rows[name]["moves"] += record["engine_moves"][name]
+    return sorted(rows.items(), key=lambda item: item[1]["points"]/max(item[1]["games"], 1), reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a tournament of three-player games between engines.")
+    parser.add_argument("--engine", action="append", metavar="NAME:KIND[:OPTIONS]",
+                        help=f"an engine to enter, repeatable (default {' '.join(DEFAULT_ENGINES)})")
+    parser.add_argument("--rounds", type=int, default=1, help="times to play every seating")
+    parser.add_argument("--concurrency", type=int, default=2, help="games played at once")
+    parser.add_argument("--board", default="3x4", help="PLAYERSxSIZE of the board (default 3x4, the standard board)")
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--margin", type=int, default=300, help="material lead in centipawns that wins at the move limit")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random moves before the engines take over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write one JSON record per game to this file")
+    args = parser.parse_args()
+
+    engines = {}
+    for text in args.engine or DEFAULT_ENGINES:
+        try:
+            name, kind, options = parse_engine(text)
+        except ValueError as e:
+            parser.error(str(e))
+        if name in engines:
+            parser.error(f"two engines are named {name}")
+        engines[name] = (name, kind, options)
+    if len(engines) < 2:
+        parser.error("a tournament needs at least two engines")
+    board = tuple(int(n) for n in args.board.lower().split("x"))
+    if board[0] != 3:
+        parser.error("games are seated for three players")
+
+    games = schedule(list(engines), args.rounds, args.seed)
+    print(f"{len(games)} games, {args.concurrency} at a time")
+    records = []
+    out = open(args.out, "w") if args.out else None
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = [executor.submit(play_game, game, engines, board, args.opening_plies, args.max_plies, args.margin)
+                       for game in games]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                if out:
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                seats = " ".join(f"{player}={name}" for player, name in record["seats"].items())
+                print(f"game {record['game']:>3}: {seats}: {record['winner'] or 'shared'} "
+                      f"({record['reason']}, {record['plies']} plies)")
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{len(records)} games in {elapsed:.1f} s")
+    print(f"{'engine':<12} {'games':>6} {'wins':>5} {'points':>7} {'score':>6} {'moves':>6} {'ms/move':>8} {'pts/cpu-s':>10}")
+    for name, row in results_table(records, engines):
+        score = row["points"]/max(row["games"], 1)
+        per_move = 1000*row["seconds"]/max(row["moves"], 1)
+        per_second = row["points"]/row["seconds"] if row["seconds"] else float("inf")
+        print(f"{name:<12} {row['games']:>6} {row['wins']:>5} {row['points']:>7.2f} {score:>6.1%} "
+              f"{row['moves']:>6} {per_move:>8.1f} {per_second:>10.2f}")
+
+if __name__ == "__main__":
+    main()
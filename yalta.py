@@ -2,8 +2,7 @@
 # -*- coding: utf-8 -*-
 import pygame
 from math import radians, cos, sin, sqrt
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
+from geometry import Vec, contains
 
 WIDTH, HEIGHT = 800, 800
 
@@ -30,48 +29,6 @@ def load_sprites():
 
 sprites = load_sprites()
 
-class Vec:
-    def __init__(self, x=0, y=0):
-        self.x = x
-        self.y = y
-    
-    def __add__(self, v):
-        return Vec(self.x+v.x, self.y+v.y)
-    
-    def __sub__(self, v):
-        return Vec(self.x-v.x, self.y-v.y)
-    
-    def __mul__(self, m):
-        if isinstance(m, Vec):
-            return self.x*m.x + self.y*m.y
-        
-        else:
-            return Vec(self.x*m, self.y*m)
-    
-    def __truediv__(self, n):
-        return Vec(self.x/n, self.y/n)
-    
-    def __iter__(self):
-        self.components = [self.x,self.y]
-        return self
-    
-    def __next__(self):
-        if len(self.components) > 0:
-            return self.components.pop(0)
-        
-        else:
-            del self.components
-            raise StopIteration
-    
-    def int(self):
-        return Vec(int(self.x), int(self.y))
-    
-    def mag(self):
-        return sqrt(self.x**2 + self.y**2)
-    
-    def __repr__(self):
-        return f"({self.x};{self.y})"
-
 """
   1---2        ,.2.,
  /     \     1´ b c `3
@@ -131,6 +88,8 @@ class Cell:
     DARK = (54,39,32)
     LIGHT = (229,210,170)
     
+    __slots__ = ("x", "y", "piece", "hover", "points", "center", "colour", "txt", "txt_size")
+    
     def __init__(self, x, y, piece):
         self.x, self.y = x, y
         
@@ -163,7 +122,7 @@ class Cell:
                 
                 self.center = corner+s1*mid_ratio_y + midU*mid_ratio_x
                 
-                self.points = [list(corner+p) for p in [p1,p2,p3,p4]]
+                self.points = (corner+p1, corner+p2, corner+p3, corner+p4)
                 self.colour = [self.DARK, self.LIGHT][(x+y+i)%2]
                 
                 break
@@ -239,7 +198,7 @@ class Cell:
             """
     
     def is_in(self, pos, points):
-        return Polygon(points).contains(Point(*pos))
+        return contains(points, pos)
         
 
 class Game: